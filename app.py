@@ -1,13 +1,22 @@
 import sys
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime
 from pathlib import Path
 from typing import Any
 
-from storage import load_tasks, append_task, load_tags_master,load_projects
-from gpt_client import chisa_suggest_tags, chisa_suggest_priority
-from priority import apply_priority_hint
-from state_effect import adjust_score_by_state
+from storage import (
+    load_tasks, load_todo_task_models, append_task, append_tasks, has_task_text, save_tasks,
+    load_tags_master, load_projects, load_state, save_state, allocate_task_ids,
+    get_task, get_task_status, set_task_status, iter_tasks, update_tasks, compact_task_events, archive_done_tasks, migrate_to_sqlite,
+    load_today, save_today, today_inputs_version,
+)
+from config import RECOMMEND_CANDIDATES, TODAY_LLM_BUDGET
+from gpt_client import chisa_suggest_tags, chisa_suggest_tags_batch, chisa_suggest_priority
+from scoring import ScoringEngine, score_cache, top_k
+from state_effect import AXIS_INDEX_KEY, build_axis_index
+from task_model import Task, ScoredTask, task_text_hash
+from today_jobs import ranking_jobs
 
 
 # === パス関連 ===
@@ -19,27 +28,8 @@ DATA_DIR.mkdir(exist_ok=True)  # data/ディレクトリを確実に作成
 STATE_PATH = DATA_DIR / "state.json"
 TASKS_PATH = DATA_DIR / "tasks.jsonl"
 
-
-def save_tasks(tasks: list[dict[str, Any]]) -> None:
-    """tasks を data/tasks.jsonl に書き戻すヘルパー。"""
-    lines: list[str] = []
-    for t in tasks:
-        lines.append(json.dumps(t, ensure_ascii=False))
-    TASKS_PATH.write_text(("\n".join(lines) + "\n") if lines else "", encoding="utf-8")
-
-
-# === 状態（state）読み込み ===
-def load_state() -> dict[str, Any]:
-    if STATE_PATH.exists():
-        with STATE_PATH.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    # なければデフォルトの空の state
-    return {}
-
-def save_state(state: dict[str, Any]) -> None:
-    """state.json を保存するヘルパー。"""
-    with STATE_PATH.open("w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+# 取り込んだタスクのタグ付け（千紗）を Web のリクエストの外で回すスレッド
+_tagging_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chisa-tagging")
 
 
 # === タグ手動選択用（今はオプション機能） ===
@@ -87,8 +77,7 @@ def choose_tags_interactive() -> list[str]:
 
 # === タスク追加 ===
 def add_task(text: str, due_date: str | None = None) -> None:
-    tasks = load_tasks()
-    new_id = (tasks[-1]["id"] + 1) if tasks else 1
+    new_id = allocate_task_ids()[0]
 
     tags: list[str] = chisa_suggest_tags(title=text, detail="")
     print("千紗のタグ提案:", tags)
@@ -124,69 +113,19 @@ def list_tasks() -> None:
 def show_today_recommendation() -> None:
     """state.json と tasks.jsonl を使って、千紗のおすすめ順を表示する。"""
     print("[DEBUG] show_today_recommendation ENTER", flush=True)
-    tasks = load_tasks()
+    todo_tasks = load_todo_task_models()
     state = load_state()
     projects = load_projects()
     tags_master = load_tags_master()
 
-    # タグごとの重みを辞書にしておく
-    tag_weight_by_key: dict[str, int] = {}
-    for tag_def in tags_master.get("tags", []):
-        key = tag_def.get("key")
-        if not key:
-            continue
-        w = int(tag_def.get("weight_for_priority", 0))
-        tag_weight_by_key[key] = w
-        
-    print("[DEBUG] tags_master_count=", len(tags_master.get("tags", [])),flush=True)
-    print("[DEBUG] tag_weight_sample=", list(tag_weight_by_key.items())[:10],flush=True)
-
-
-    today = date.today()
-
-    # todo だけに絞る
-    todo_tasks = [t for t in tasks if t.get("status") == "todo"]
-
-    # days_left と score を計算してタスクに追加
-    for t in todo_tasks:
-        due_str = t.get("due_date")
+    # tags_master / projects / state を1回だけ前処理して、todo 全件にスコアを付ける
+    engine = ScoringEngine.from_sources(tags_master, projects, state, cache=score_cache)
+    print("[DEBUG] tags_master_count=", len(engine.ctx.tag_weights), flush=True)
 
-        # タスクに期日がない場合、プロジェクトのdefaultを見る
-        if not due_str:
-            proj = t.get("project")
-            if proj:
-                proj_info = projects.get(proj, {})
-                due_str = proj_info.get("default_due_date")
-
-        if due_str:
-            try:
-                d = date.fromisoformat(due_str)
-                days_left = (d - today).days
-            except ValueError:
-                days_left = None
-        else:
-            days_left = None
-
-        t["days_left"] = days_left  # 千紗に渡す補助情報
-
-        # --- ここから priority_hint を含めたスコア計算 ---
-        # タグから基礎スコア
-        base_score = 0
-        for key in t.get("tags", []):
-            base_score += tag_weight_by_key.get(key, 0)
-
-        t["base_score"] = base_score
-
-        # priority_hint を反映
-        hint = t.get("priority_hint")
-        score = apply_priority_hint(base_score, hint)
-
-        # ★ ここで「今日の状態」からさらに微調整
-        score = adjust_score_by_state(score, t, state)
-
-        t["score"] = score
-    # score 付きの todo_tasks を千紗APIに渡す
-    ordered = chisa_suggest_priority(todo_tasks, state)
+    # days_left と score を計算し、上位だけ残す（タスク本体は書き換えず ScoredTask に持たせる）
+    scored = engine.top_k(todo_tasks, RECOMMEND_CANDIDATES)
+    # score 付きの todo タスクを千紗APIに渡す
+    ordered = chisa_suggest_priority([st.to_dict() for st in scored], state)
 
     print("=== 今日のおすすめタスク（千紗案） ===")
     if not ordered:
@@ -194,7 +133,7 @@ def show_today_recommendation() -> None:
         return
 
     # id から元タスクを引けるように辞書を作る
-    tasks_by_id: dict[str, dict[str, Any]] = {str(t["id"]): t for t in tasks}
+    tasks_by_id: dict[str, Task] = {str(t.id): t for t in todo_tasks}
 
     for item in ordered:
         tid = str(item.get("id"))
@@ -211,16 +150,10 @@ def show_today_recommendation() -> None:
 
 
 
-def get_today_recommendation() -> list[dict[str, Any]]:
-    """
-    Web用：
-    state.json と tasks.jsonl を使って、千紗のおすすめ順を
-    list[dict] として返す。
-    """
-    print("[DEBUG] get_today_recommendation ENTER", flush=True)
-
-    # まず全部ロード（順番が大事）
-    tasks_all = load_tasks()
+def _today_candidates(today: date | None = None) -> tuple[list[ScoredTask], dict[str, Any]]:
+    """todo をスコア計算して、上位 RECOMMEND_CANDIDATES 件（スコア順）と state を返す（today は締切までの日数の基準日）。"""
+    # まず全部ロード（順番が大事）。タスクは todo だけ読めば足りる
+    todo_tasks = load_todo_task_models()
     state = load_state()
     projects = load_projects()
     tags_master = load_tags_master()
@@ -230,155 +163,125 @@ def get_today_recommendation() -> list[dict[str, Any]]:
     if not isinstance(state, dict):
         state = {}
 
-
-    if isinstance(projects, list):
-    # もし projects が [{key:..., ...}] 形式なら変換したいが、
-    # まずは落とさないために空dict扱い
-        projects = {}
-    if not isinstance(projects, dict):
-        projects = {}
-
-    todo_tasks: list[dict[str, Any]] = [t for t in tasks_all if t.get("status") == "todo"]
     print("[DEBUG] todo_count=", len(todo_tasks), flush=True)
 
-    # tags_master を重み辞書に
-    tag_defs = tags_master.get("tags", []) if isinstance(tags_master, dict) else []
-    tag_weight_by_key: dict[str, int] = {}
-    for tag_def in tag_defs:
-        if not isinstance(tag_def, dict):
-            continue
-        key = tag_def.get("key")
-        if not key:
-            continue
-        try:
-            w = int(tag_def.get("weight_for_priority", 0))
-        except Exception:
-            w = 0
-        tag_weight_by_key[str(key)] = w
-
-    print("[DEBUG] tags_master_count=", len(tag_defs), flush=True)
-    print("[DEBUG] tag_weight_sample=", list(tag_weight_by_key.items())[:10], flush=True)
-
-    today = date.today()
-
-    # days_left / base_score / score を計算
-    for t in todo_tasks:
-        # --- due_date ---
-        due_str = t.get("due_date")
-        if not due_str:
-            proj = t.get("project")
-            if proj:
-                proj_info = projects.get(proj, {}) if isinstance(projects, dict) else {}
-                due_str = proj_info.get("default_due_date")
-
-        if due_str:
-            try:
-                d = date.fromisoformat(due_str)
-                days_left = (d - today).days
-            except ValueError:
-                days_left = None
-        else:
-            days_left = None
-
-        t["days_left"] = days_left
-
-        # --- tags 型ゆれ対応（str / list / dict）---
-        raw_tags = t.get("tags", [])
-        if isinstance(raw_tags, str):
-            tags_list = [raw_tags]
-        elif isinstance(raw_tags, list):
-            tags_list = raw_tags
-        else:
-            tags_list = []
-
-        base_score = 0
-        for tag in tags_list:
-            if isinstance(tag, dict):
-                k = tag.get("key") or tag.get("name")
-                k = str(k) if k is not None else ""
-            else:
-                k = str(tag)
+    # days_left / base_score / score を計算し、スコア上位の候補だけ残す
+    # （heap で選ぶので全件分の ScoredTask は持たない。タスク本体は書き換えない）
+    engine = ScoringEngine.from_sources(tags_master, projects, state, today, cache=score_cache)
+    print("[DEBUG] tags_master_count=", len(engine.ctx.tag_weights), flush=True)
+    return engine.top_k(todo_tasks, RECOMMEND_CANDIDATES), state
+
+
+def _today_item(t: ScoredTask, reason: str) -> dict[str, Any]:
+    return {
+        "id": t.get("id"),
+        "text": t.get("text", "(タイトル不明)"),
+        "project": t.get("project"),
+        "status": t.get("status"),
+        "progress": t.get("status"),
+        "tags": t.get("tags", []),
+        "due_date": t.get("due_date"),
+        "days_left": t.get("days_left"),
+        "score": t.get("score"),
+        "reason": reason,
+    }
 
-            if not k:
-                continue
 
-            w = tag_weight_by_key.get(k)
-            if w is None:
-                # tags_master未登録でも0固定にしない（最低1点）
-                w = 1
-            base_score += w
+def _today_items(scored: list[ScoredTask], ordered: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """千紗の並び（ordered）を表示用の配列にする。ordered が空ならスコア順の上位10件。"""
+    # フォールバック：スコア順
+    if not ordered:
+        return [_today_item(t, "スコア順") for t in scored[:10]]  # top_k で既にスコア順
 
-        t["base_score"] = base_score
+    # 千紗が成功した場合
+    tasks_by_id: dict[int, ScoredTask] = {t.id: t for t in scored if t.get("id") is not None}
 
-        # priority_hint 補正
-        priority_hint = t.get("priority_hint")
-        score = apply_priority_hint(base_score, priority_hint)
+    results: list[dict[str, Any]] = []
+    for item in ordered:
+        original = tasks_by_id.get(item.get("id"))
+        if original is None:
+            continue
+        results.append(_today_item(original, item.get("reason", "")))
+    return results
 
-        # state からさらに補正
-        score = adjust_score_by_state(score, t, state)
 
-        # 締切ボーナス（タグが未整備でも優先度が動く）
-        if days_left is not None:
-            if days_left <= 0:
-                score += 50
-            elif days_left <= 3:
-                score += 20
-            elif days_left <= 7:
-                score += 10
+def get_today_recommendation() -> list[dict[str, Any]]:
+    """
+    Web用：
+    state.json と tasks.jsonl を使って、千紗のおすすめ順を
+    list[dict] として返す（千紗の返事を待つ）。
+    """
+    print("[DEBUG] get_today_recommendation ENTER", flush=True)
 
-        t["score"] = score
+    scored, state = _today_candidates()
 
     # 千紗APIに渡す（todo_tasksだけ）
-    ordered = chisa_suggest_priority(todo_tasks, state)
+    ordered = chisa_suggest_priority([st.to_dict() for st in scored], state)
     print("[DEBUG] chisa_result_count=", len(ordered), flush=True)
-
-    # フォールバック：スコア順
     if not ordered:
         print("[情報] 千紗なし：スコアで並べます", flush=True)
-        sorted_tasks = sorted(todo_tasks, key=lambda t: t.get("score", 0), reverse=True)
-        top_tasks = sorted_tasks[:10]
-
-        results: list[dict[str, Any]] = []
-        for t in top_tasks:
-            results.append({
-                "id": t.get("id"),
-                "text": t.get("text", "(タイトル不明)"),
-                "project": t.get("project"),
-                "status": t.get("status"),
-                "progress": t.get("status"),
-                "tags": t.get("tags", []),
-                "due_date": t.get("due_date"),
-                "days_left": t.get("days_left"),
-                "score": t.get("score"),
-                "reason": "スコア順",
-            })
-        return results
+    return _today_items(scored, ordered)
 
-    # 千紗が成功した場合
-    tasks_by_id: dict[int, dict[str, Any]] = {t["id"]: t for t in tasks_all if isinstance(t, dict) and "id" in t}
 
-    results: list[dict[str, Any]] = []
-    for item in ordered:
-        tid = item.get("id")
-        reason = item.get("reason", "")
-        original = tasks_by_id.get(tid)
-        if original is None:
-            continue
+def _finish_today_ranking(version: str, today: str, scored: list[ScoredTask], state: dict[str, Any]) -> dict[str, Any]:
+    """（バックグラウンド）千紗に並べ替えてもらい、data/today.json に保存する（待つのは TODAY_LLM_BUDGET 秒まで）。"""
+    # 千紗に聞けずにローカル順に落ちるときは strict で例外になるので保存しない（少し置いてから /api/today でまた試す）
+    ordered = chisa_suggest_priority([st.to_dict() for st in scored], state, budget=TODAY_LLM_BUDGET, strict=True)
+    print("[DEBUG] chisa_result_count=", len(ordered), flush=True)
+    doc = {
+        "version": version,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "date": today,
+        "items": _today_items(scored, ordered),
+    }
+    save_today(doc)
+    return doc
 
-        results.append({
-            "id": original.get("id"),
-            "text": original.get("text", "(タイトル不明)"),
-            "project": original.get("project"),
-            "status": original.get("status"),
-            "progress": original.get("status"),
-            "tags": original.get("tags", []),
-            "due_date": original.get("due_date"),
-            "days_left": original.get("days_left"),
-            "score": original.get("score"),
-            "reason": reason,
-        })
 
-    return results
+def start_today_ranking(today: str | None = None) -> dict[str, Any]:
+    """
+    Web用：今日のおすすめをすぐ返す。
+    {"ranking_id", "pending", "generated_at", "items"}
+    - data/today.json が今の入力（タスク・state・projects・tags_master・日付）のものなら、それをそのまま返す
+    - 古ければローカルのスコア順を pending=True で返し、千紗の並べ替えはバックグラウンドで始める
+      （結果は get_today_ranking(ranking_id) で取れて、today.json にも保存される）
+    ranking_id は today.json の version と同じ。today（"YYYY-MM-DD"）は Web 側が決めた「今日」（省略時はローカル日付）。
+    千紗の並べ替えに失敗したら、RANKING_RETRY_AFTER 秒は投げ直さずに失敗したジョブ（error 付き）を返す。
+    """
+    today = today or date.today().isoformat()
+    version = today_inputs_version(today)
+    doc = load_today()
+    if doc is not None and doc.get("version") == version:
+        return {"ranking_id": version, "pending": False, "generated_at": doc["generated_at"], "items": doc["items"]}
+
+    job = ranking_jobs.get(version)
+    if job is None or ranking_jobs.can_retry(job):
+        scored, state = _today_candidates(date.fromisoformat(today))
+        job = ranking_jobs.submit(
+            version,
+            _today_items(scored, []),
+            datetime.now().isoformat(timespec="seconds"),
+            lambda: _finish_today_ranking(version, today, scored, state),
+        )
+    return job.view()
+
+
+def get_today_ranking(ranking_id: str, wait: float = 0.0) -> dict[str, Any] | None:
+    """
+    Web用：start_today_ranking が返した ranking_id の今の状態（形は start_today_ranking と同じ）。
+    wait 秒までは千紗の結果を待つ。知らない id なら None。
+    """
+    job = ranking_jobs.get(ranking_id)
+    if job is not None:
+        if wait > 0:
+            job.done.wait(wait)
+        return job.view()
+
+    # 再起動した後などでジョブが無くても、保存済みの today.json がその版なら返せる
+    doc = load_today()
+    if doc is not None and doc.get("version") == ranking_id:
+        return {"ranking_id": ranking_id, "pending": False, "generated_at": doc["generated_at"], "items": doc["items"]}
+    return None
 
 
 def get_tasks_scored_all() -> list[dict[str, Any]]:
@@ -388,53 +291,18 @@ def get_tasks_scored_all() -> list[dict[str, Any]]:
     - 千紗のおすすめ（最大5件）にだけ reason を付与
     - done も含めて返す（邪魔なら todo のみにしてOK）
     """
-    tasks = load_tasks()
+    todo_tasks = load_todo_task_models()
     state = load_state()
     projects = load_projects()
     tags_master = load_tags_master()
 
-    # まず score を計算（get_today_recommendation と同じ流れ）
-    today = date.today()
-    todo_tasks: list[dict[str, Any]] = [t for t in tasks if t.get("status") == "todo"]
-
-    for t in todo_tasks:
-        # 期日取得（タスク → プロジェクト default）
-        due_str = t.get("due_date")
-        if not due_str:
-            proj = t.get("project")
-            if proj:
-                proj_info = projects.get(proj, {})
-                due_str = proj_info.get("default_due_date")
-
-        if due_str:
-            try:
-                d = date.fromisoformat(due_str)
-                days_left = (d - today).days
-            except ValueError:
-                days_left = None
-        else:
-            days_left = None
-
-        t["days_left"] = days_left
-
-        # タグから基礎スコア
-        base_score = 0
-        tag_weight_by_key = tags_master.get("tag_weight_by_key", {})
-        for key in t.get("tags", []):
-            base_score += tag_weight_by_key.get(key, 0)
-        t["base_score"] = base_score
-
-        # priority_hint 補正
-        priority_hint = t.get("priority_hint")
-        score = apply_priority_hint(base_score, priority_hint)
-
-        # state からさらに補正
-        score = adjust_score_by_state(score, t, state)
-
-        t["score"] = score
+    # まず score を計算（get_today_recommendation と同じエンジン）
+    scored = ScoringEngine.from_sources(tags_master, projects, state, cache=score_cache).score_all(todo_tasks)
+    scored_by_id: dict[Any, ScoredTask] = {st.id: st for st in scored}
 
     # 次に 千紗で「おすすめ順＋理由」をもらう（最大5件）
-    ordered = chisa_suggest_priority(todo_tasks, state)  # ← 既存の関数を利用
+    candidates = top_k(scored, RECOMMEND_CANDIDATES, key=lambda st: st.score)
+    ordered = chisa_suggest_priority([st.to_dict() for st in candidates], state)  # ← 既存の関数を利用
 
     # reason を id で引けるようにする
     reason_by_id: dict[str, str] = {}
@@ -444,42 +312,59 @@ def get_tasks_scored_all() -> list[dict[str, Any]]:
         if tid and reason:
             reason_by_id[tid] = reason
 
-    # tasks 全体に reason を付与（おすすめ以外は空文字）
-    for t in tasks:
-        tid = str(t.get("id"))
-        t["reason"] = reason_by_id.get(tid, "")
+    # tasks 全体（アーカイブの done も含む）に reason を付与（おすすめ以外は空文字）
+    results: list[dict[str, Any]] = []
+    for t in load_tasks():
+        st = scored_by_id.get(t.get("id")) if t.get("status") == "todo" else None
+        d = st.to_dict() if st is not None else t
+        d["reason"] = reason_by_id.get(str(t.get("id")), "")
+        results.append(d)
 
-    return tasks
+    return results
 
 
 def complete_task(task_id: int) -> bool:
     """
     指定IDのタスクを status='done' にして保存する。
     見つかったら True、見つからなければ False。
+    id インデックスで該当行だけを書き換える（全件の読み込み・書き直しはしない）。
+    イベントログモードでは status イベントを1行追記するだけ。
     """
-    tasks = load_tasks()
-    found = False
-
-    for t in tasks:
-        if t.get("id") == task_id:
-            # すでに done ならそれでOK扱い
-            if t.get("status") == "done":
-                return True
-            t["status"] = "done"
-            t["completed_at"] = datetime.now().isoformat(timespec="seconds")
-            found = True
-            break
-
-    if not found:
+    status = get_task_status(task_id)
+    if status is None:
         return False
 
-    save_tasks(tasks)
-    return True
+    # すでに done ならそれでOK扱い
+    if status == "done":
+        return True
+
+    return set_task_status(task_id, "done")
+
 
+def _tag_vocabulary(new_tasks: Any = None) -> set[str]:
+    """tags_master のキー＋todo タスクのタグ＋これから追加する new_tasks の tags_hint。"""
+    vocab: set[str] = set()
+    try:
+        tag_defs = load_tags_master().get("tags", [])
+    except FileNotFoundError:
+        tag_defs = []
+    vocab.update(str(d["key"]) for d in tag_defs if isinstance(d, dict) and d.get("key"))
 
-def import_state_data(data: dict[str, Any]) -> None:
+    for t in load_todo_task_models():
+        if isinstance(t.tags, tuple):
+            vocab.update(t.tags)
+    for nt in new_tasks if isinstance(new_tasks, list) else []:
+        hint = nt.get("tags_hint") if isinstance(nt, dict) else None
+        if isinstance(hint, list):
+            vocab.update(str(x) for x in hint if isinstance(x, str))
+    return vocab
+
+
+def import_state_data(data: dict[str, Any], tag_in_background: bool = False) -> None:
     """
     日誌JSON(dict)を受け取り、state.json更新＋new_tasks追加を行う。
+    tags_hint の無いタスクは千紗にまとめてタグ付けしてもらう。
+    tag_in_background=True（Web から）なら、タグ無しのまま先に追加して、タグ付けは裏で行う。
     """
     from datetime import datetime
     
@@ -493,6 +378,8 @@ def import_state_data(data: dict[str, Any]) -> None:
         "free_note": data.get("free_note", ""),
         "last_imported_at": datetime.now().isoformat(timespec="seconds"),
     }
+    # prefer_axes / avoid_axes とタグの突き合わせはここで1回だけやって state と一緒に保存する
+    state_out[AXIS_INDEX_KEY] = build_axis_index(state_out, _tag_vocabulary(data.get("new_tasks")))
     save_state(state_out)
     print(f"state.json を更新しました: {STATE_PATH}")
 
@@ -502,11 +389,10 @@ def import_state_data(data: dict[str, Any]) -> None:
         print("new_tasks が配列ではありません。タスクの追加はスキップします。")
         return
 
-    tasks = load_tasks()
-    existing_texts = {t.get("text") for t in tasks if t.get("text")}
-    next_id = max([t.get("id", 0) for t in tasks] or [0]) + 1
+    # 既存タスクとの重複はインデックスのハッシュで、今回の取り込み内の重複は seen で弾く
+    seen: set[str] = set()
 
-    added_count = 0
+    new_tasks: list[dict[str, Any]] = []
     for nt in new_tasks_data:
         if not isinstance(nt, dict):
             continue
@@ -515,7 +401,8 @@ def import_state_data(data: dict[str, Any]) -> None:
         if not text:
             continue
 
-        if text in existing_texts:
+        h = task_text_hash(text)
+        if h in seen or has_task_text(text):
             continue
 
         project = nt.get("project") or "default"
@@ -524,7 +411,7 @@ def import_state_data(data: dict[str, Any]) -> None:
         priority_hint = nt.get("priority_hint")
 
         task: dict[str, Any] = {
-            "id": next_id,
+            "id": None,  # 追加する件数が決まってからまとめて採番する
             "created_at": date.today().isoformat(),
             "text": text,
             "project": project,
@@ -536,12 +423,55 @@ def import_state_data(data: dict[str, Any]) -> None:
         if priority_hint:
             task["priority_hint"] = priority_hint
 
-        append_task(task)
-        existing_texts.add(text)
-        next_id += 1
-        added_count += 1
+        new_tasks.append(task)
+        seen.add(h)
+
+    # tags_hint の無いタスクは千紗にまとめてタグ付けしてもらう（1件ずつは聞かない）
+    untagged = [t for t in new_tasks if not t["tags"]]
+    if untagged and not tag_in_background:
+        suggested = chisa_suggest_tags_batch([{"id": i, "title": t["text"]} for i, t in enumerate(untagged)])
+        for i, tags in suggested.items():
+            untagged[i]["tags"] = tags
+
+    for task, new_id in zip(new_tasks, allocate_task_ids(len(new_tasks))):
+        task["id"] = new_id
+    append_tasks(new_tasks)
+
+    print(f"new_tasks から {len(new_tasks)} 件のタスクを追加しました。")
 
-    print(f"new_tasks から {added_count} 件のタスクを追加しました。")
+    if untagged and tag_in_background:
+        _tagging_pool.submit(_tag_imported_tasks, {t["id"] for t in untagged})
+
+
+def _tag_untagged_tasks(ids: set[int] | None = None) -> int:
+    """未完了でタグの無いタスク（ids があればその中だけ）をまとめてタグ付けする。付けた件数を返す。"""
+    # ids があれば id インデックスで1件ずつ引く（アーカイブも含めた全件は読まない）
+    found = iter_tasks(status="todo") if ids is None else (get_task(tid) for tid in sorted(ids))
+    targets = [t for t in found if t and t.get("status") != "done" and not t.get("tags") and isinstance(t.get("id"), int)]
+    print(f"タグの無いタスク: {len(targets)} 件")
+    if not targets:
+        return 0
+    suggested = chisa_suggest_tags_batch([{"id": t["id"], "title": t.get("text", "")} for t in targets])
+    patches = {tid: {"tags": tags} for tid, tags in suggested.items() if tags}
+    # 千紗を待っている間に手でタグを付けられたものは上書きしない（update_tasks のロックの中で確かめる）
+    return update_tasks(patches, when=lambda t: not t.get("tags"))
+
+
+def _tag_imported_tasks(ids: set[int]) -> None:
+    """（バックグラウンド）import_state_data で追加したタスクにタグを付ける。"""
+    try:
+        n = _tag_untagged_tasks(ids)
+        print(f"[情報] 取り込んだタスク {len(ids)} 件のうち {n} 件にタグを付けました", flush=True)
+    except Exception as e:
+        print(f"[警告] 取り込んだタスクのタグ付けに失敗しました: {e}", flush=True)
+
+
+def retag_untagged_tasks() -> int:
+    """
+    未完了でタグの無いタスクを千紗にまとめてタグ付けしてもらう（CLI 用）。
+    tasks.jsonl の書き直しは最後に1回だけ。タグを付けた件数を返す。
+    """
+    return _tag_untagged_tasks()
 
 
 def import_state_log(path_str: str) -> None:
@@ -631,6 +561,10 @@ def main() -> None:
         print("  python app.py add \"タスク内容\"")
         print("  python app.py list")
         print("  python app.py today")
+        print("  python app.py compact")
+        print("  python app.py archive")
+        print("  python app.py retag")
+        print("  python app.py migrate_sqlite")
         return
 
     cmd = sys.argv[1]
@@ -662,6 +596,23 @@ def main() -> None:
             return
         import_state_log(sys.argv[2])
 
+    elif cmd == "compact":
+        n = compact_task_events()
+        print(f"イベント {n} 件を tasks.jsonl に畳み込みました。")
+
+    elif cmd == "archive":
+        n = archive_done_tasks()
+        print(f"done のタスク {n} 件を data/archive/ に移しました。")
+
+    elif cmd == "retag":
+        n = retag_untagged_tasks()
+        print(f"{n} 件のタスクにタグを付けました。")
+
+    elif cmd == "migrate_sqlite":
+        counts = migrate_to_sqlite()
+        print(f"SQLite に取り込みました: tasks={counts['tasks']} projects={counts['projects']}")
+        print("使うには CHISA_STORAGE_BACKEND=sqlite を設定してください。")
+
     else:
         print("未知のコマンドです:", cmd)
 
@@ -0,0 +1,88 @@
+# bench/bench_llm_stub.py
+"""
+llm_stub_server.py を相手に、千紗の呼び出し（gpt_client → llm_backend → HTTP）を本物の経路のまま回す。
+1. スタブを別スレッドで起動し、backend をそこに向ける（openai パッケージがあれば SDK、無ければ urllib）
+2. chisa_suggest_priority を並列で N 回（返答キャッシュは使わない）呼び、1分あたりの件数と待ち時間を出す
+3. chisa_suggest_tags_batch を1回だけ流して、同じタイトルに同じタグが付くことを確かめる
+
+使い方: python bench/bench_llm_stub.py [回数=600] [並列数=16] [遅延秒=0.02] [失敗率=0.0]
+"""
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import gpt_client  # noqa: E402
+from circuit_breaker import llm_breaker  # noqa: E402
+from config import LLM_MODEL  # noqa: E402
+from llm_backend import HTTPBackend, OpenAIBackend, set_backend  # noqa: E402
+from llm_stub_server import start_stub_server  # noqa: E402
+
+
+def make_todo(n: int) -> list[dict]:
+    projects = ["job", "portfolio", "novel_game", "default"]
+    return [
+        {"id": i, "text": f"タスク {i}", "project": projects[i % 4], "status": "todo",
+         "tags": ["coding"] if i % 2 else ["light"], "days_left": i % 9, "score": (i * 37) % 101}
+        for i in range(1, n + 1)
+    ]
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    total = int(args[0]) if len(args) > 0 else 600
+    workers = int(args[1]) if len(args) > 1 else 16
+    latency = float(args[2]) if len(args) > 2 else 0.02
+    error_rate = float(args[3]) if len(args) > 3 else 0.0
+
+    server, stub = start_stub_server(latency=latency, error_rate=error_rate, seed=1)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    try:
+        import openai  # noqa: F401
+        backend = OpenAIBackend(LLM_MODEL, base_url)
+    except ImportError:
+        backend = HTTPBackend(LLM_MODEL, base_url)
+    set_backend(backend)
+    print(f"stub   : {base_url} (latency={latency}s error_rate={error_rate})  backend={backend.name}")
+
+    todo = make_todo(200)
+    state = {"meta": {"focus_level": 3}}
+    expected = [t["id"] for t in sorted(todo, key=lambda t: t["score"], reverse=True)[:5]]
+
+    def one(_: int) -> tuple[float, bool]:
+        t0 = time.perf_counter()
+        out = gpt_client.chisa_suggest_priority(todo, state, use_cache=False, budget=5.0)
+        ok = [r["id"] for r in out] == expected and out[0]["reason"].startswith("スタブ")
+        return time.perf_counter() - t0, ok
+
+    one(0)  # 接続・import のウォームアップ
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - t0
+
+    times = sorted(r[0] for r in results)
+    ok = sum(1 for r in results if r[1])
+    print(f"calls  : {total} ({workers} 並列) in {elapsed:.2f}s  -> {total / elapsed * 60:,.0f} req/min")
+    print(f"latency: p50={statistics.median(times) * 1000:.1f}ms  p95={times[int(len(times) * 0.95) - 1] * 1000:.1f}ms")
+    print(f"answers: スタブの順で返ったもの {ok}/{total}（残りはローカル順に落ちたもの）")
+    print(f"stub   : {stub.stats()}")
+    print(f"breaker: {llm_breaker.stats()['state']} trips={llm_breaker.stats()['trips']}")
+
+    if error_rate == 0.0:
+        assert ok == total, "失敗率 0 なのにスタブの答えにならなかった呼び出しがあります"
+        items = [{"id": i, "title": f"タイトル {i % 50}"} for i in range(300)]
+        a = gpt_client.chisa_suggest_tags_batch(items, use_cache=False)
+        b = gpt_client.chisa_suggest_tags_batch(items, use_cache=False)
+        assert a == b and len(a) == len(items), "まとめてタグ付けの結果が決まった答えになっていません"
+        assert all(a[i] == a[i + 50] for i in range(250)), "同じタイトルに違うタグが付きました"
+        print("tags   : OK（決まった答え）")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+# bench/bench_scoring.py
+"""
+ScoringEngine の確認用スクリプト。
+1. 以前の get_today_recommendation のループ（下の legacy_score）と同じ結果になるかを確かめる
+   state 補正は公開の adjust_score_by_state と全件一致すること、
+   タグが文字列の list なら以前の adjust_score_by_state（legacy_adjust_score_by_state）とも一致することを見る
+2. NumPy があれば、配列版（score_all_vectorized）が Python のループと同じ結果になるかを確かめる
+3. ScoreCache を通しても同じ結果になるか、1件完了したあとにどれだけ当たるかを確かめる
+4. 1タスクあたりのスコア計算時間を比べる
+
+使い方: python bench/bench_scoring.py [件数=20000]
+"""
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from priority import apply_priority_hint  # noqa: E402
+import scoring  # noqa: E402
+from scoring import ScoreCache, ScoringEngine  # noqa: E402
+from state_effect import AXIS_INDEX_KEY, adjust_score_by_state, build_axis_index, compile_state_effect  # noqa: E402
+from task_model import Task  # noqa: E402
+
+TAGS = ["job_search", "coding", "writing", "light", "medium", "heavy", "admin", "outside", "unknown_tag"]
+HINTS = [None, "high", "low", "critical", "someday", "HIGH ", "bogus"]
+
+TAGS_MASTER = {
+    "tags": [
+        {"key": "job_search", "weight_for_priority": 30},
+        {"key": "coding", "weight_for_priority": 15},
+        {"key": "writing", "weight_for_priority": 10},
+        {"key": "light", "weight_for_priority": 5},
+        {"key": "medium", "weight_for_priority": 0},
+        {"key": "heavy", "weight_for_priority": -5},
+        {"key": "admin", "weight_for_priority": "x"},  # 壊れた重みは 0
+        {"key": "outside", "weight_for_priority": 3},
+    ]
+}
+PROJECTS = {
+    "job": {"name": "就活", "default_due_date": "2026-11-01"},
+    "portfolio": {"name": "ポートフォリオ"},
+    "novel_game": {"name": "ノベルゲーム", "default_due_date": "not-a-date"},
+}
+STATES = [
+    {},
+    {"meta": {"focus_level": 2}, "constraints": {"can_go_out": False},
+     "focus_plan": {"prefer_axes": ["job"], "avoid_axes": "writ"}},
+    {"meta": {"focus_level": "5"}, "focus_plan": ["壊れた形"]},
+]
+TODAY = date(2026, 10, 20)
+
+
+def make_tasks(n: int) -> list[Task]:
+    tasks = []
+    for i in range(1, n + 1):
+        d = {
+            "id": i,
+            "text": f"タスク {i}",
+            "project": ["job", "portfolio", "novel_game", "default"][i % 4],
+            "status": "todo",
+        }
+        if i % 7 == 0:
+            d["tags"] = [{"key": TAGS[i % len(TAGS)]}, {"name": "coding"}]
+        elif i % 11 != 0:
+            d["tags"] = [TAGS[i % len(TAGS)], TAGS[(i * 5) % len(TAGS)]]
+        if i % 3 == 0:
+            d["due_date"] = f"2026-10-{(i % 28) + 1:02d}"
+        if i % 5 == 0:
+            d["priority_hint"] = HINTS[i % len(HINTS)]
+        tasks.append(Task.from_dict(d))
+    return tasks
+
+
+def with_odd_values(tasks: list[Task]) -> list[Task]:
+    """配列版の確認用に、型の崩れた値（hash できない hint、数値の期日、文字列のタグ）を混ぜる。"""
+    out = list(tasks)
+    for i in range(0, len(out), 97):
+        d = out[i].to_dict()
+        d["priority_hint"] = ["high"]
+        d["due_date"] = 20261020
+        d["tags"] = "heavy"
+        out[i] = Task.from_dict(d)
+    return out
+
+
+def legacy_weights() -> dict[str, int]:
+    tag_weight_by_key: dict[str, int] = {}
+    for tag_def in TAGS_MASTER["tags"]:
+        try:
+            w = int(tag_def.get("weight_for_priority", 0))
+        except Exception:
+            w = 0
+        tag_weight_by_key[str(tag_def["key"])] = w
+    return tag_weight_by_key
+
+
+def legacy_adjust_score_by_state(score: int, task, state: dict) -> int:
+    """以前の state_effect.adjust_score_by_state（比較用にそのまま残したもの）。"""
+    tags = [str(t) for t in (task.get("tags") or [])]
+
+    def as_list(v):
+        if v is None:
+            return []
+        if isinstance(v, list):
+            return v
+        if isinstance(v, tuple):
+            return list(v)
+        if isinstance(v, str):
+            s = v.strip()
+            return [s] if s else []
+        return []
+
+    meta = (state or {}).get("meta")
+    meta = meta if isinstance(meta, dict) else {}
+    constraints = (state or {}).get("constraints")
+    constraints = constraints if isinstance(constraints, dict) else {}
+    plan = (state or {}).get("focus_plan")
+    plan = plan if isinstance(plan, dict) else {}
+    prefer_axes = [str(x) for x in as_list(plan.get("prefer_axes")) if str(x).strip()]
+    avoid_axes = [str(x) for x in as_list(plan.get("avoid_axes")) if str(x).strip()]
+
+    bonus = 0
+    focus = meta.get("focus_level")
+    try:
+        focus_int = int(focus) if focus is not None else None
+    except (TypeError, ValueError):
+        focus_int = None
+    if focus_int is not None and focus_int <= 2:
+        if "heavy" in tags:
+            bonus -= 20
+    if constraints.get("can_go_out") is False:
+        outside_related = {"outside", "shopping", "errand"}
+        if any(tag in outside_related for tag in tags):
+            bonus -= 15
+    if prefer_axes:
+        if any(ax in tag for tag in tags for ax in prefer_axes):
+            bonus += 10
+    if avoid_axes:
+        if any(ax in tag for tag in tags for ax in avoid_axes):
+            bonus -= 10
+    return score + bonus
+
+
+def legacy_score(t: Task, state: dict, today: date, tag_weight_by_key: dict[str, int],
+                 adjust=legacy_adjust_score_by_state) -> tuple:
+    """以前の get_today_recommendation の1タスク分（比較用にそのまま残したもの。state 補正だけ adjust で差し替えられる）。"""
+    due_str = t.get("due_date")
+    if not due_str:
+        proj = t.get("project")
+        if proj:
+            due_str = PROJECTS.get(proj, {}).get("default_due_date")
+    if due_str:
+        try:
+            days_left = (date.fromisoformat(due_str) - today).days
+        except ValueError:
+            days_left = None
+    else:
+        days_left = None
+
+    raw_tags = t.get("tags", [])
+    if isinstance(raw_tags, str):
+        tags_list = [raw_tags]
+    elif isinstance(raw_tags, list):
+        tags_list = raw_tags
+    else:
+        tags_list = []
+
+    base_score = 0
+    for tag in tags_list:
+        if isinstance(tag, dict):
+            k = tag.get("key") or tag.get("name")
+            k = str(k) if k is not None else ""
+        else:
+            k = str(tag)
+        if not k:
+            continue
+        w = tag_weight_by_key.get(k)
+        base_score += 1 if w is None else w
+
+    score = apply_priority_hint(base_score, t.get("priority_hint"))
+    score = adjust(score, t, state)
+    if days_left is not None:
+        if days_left <= 0:
+            score += 50
+        elif days_left <= 3:
+            score += 20
+        elif days_left <= 7:
+            score += 10
+    return days_left, base_score, score
+
+
+def legacy_axis_bonus(tags: list[str], prefer_axes: list[str], avoid_axes: list[str]) -> int:
+    """以前の adjust_score_by_state の prefer_axes / avoid_axes 部分（部分一致をそのまま回す）。"""
+    bonus = 0
+    if prefer_axes and any(ax in tag for tag in tags for ax in prefer_axes):
+        bonus += 10
+    if avoid_axes and any(ax in tag for tag in tags for ax in avoid_axes):
+        bonus -= 10
+    return bonus
+
+
+def check_axis_index() -> None:
+    """axis_index あり / なし / 古い axes のもの で StateEffect の axes 補正が以前と同じになるか。"""
+    plan = {"prefer_axes": ["job", "cod"], "avoid_axes": "writ"}
+    state = {"focus_plan": plan}
+    stale = {"focus_plan": plan, AXIS_INDEX_KEY: build_axis_index({"focus_plan": {"prefer_axes": ["x"]}}, TAGS)}
+    indexed = {"focus_plan": plan, AXIS_INDEX_KEY: build_axis_index(state, TAGS[:4])}  # 語彙は一部だけ
+    for s in (state, stale, indexed):
+        effect = compile_state_effect(s)
+        for i in range(len(TAGS)):
+            for j in range(len(TAGS)):
+                tags = [TAGS[i], TAGS[j], "new_job_tag"]
+                base = compile_state_effect({}).bonus(tags)
+                assert effect.bonus(tags) - base == legacy_axis_bonus(tags, ["job", "cod"], ["writ"]), (s, tags)
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    tasks = make_tasks(n)
+    weights = legacy_weights()
+
+    # 1) 一致の確認
+    # state 補正は公開の adjust_score_by_state と全件一致（dict のタグ・文字列1個の tags も含めて）。
+    # タグが文字列の list のタスクは、以前の adjust_score_by_state とも完全に同じ
+    sample = list(tasks[:3000])
+    for i in range(13, len(sample), 13):
+        d = sample[i].to_dict()
+        d["tags"] = TAGS[i % len(TAGS)]  # 文字列1個の tags
+        sample[i] = Task.from_dict(d)
+    for state in STATES:
+        engine = ScoringEngine.from_sources(TAGS_MASTER, PROJECTS, state, today=TODAY)
+        for t, st in zip(sample, engine.score_all(sample)):
+            got = (st.days_left, st.base_score, st.score)
+            want = legacy_score(t, state, TODAY, weights, adjust=adjust_score_by_state)
+            assert got == want, (t, got, want)
+            raw_tags = t.get("tags", [])
+            if isinstance(raw_tags, list) and all(isinstance(tag, str) for tag in raw_tags):
+                legacy = legacy_score(t, state, TODAY, weights)
+                assert got == legacy, (t, got, legacy)
+    check_axis_index()
+    print("parity: OK  （adjust_score_by_state と全件一致）")
+
+    if scoring.load_numpy() is not None:
+        odd = with_odd_values(tasks)
+        for state in STATES:
+            engine = ScoringEngine.from_sources(TAGS_MASTER, PROJECTS, state, today=TODAY)
+            py = [(st.id, st.days_left, st.base_score, st.score) for st in engine.score_all_python(odd)]
+            vec = [(st.id, st.days_left, st.base_score, st.score) for st in engine.score_all_vectorized(odd)]
+            assert py == vec, next((a, b) for a, b in zip(py, vec) if a != b)
+        print("parity (numpy): OK")
+    else:
+        print("parity (numpy): NumPy が無いので飛ばしました")
+
+    cache = ScoreCache(len(tasks) * 2)
+    for state in STATES:
+        plain = ScoringEngine.from_sources(TAGS_MASTER, PROJECTS, state, today=TODAY)
+        cached = ScoringEngine.from_sources(TAGS_MASTER, PROJECTS, state, today=TODAY, cache=cache)
+        want = [(st.id, st.days_left, st.base_score, st.score) for st in plain.score_all_python(tasks)]
+        for _ in range(2):  # 1回目は外れ、2回目は当たり
+            got = [(st.id, st.days_left, st.base_score, st.score) for st in cached.score_all_python(tasks)]
+            assert got == want
+    before = cache.stats()
+    cached.score_all_python(tasks[1:])  # 1件完了した後の再計算
+    after = cache.stats()
+    print(f"parity (cache): OK  完了後の再計算で外れた件数={after['misses'] - before['misses']}")
+
+    # 2) 速さ
+    state = STATES[1]
+    t0 = time.perf_counter()
+    for t in tasks:
+        legacy_score(t, state, TODAY, weights)
+    legacy = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    ScoringEngine.from_sources(TAGS_MASTER, PROJECTS, state, today=TODAY).score_all_python(tasks)
+    engine = time.perf_counter() - t0
+
+    print(f"tasks : {n}")
+    print(f"legacy: {legacy * 1e6 / n:7.2f} us/task")
+    print(f"engine: {engine * 1e6 / n:7.2f} us/task  (x{legacy / engine:.1f})")
+
+    cache = ScoreCache(len(tasks) * 2)
+    cached = ScoringEngine.from_sources(TAGS_MASTER, PROJECTS, state, today=TODAY, cache=cache)
+    cached.score_all_python(tasks)
+    t0 = time.perf_counter()
+    ScoringEngine.from_sources(TAGS_MASTER, PROJECTS, state, today=TODAY, cache=cache).score_all_python(tasks)
+    warm = time.perf_counter() - t0
+    print(f"cache : {warm * 1e6 / n:7.2f} us/task  (x{legacy / warm:.1f}, 全件ヒット)")
+
+    if scoring.load_numpy() is not None:
+        frozen = tuple(tasks)  # load_todo_task_models と同じく tuple なら列データを使い回す
+        for label in ("numpy (列を作る)", "numpy (列を再利用)"):
+            t0 = time.perf_counter()
+            ScoringEngine.from_sources(TAGS_MASTER, PROJECTS, state, today=TODAY).score_all_vectorized(frozen)
+            vec = time.perf_counter() - t0
+            print(f"{label}: {vec * 1e6 / n:7.2f} us/task  (x{legacy / vec:.1f})")
+
+
+if __name__ == "__main__":
+    main()
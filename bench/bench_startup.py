@@ -0,0 +1,109 @@
+# bench/bench_startup.py
+"""
+起動時間の確認用スクリプト（`python -X importtime` を使う）。
+1. `python app.py list` と `import web_server`（サーバーは起動しない）を何回か別プロセスで動かし、かかった時間の中央値を出す
+2. import の内訳（-X importtime の cumulative が大きい順）を出す
+3. `app.py list` が openai / numpy を import していないか（＝オフラインでも速く動くか）を確かめる
+
+OPENAI_API_KEY は外して動かす（キーが無くても起動できることの確認も兼ねる）。
+--max-ms を付けると、中央値がそれを超えたケースがあれば終了コード 1 にする（遅くなったのに気づく用）。
+
+使い方: python bench/bench_startup.py [回数=5] [--max-ms ミリ秒]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CASES = [
+    ("app.py list", ["app.py", "list"], ("openai", "numpy")),
+    ("import web_server", ["-c", "import web_server"], ("openai", "numpy")),
+]
+
+
+def run_once(args: list[str]) -> tuple[float, str]:
+    env = dict(os.environ)
+    env.pop("OPENAI_API_KEY", None)
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT, env=env, capture_output=True, text=True, encoding="utf-8", errors="replace",
+    )
+    elapsed = time.perf_counter() - t0
+    if proc.returncode != 0:
+        print(proc.stdout[-2000:])
+        print(proc.stderr[-2000:])
+        raise SystemExit(f"起動に失敗しました: {' '.join(args)} (exit={proc.returncode})")
+    return elapsed, proc.stderr
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """-X importtime の出力を (モジュール名, self[us], cumulative[us]) のリストにする（トップレベルだけ）。"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        try:
+            parts = line[len("import time:"):].split("|")
+            self_us, cum_us, name = int(parts[0]), int(parts[1]), parts[2]
+        except (ValueError, IndexError):
+            continue
+        if name.startswith(" ") and not name.startswith("  "):  # 先頭の空白1つ＝トップレベル
+            rows.append((name.strip(), self_us, cum_us))
+    return rows
+
+
+def imported_modules(stderr: str) -> set[str]:
+    names = set()
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "[us]" not in line:
+            names.add(line.rsplit("|", 1)[-1].strip())
+    return names
+
+
+def main() -> None:
+    argv = sys.argv[1:]
+    max_ms = None
+    if "--max-ms" in argv:
+        i = argv.index("--max-ms")
+        max_ms = float(argv[i + 1])
+        del argv[i:i + 2]
+    repeat = int(argv[0]) if argv else 5
+
+    failed = False
+    for label, args, forbidden in CASES:
+        times = []
+        stderr = ""
+        for _ in range(repeat):
+            elapsed, stderr = run_once(args)
+            times.append(elapsed)
+        median_ms = statistics.median(times) * 1000
+
+        rows = parse_importtime(stderr)
+        total_ms = sum(cum for _, _, cum in rows) / 1000
+        print(f"=== {label} ===")
+        print(f"wall  : {median_ms:7.1f} ms (中央値, {repeat}回)")
+        print(f"import: {total_ms:7.1f} ms (トップレベルの cumulative 合計)")
+        for name, _, cum in sorted(rows, key=lambda r: r[2], reverse=True)[:8]:
+            print(f"  {cum / 1000:7.1f} ms  {name}")
+
+        loaded = imported_modules(stderr)
+        heavy = [m for m in forbidden if m in loaded]
+        if heavy:
+            print(f"[NG] 起動時に読み込まれています: {', '.join(heavy)}")
+            failed = True
+        if max_ms is not None and median_ms > max_ms:
+            print(f"[NG] {max_ms:.0f} ms を超えました")
+            failed = True
+        print()
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
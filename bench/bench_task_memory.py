@@ -0,0 +1,73 @@
+# bench/bench_task_memory.py
+"""
+tasks.jsonl 相当のタスクを dict のまま持つ場合と Task（__slots__）で持つ場合の
+常駐メモリを tracemalloc で比べる。
+
+使い方: python bench/bench_task_memory.py [件数=100000]
+"""
+import gc
+import json
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from task_model import Task  # noqa: E402
+
+PROJECTS = ["default", "job", "portfolio", "novel_game", "study"]
+TAGS = ["job_search", "coding", "writing", "light", "medium", "heavy", "admin", "start"]
+
+
+def make_lines(n: int) -> list[str]:
+    """実データに近い JSONL 行を作る（json.loads した文字列は intern されない点も再現する）。"""
+    lines = []
+    for i in range(1, n + 1):
+        task = {
+            "id": i,
+            "created_at": f"2025-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}T09:00:00",
+            "text": f"タスク {i} の内容をそれなりの長さで書いておく",
+            "project": PROJECTS[i % len(PROJECTS)],
+            "tags": [TAGS[i % len(TAGS)], TAGS[(i * 3) % len(TAGS)]],
+            "status": "done" if i % 4 else "todo",
+        }
+        if i % 3 == 0:
+            task["due_date"] = f"2026-{(i % 12) + 1:02d}-15"
+        if i % 5 == 0:
+            task["priority_hint"] = "high"
+        lines.append(json.dumps(task, ensure_ascii=False))
+    return lines
+
+
+def measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    objs = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objs
+    gc.collect()
+    return current
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    lines = make_lines(n)
+
+    as_dict = measure(lambda: [json.loads(s) for s in lines])
+    as_task = measure(lambda: [Task.from_dict(json.loads(s)) for s in lines])
+
+    # 往復で中身が変わらないことも確認しておく
+    for s in lines[:1000]:
+        d = json.loads(s)
+        assert Task.from_dict(d).to_dict() == d
+
+    mb = 1024 * 1024
+    print(f"tasks: {n}")
+    print(f"dict : {as_dict / mb:8.1f} MB  ({as_dict / n:6.0f} B/task)")
+    print(f"Task : {as_task / mb:8.1f} MB  ({as_task / n:6.0f} B/task)")
+    print(f"削減 : {(1 - as_task / as_dict) * 100:5.1f} %")
+
+
+if __name__ == "__main__":
+    main()
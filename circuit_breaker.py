@@ -0,0 +1,123 @@
+# circuit_breaker.py
+"""
+千紗（LLM）への呼び出しのサーキットブレーカー。
+API が落ちている・遅いときに、毎回タイムアウトまで待ってからローカルに落ちるのをやめる。
+
+- closed:    普通に呼ぶ。失敗か遅い呼び出し（slow_seconds 超え）が failure_threshold 回続いたら open へ
+- open:      cooldown 秒のあいだは呼ばずにすぐ失敗させる（呼び出し側はローカルの並びで返す）
+- half_open: cooldown が明けたら1本だけ試しに通す。成功すれば closed、失敗すればまた open
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any
+
+from config import BREAKER_COOLDOWN, BREAKER_FAILURES, BREAKER_SLOW_SECONDS
+from errors import ChisaError
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(ChisaError):
+    def __init__(self, name: str, retry_in: float) -> None:
+        super().__init__(
+            "E_LLM_CIRCUIT_OPEN",
+            f"{name} は応答がないため一時的に呼び出しを止めています",
+            meta={"breaker": name, "retry_in": round(retry_in, 1)},
+        )
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, slow_seconds: float, cooldown: float) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.slow_seconds = slow_seconds
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.trips = 0
+        self.calls = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.short_circuited = 0
+        self.last_error: str | None = None
+
+    def _retry_in(self, now: float) -> float:
+        return max(0.0, self.opened_at + self.cooldown - now)
+
+    def before_call(self) -> None:
+        """呼んでよければ何もしない。止めている間は CircuitOpenError。"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == OPEN:
+                if now - self.opened_at < self.cooldown:
+                    self.short_circuited += 1
+                    raise CircuitOpenError(self.name, self._retry_in(now))
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._probing:  # 試しの1本が戻るまで、ほかは通さない
+                    self.short_circuited += 1
+                    raise CircuitOpenError(self.name, 0.0)
+                self._probing = True
+            self.calls += 1
+
+    def record_success(self, latency: float) -> None:
+        """成功。ただし slow_seconds を超えていたら失敗と同じに数える。"""
+        if latency > self.slow_seconds:
+            with self._lock:
+                self.slow_calls += 1
+            self.record_failure(f"slow call: {latency:.1f}s")
+            return
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self._probing = False
+
+    def record_failure(self, error: str = "") -> None:
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = error or None
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.trips += 1
+                    print(f"[警告] {self.name} を止めます（連続 {self.consecutive_failures} 回失敗、{self.cooldown:.0f} 秒）")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def healthy(self) -> bool:
+        """閉じていて、直近の呼び出しが失敗していないか。"""
+        with self._lock:
+            return self.state == CLOSED and self.consecutive_failures == 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            state = self.state
+            retry_in = self._retry_in(time.monotonic()) if state == OPEN else 0.0
+            if state == OPEN and retry_in == 0.0:
+                state = HALF_OPEN  # 次の呼び出しで試す
+            return {
+                "state": state,
+                "retry_in": round(retry_in, 1),
+                "consecutive_failures": self.consecutive_failures,
+                "trips": self.trips,
+                "calls": self.calls,
+                "failures": self.failures,
+                "slow_calls": self.slow_calls,
+                "short_circuited": self.short_circuited,
+                "last_error": self.last_error,
+                "failure_threshold": self.failure_threshold,
+                "slow_seconds": self.slow_seconds,
+                "cooldown": self.cooldown,
+            }
+
+
+# gpt_client の呼び出しすべてで共有する
+llm_breaker = CircuitBreaker("chisa_llm", BREAKER_FAILURES, BREAKER_SLOW_SECONDS, BREAKER_COOLDOWN)
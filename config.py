@@ -12,7 +12,80 @@ DATA_DIR.mkdir(exist_ok=True)
 # ファイルパス
 TAGS_MASTER_PATH: Path = DATA_DIR / "tags_master.json"
 TASKS_PATH: Path = DATA_DIR / "tasks.jsonl"
+TASKS_INDEX_PATH: Path = DATA_DIR / "tasks.idx"
+TASKS_EVENTS_PATH: Path = DATA_DIR / "tasks.events.jsonl"
+TASKS_SEQ_PATH: Path = DATA_DIR / "tasks.seq"
 PROJECTS_PATH: Path = DATA_DIR / "projects.json"
+STATE_PATH: Path = DATA_DIR / "state.json"
+SQLITE_PATH: Path = DATA_DIR / "chisa.sqlite3"
+# done になったタスクの置き場（月別セグメント tasks-YYYY-MM.jsonl と manifest.json）
+ARCHIVE_DIR: Path = DATA_DIR / "archive"
+ARCHIVE_MANIFEST_PATH: Path = ARCHIVE_DIR / "manifest.json"
+ARCHIVE_TEXTS_PATH: Path = ARCHIVE_DIR / "text_hashes.txt"
+# 今日のおすすめの保存先（入力が変わったときだけ作り直す）
+TODAY_PATH: Path = DATA_DIR / "today.json"
 
 OPENAI_API_KEY: str = os.environ.get("OPENAI_API_KEY", "")
 
+# 保存先: "jsonl"（既定。data/*.jsonl, *.json）または "sqlite"（data/chisa.sqlite3）
+STORAGE_BACKEND: str = os.environ.get("CHISA_STORAGE_BACKEND", "jsonl").strip().lower()
+
+# fsync の方針: "always"（追記も置き換えも）/ "replace"（既定。置き換え時だけ）/ "never"
+FSYNC_POLICY: str = os.environ.get("CHISA_FSYNC", "replace").strip().lower()
+
+# タスク更新をイベントログ（tasks.events.jsonl）への追記で行うか
+TASKS_EVENT_LOG: bool = os.environ.get("CHISA_TASKS_EVENT_LOG", "") == "1"
+# イベントがこの件数を超えたら tasks.jsonl に畳み込む
+TASKS_COMPACT_THRESHOLD: int = int(os.environ.get("CHISA_TASKS_COMPACT_THRESHOLD", "200"))
+
+
+# todo がこの件数以上なら NumPy でまとめてスコア計算する（NumPy が無ければ常に Python のループ）
+VECTOR_SCORING_MIN_TASKS: int = int(os.environ.get("CHISA_VECTOR_SCORING_MIN", "2000"))
+# タスクごとのスコアを覚えておく件数（LRU、0 で無効）
+SCORE_CACHE_SIZE: int = int(os.environ.get("CHISA_SCORE_CACHE_SIZE", "50000"))
+
+# 千紗（LLM）の返答キャッシュ（data/llm_cache/）。CHISA_LLM_CACHE=0 で使わない
+LLM_CACHE_DIR: Path = DATA_DIR / "llm_cache"
+LLM_CACHE_ENABLED: bool = os.environ.get("CHISA_LLM_CACHE", "1") != "0"
+# 覚えておく件数と有効期間（秒）
+LLM_CACHE_SIZE: int = int(os.environ.get("CHISA_LLM_CACHE_SIZE", "256"))
+LLM_CACHE_TTL: float = float(os.environ.get("CHISA_LLM_CACHE_TTL", str(6 * 60 * 60)))
+# タグ提案はタイトルと tags_master の版で決まるので、件数多め・期間長め
+LLM_TAG_CACHE_SIZE: int = int(os.environ.get("CHISA_LLM_TAG_CACHE_SIZE", "2000"))
+LLM_TAG_CACHE_TTL: float = float(os.environ.get("CHISA_LLM_TAG_CACHE_TTL", str(30 * 24 * 60 * 60)))
+# タグ提案は1件ずつ put されるので、ファイルへの書き出しはこの秒数ぶんまとめる（0 なら毎回書く）
+LLM_TAG_CACHE_FLUSH: float = float(os.environ.get("CHISA_LLM_TAG_CACHE_FLUSH", "2"))
+
+# まとめてタグ付けするときの1リクエストあたりの件数と、同時に投げるリクエスト数
+TAG_BATCH_SIZE: int = int(os.environ.get("CHISA_TAG_BATCH_SIZE", "20"))
+TAG_BATCH_WORKERS: int = int(os.environ.get("CHISA_TAG_BATCH_WORKERS", "4"))
+
+# 千紗に送る候補の数・1プロジェクトあたりの上限・タスク名の最大文字数
+PROMPT_CANDIDATES: int = int(os.environ.get("CHISA_PROMPT_CANDIDATES", "20"))
+PROMPT_PER_PROJECT: int = int(os.environ.get("CHISA_PROMPT_PER_PROJECT", "6"))
+PROMPT_TEXT_MAX: int = int(os.environ.get("CHISA_PROMPT_TEXT_MAX", "80"))
+# その手前でスコア上位から取っておく候補の数（ここからプロジェクトの偏りを抑えて PROMPT_CANDIDATES 件選ぶ）。
+# 既定は PROMPT_CANDIDATES の3倍で、PROMPT_CANDIDATES より少なくはしない
+RECOMMEND_CANDIDATES: int = max(
+    int(os.environ.get("CHISA_RECOMMEND_CANDIDATES", str(PROMPT_CANDIDATES * 3))), PROMPT_CANDIDATES
+)
+
+# /api/today の千紗による並べ替えを回すバックグラウンドのスレッド数
+RANKING_WORKERS: int = int(os.environ.get("CHISA_RANKING_WORKERS", "2"))
+# 並べ替えに失敗したら、この秒数は同じ入力で千紗に聞き直さない（その間 /api/today は失敗したジョブを返す）
+RANKING_RETRY_AFTER: float = float(os.environ.get("CHISA_RANKING_RETRY_AFTER", "60"))
+
+# 千紗（LLM）の呼び出しの既定のタイムアウト（秒。呼び出し側が budget を渡さなかったとき）
+LLM_TIMEOUT: float = float(os.environ.get("CHISA_LLM_TIMEOUT", "30"))
+# /api/today の並べ替え1回に千紗を待つ上限（秒）
+TODAY_LLM_BUDGET: float = float(os.environ.get("CHISA_TODAY_LLM_BUDGET", "20"))
+# サーキットブレーカー：連続この回数の失敗（または遅い呼び出し）で止め、この秒数たったら1本だけ試す
+BREAKER_FAILURES: int = int(os.environ.get("CHISA_BREAKER_FAILURES", "3"))
+BREAKER_SLOW_SECONDS: float = float(os.environ.get("CHISA_BREAKER_SLOW", "15"))
+BREAKER_COOLDOWN: float = float(os.environ.get("CHISA_BREAKER_COOLDOWN", "60"))
+
+# 千紗（LLM）の呼び出し先: "openai"（既定）または "http"（標準ライブラリで OpenAI 互換 API を叩く）
+LLM_BACKEND: str = os.environ.get("CHISA_LLM_BACKEND", "openai").strip().lower()
+# OpenAI 互換 API の URL（例: llm_stub_server.py なら http://127.0.0.1:8765/v1）。空なら OpenAI 本体
+LLM_BASE_URL: str = os.environ.get("CHISA_LLM_BASE_URL", "").strip()
+LLM_MODEL: str = os.environ.get("CHISA_LLM_MODEL", "gpt-4o-mini").strip()
@@ -0,0 +1,103 @@
+# deadline_index.py
+"""
+todo タスクの締切インデックス。
+タスクの due_date（無ければプロジェクトの default_due_date）を一度だけ日付の序数にしておき、
+(序数, id) の昇順リストを二分探索して「期限切れ」「N日以内」「期限なし」を O(log N) で答える。
+
+序数は「今日」に依存しないので、日付が変わっても作り直さない（問い合わせ側の今日をずらすだけ）。
+境界の位置は今日ごとに覚えておき、日付が変わったときだけ二分探索し直す。
+"""
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Any, Iterable
+
+from task_model import MISSING, Task
+
+
+def effective_due(task: Task, project_due: dict[str, str]) -> Any:
+    """スコア計算と同じ規則の期日（タスク → プロジェクトの default_due_date）。"""
+    due = task.due_date
+    if due is MISSING or not due:
+        project = task.project
+        return project_due.get(project) if isinstance(project, str) else None
+    return due
+
+
+def _ordinal(due: Any) -> int | None:
+    if not isinstance(due, str) or not due:
+        return None
+    try:
+        return date.fromisoformat(due).toordinal()
+    except ValueError:
+        return None
+
+
+class DeadlineIndex:
+    """作ったら書き換えない。タスクが変わったら storage.load_deadline_index が作り直す。"""
+
+    __slots__ = ("ordinals", "ids", "no_deadline", "tasks", "_pivots")
+
+    def __init__(self, tasks: Iterable[Task], projects: Any) -> None:
+        project_due: dict[str, str] = {}
+        if isinstance(projects, dict):
+            for pid, info in projects.items():
+                if isinstance(info, dict) and info.get("default_due_date"):
+                    project_due[pid] = info["default_due_date"]
+
+        entries: list[tuple[int, int]] = []
+        no_deadline: list[int] = []
+        self.tasks: dict[int, Task] = {}
+        for t in tasks:
+            tid = t.id
+            if not isinstance(tid, int) or tid in self.tasks:
+                continue
+            self.tasks[tid] = t
+            ordinal = _ordinal(effective_due(t, project_due))
+            if ordinal is None:
+                no_deadline.append(tid)
+            else:
+                entries.append((ordinal, tid))
+
+        entries.sort()
+        self.ordinals: list[int] = [e[0] for e in entries]
+        self.ids: list[int] = [e[1] for e in entries]
+        self.no_deadline: list[int] = no_deadline
+        self._pivots: tuple[int, int, int] | None = None  # (今日の序数, 今日の先頭, 今日の末尾の次)
+
+    def _today_bounds(self, today: date) -> tuple[int, int]:
+        """今日の序数より前が期限切れ。今日の分の [先頭, 末尾の次) を返す（日付が変わったときだけ探し直す）。"""
+        t = today.toordinal()
+        pivots = self._pivots
+        if pivots is None or pivots[0] != t:
+            pivots = (t, bisect_left(self.ordinals, t), bisect_right(self.ordinals, t))
+            self._pivots = pivots
+        return pivots[1], pivots[2]
+
+    def _slice(self, lo: int, hi: int, today: date) -> list[tuple[int, int]]:
+        t = today.toordinal()
+        return [(tid, o - t) for tid, o in zip(self.ids[lo:hi], self.ordinals[lo:hi])]
+
+    def overdue(self, today: date) -> list[tuple[int, int]]:
+        """期日が今日より前の (id, days_left)（期日の古い順）。"""
+        lo, _ = self._today_bounds(today)
+        return self._slice(0, lo, today)
+
+    def due_within(self, today: date, days: int) -> list[tuple[int, int]]:
+        """期日が今日から days 日後までの (id, days_left)（今日を含む、期日順）。"""
+        lo, _ = self._today_bounds(today)
+        hi = bisect_right(self.ordinals, today.toordinal() + days, lo)
+        return self._slice(lo, hi, today)
+
+    def counts(self, today: date) -> dict[str, int]:
+        """バケットごとの件数（どれも二分探索だけで出す）。"""
+        lo, hi = self._today_bounds(today)
+        t = today.toordinal()
+        return {
+            "overdue": lo,
+            "today": hi - lo,
+            "within_3": bisect_right(self.ordinals, t + 3, lo) - lo,
+            "within_7": bisect_right(self.ordinals, t + 7, lo) - lo,
+            "no_deadline": len(self.no_deadline),
+        }
@@ -1,38 +1,80 @@
 from pathlib import Path
-import os
 import json
+import time
 from typing import Any
 
 from dotenv import load_dotenv
-from openai import OpenAI
 
-from config import TAGS_MASTER_PATH
+from circuit_breaker import CircuitOpenError, llm_breaker
+from config import LLM_TIMEOUT, TAGS_MASTER_PATH, TAG_BATCH_SIZE, TAG_BATCH_WORKERS
+from errors import ChisaError
+from llm_backend import cache_scope, get_backend
+from llm_cache import cache_key, priority_cache, tag_cache
+from prompt_builder import estimate_tokens, project_for_prompt, prompt_stats, select_prompt_candidates
+from scoring import top_k, local_rank_key
+from task_model import normalize_task_text
 
 load_dotenv(Path(__file__).resolve().parent / ".env")
 
 
+def _create_response(system_msg: str, user_msg: str, budget: float | None) -> tuple[str, float]:
+    """
+    llm_breaker を通して千紗に1回聞く。戻り値は (返ってきた文字列, かかった秒数)。
+    どこに聞くかは llm_backend.get_backend() 次第（OpenAI 本体・スタブなど）。
+    budget はこの呼び出しに使ってよい秒数（呼び出し側が決める。None なら LLM_TIMEOUT）。
+    ブレーカーが開いていれば呼ばずに CircuitOpenError。
+    """
+    llm_breaker.before_call()
+    started = time.perf_counter()
+    try:
+        content = get_backend().complete_json(system_msg, user_msg, LLM_TIMEOUT if budget is None else budget)
+    except Exception as e:
+        llm_breaker.record_failure(f"{type(e).__name__}: {e}")
+        raise
+    latency = time.perf_counter() - started
+    llm_breaker.record_success(latency)
+    return content, latency
 
-API_KEY = os.environ.get("OPENAI_API_KEY", "")
-if not API_KEY:
-    raise RuntimeError(
-        "環境変数 OPENAI_API_KEY が設定されていません。\n"
-        "設定方法:\n"
-        "  Windows: set OPENAI_API_KEY=sk-...\n"
-        "  Mac/Linux: export OPENAI_API_KEY=sk-..."
-    )
-client = OpenAI(api_key=API_KEY)
 
-def load_tag_candidates() -> list[str]:
-    """tags_master.jsonからタグ候補を動的に読み込む"""
-    if not TAGS_MASTER_PATH.exists():
+DEFAULT_TAG_CANDIDATES: tuple[str, ...] = ("job_search", "portfolio", "coding", "admin", "light", "medium", "heavy")
+
+# (tags_master.json の sig, タグ候補, 候補の版)
+_tag_candidates_memo: tuple[tuple[int, int] | None, tuple[str, ...], str] | None = None
+
+
+def _tag_candidates() -> tuple[tuple[str, ...], str]:
+    """
+    (タグ候補, その版)。tags_master.json の (size, mtime_ns) が変わるまで前回の結果を使う。
+    版は候補の中身から作るので、タグ提案キャッシュのキーに入れると tags_master を直したときに外れる。
+    """
+    global _tag_candidates_memo
+    try:
+        st = TAGS_MASTER_PATH.stat()
+        sig: tuple[int, int] | None = (st.st_size, st.st_mtime_ns)
+    except FileNotFoundError:
+        sig = None
+
+    memo = _tag_candidates_memo
+    if memo is not None and memo[0] == sig:
+        return memo[1], memo[2]
+
+    if sig is None:
         print(f"[警告] {TAGS_MASTER_PATH} が見つかりません。")
         print("デフォルトタグを使用します。")
-        return ["job_search", "portfolio", "coding", "admin", "light", "medium", "heavy"]
-    
-    with open(TAGS_MASTER_PATH, encoding="utf-8") as f:
-        data = json.load(f)
-    
-    return [tag["key"] for tag in data.get("tags", [])]
+        candidates = DEFAULT_TAG_CANDIDATES
+    else:
+        with open(TAGS_MASTER_PATH, encoding="utf-8") as f:
+            data = json.load(f)
+        candidates = tuple(tag["key"] for tag in data.get("tags", []))
+
+    version = cache_key("tags_master", candidates)[:16]
+    _tag_candidates_memo = (sig, candidates, version)
+    return candidates, version
+
+
+def load_tag_candidates() -> list[str]:
+    """tags_master.jsonからタグ候補を動的に読み込む（ファイルが変わるまで読み直さない）"""
+    return list(_tag_candidates()[0])
   
   
 """コメントアウト（過去のタグリスト）
@@ -116,8 +158,8 @@ PRIORITY_SYSTEM_PROMPT: str = """
   - 例: can_sit_at_desk, can_go_outside,
         physical_energy, mental_energy, creative_drive,
         money_pressure_creative, study_deadline_days など
-- tasks: タスク配列（status=="todo" のものが対象）
-  - 各タスクには tags, project, due_date などが含まれる
+- tasks: タスク配列（status=="todo" のうち、ローカル優先度の高いものだけ）
+  - 各タスクは id, text, tags, days_left（締切までの日数。null は締切なし）, score（ローカル優先度）
 
 主なタグの意味（重要なものだけ）:
 - job_search: 就活（応募書類・面談準備）→ 緊急度の高いカテゴリ
@@ -186,6 +228,7 @@ PRIORITY_SYSTEM_PROMPT: str = """
 def _normalize_state_for_chisa(state: dict[str, Any]) -> dict[str, Any]:
     """千紗が判断しやすいキーに寄せて補完する（全除外防止）"""
     s = dict(state or {})
+    s.pop("axis_index", None)  # スコア計算用の前計算なので千紗には渡さない
 
     energy = s.get("energy_budget")
     if "physical_energy" not in s:
@@ -203,13 +246,41 @@ def _normalize_state_for_chisa(state: dict[str, Any]) -> dict[str, Any]:
     return s
 
 
+def _validate_ordered(ordered: list[Any], todo: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """千紗の ordered_tasks を正規化する（存在するIDだけ、型崩れ防止、最大5件）。"""
+    valid_ids = {int(t["id"]) for t in todo if "id" in t}
+    out: list[dict[str, Any]] = []
+
+    for item in ordered:
+        if not isinstance(item, dict):
+            continue
+        raw_id = item.get("id")
+        try:
+            task_id = int(raw_id)
+        except (TypeError, ValueError):
+            continue
+        if task_id not in valid_ids:
+            continue
+        reason = str(item.get("reason", "")).strip()
+        out.append({"id": task_id, "reason": reason})
+
+    return out[:5]
+
+
 def chisa_suggest_priority(
     tasks: list[dict[str, Any]],
     state: dict[str, Any],
+    use_cache: bool = True,
+    budget: float | None = None,
+    strict: bool = False,
 ) -> list[dict[str, Any]]:
     """
     今日の state と todoタスク一覧を渡して、
     千紗に「今日のおすすめタスク順」を聞く。
+    同じ state・同じタスクへの答えは priority_cache から返す（use_cache=False で毎回聞く）。
+    budget は千紗を待つ上限の秒数（None なら LLM_TIMEOUT）。llm_breaker が開いていればすぐローカル順で返す。
+    strict=True なら、千紗（かキャッシュ）の答えが得られずローカル順に落ちるときに
+    ChisaError("E_LLM_UNAVAILABLE") を投げる（件数が少なくて千紗に聞かないときはそのまま返す）。
 
     戻り値: [{ "id": int, "reason": str }, ...]
     """
@@ -222,15 +293,22 @@ def chisa_suggest_priority(
     if len(todo) <= 2:
         return [{"id": int(t["id"]), "reason": "件数が少ないため、そのまま候補にします"} for t in todo]
 
+    def fallback(reason: str, meta: dict[str, Any] | None = None) -> list[dict[str, Any]]:
+        if strict:
+            raise ChisaError("E_LLM_UNAVAILABLE", f"千紗に並べ替えてもらえませんでした（{reason}）", meta=meta)
+        todo_sorted = top_k(todo, 5, key=local_rank_key)
+        return [{"id": int(t["id"]), "reason": f"{reason}ためローカル優先度で提示します"} for t in todo_sorted]
+
     # 「AIが空返しする」ケースが多いなら、ここを 3 にしてもいい（<=3でAI呼ばない）
     if len(todo) <= 3:
         # score があれば高い順、なければそのまま
-        todo_sorted = sorted(todo, key=lambda x: (x.get("score") is None, -(x.get("score") or 0)))
+        todo_sorted = top_k(todo, len(todo), key=local_rank_key)
         return [{"id": int(t["id"]), "reason": "件数が少ないため、ローカル優先度で提示します"} for t in todo_sorted]
 
     # --- 2) プロンプト用のstate正規化（全除外防止） ---
     def _normalize_state_for_chisa(s: dict[str, Any]) -> dict[str, Any]:
         s = dict(s or {})
+        s.pop("axis_index", None)  # スコア計算用の前計算なので千紗には渡さない
         energy = s.get("energy_budget")
 
         s.setdefault("physical_energy", "low" if energy in ("short", "tiny") else "medium")
@@ -246,8 +324,12 @@ def chisa_suggest_priority(
 
     state_norm = _normalize_state_for_chisa(state)
 
+    # --- 3) 送るタスクはローカル上位だけ、項目も最小限に（todo が増えてもプロンプトの大きさは一定） ---
+    candidates = select_prompt_candidates(todo)
+    payload = [project_for_prompt(t) for t in candidates]
+
     state_json: str = json.dumps(state_norm, ensure_ascii=False)
-    tasks_json: str = json.dumps(todo, ensure_ascii=False)
+    tasks_json: str = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
 
     user_msg: str = f"""
 これから小鳥遊の「今日の状態」と「タスク一覧」を渡します。
@@ -270,53 +352,30 @@ def chisa_suggest_priority(
 - 出力は必ず JSON のみ（ordered_tasks配列）で返してください。
 """.strip()
 
-    print("[DEBUG] chisa_suggest_priority called. todo=", len(todo))
+    print("[DEBUG] chisa_suggest_priority called. todo=", len(todo), "sent=", len(payload))
+
+    # キャッシュから出した答えも、下の id の検証は同じように通す
+    key = cache_key("priority", cache_scope(), PRIORITY_SYSTEM_PROMPT, state_norm, payload)
+    cached = priority_cache.get(key) if use_cache else None
+    if cached is not None:
+        print("[DEBUG] chisa_suggest_priority: cache hit")
+        out = _validate_ordered(cached, candidates)
+        if out:
+            return out
+
+    tokens = estimate_tokens(PRIORITY_SYSTEM_PROMPT) + estimate_tokens(user_msg)
+    prompt_stats.record(tokens, len(payload), len(todo))
+    print("[DEBUG] chisa_suggest_priority prompt_tokens(est)=", tokens)
 
     try:
-        resp = client.responses.create(
-            model="gpt-4o-mini",
-            input=[
-                {"role": "system", "content": PRIORITY_SYSTEM_PROMPT},
-                {"role": "user", "content": user_msg},
-            ],
-            text={"format": {"type": "json_object"}},
-            timeout=30.0,
-        )
-
-        content: str = resp.output_text or "{}"
+        content, latency = _create_response(PRIORITY_SYSTEM_PROMPT, user_msg, budget)
+
         data = json.loads(content) if content else {}
         ordered = data.get("ordered_tasks", []) if isinstance(data, dict) else []
 
-        # --- 3) AIが空配列ならフォールバック（ここが今回の主目的その2） ---
-        if not ordered:
-            print("[INFO] ordered_tasks empty -> fallback(local)")
-            todo_sorted = sorted(todo, key=lambda x: (x.get("score") is None, -(x.get("score") or 0)))
-            return [{"id": int(t["id"]), "reason": "AIが候補を絞れなかったためローカル優先度で提示します"} for t in todo_sorted[:5]]
-
-        # --- 4) 返り値を正規化（存在するIDだけ、型崩れ防止） ---
-        valid_ids = {int(t["id"]) for t in todo if "id" in t}
-        out: list[dict[str, Any]] = []
-
-        for item in ordered:
-            if not isinstance(item, dict):
-                continue
-            raw_id = item.get("id")
-            try:
-                task_id = int(raw_id)
-            except (TypeError, ValueError):
-                continue
-            if task_id not in valid_ids:
-                continue
-            reason = str(item.get("reason", "")).strip()
-            out.append({"id": task_id, "reason": reason})
-
-        # それでも空になったらローカルに落とす（最後の保険）
-        if not out:
-            print("[INFO] normalized empty -> fallback(local)")
-            todo_sorted = sorted(todo, key=lambda x: (x.get("score") is None, -(x.get("score") or 0)))
-            return [{"id": int(t["id"]), "reason": "出力が不安定だったためローカル優先度で提示します"} for t in todo_sorted[:5]]
-
-        return out[:5]
+    except CircuitOpenError as e:
+        print("[情報] 千紗を一時的に止めています -> fallback(local)", e.meta)
+        return fallback("千紗が応答しない", e.meta)
 
     except Exception as e:
         import traceback
@@ -324,21 +383,44 @@ def chisa_suggest_priority(
         traceback.print_exc()
         print("今回は千紗なしで動作を続けます。")
         # フォールバック：スコア優先（なければ0扱い）
-        todo_sorted = sorted(todo, key=lambda x: (x.get("score") is None, -(x.get("score") or 0)))
-        return [{"id": int(t["id"]), "reason": "通信/解析に失敗したためローカル優先度で提示します"} for t in todo_sorted[:5]]
+        return fallback("通信/解析に失敗した", {"error": str(e)})
+
+    # --- 3) AIが空配列ならフォールバック（ここが今回の主目的その2） ---
+    if not ordered:
+        print("[INFO] ordered_tasks empty -> fallback(local)")
+        return fallback("AIが候補を絞れなかった")
+
+    # --- 4) 返り値を正規化（送ったIDだけ、型崩れ防止） ---
+    out = _validate_ordered(ordered, candidates)
+
+    # それでも空になったらローカルに落とす（最後の保険）
+    if not out:
+        print("[INFO] normalized empty -> fallback(local)")
+        return fallback("出力が不安定だった")
 
+    # 使える答えだけ覚えておく（フォールバックは覚えない）
+    priority_cache.put(key, ordered, latency)
+    return out
 
 
 
-def chisa_suggest_tags(title: str, detail: str) -> list[str]:
+
+def chisa_suggest_tags(title: str, detail: str, use_cache: bool = True, budget: float | None = None) -> list[str]:
     """
     千紗（ちさ）としてタスクのタグを提案する。
     返り値はタグ文字列のリスト（最大3個）。
+    正規化したタイトル・詳細が同じなら、同じ tags_master の版で前に出した答えを tag_cache から返す。
+    budget は千紗を待つ上限の秒数（None なら LLM_TIMEOUT）。
     """
     # タグ候補リストを1つの文字列にする（プロンプト用）
-    tag_candidates = load_tag_candidates()
+    tag_candidates, tags_version = _tag_candidates()
     tags_list_str = ", ".join(tag_candidates)
 
+    key = cache_key("tags", cache_scope(), tags_version, normalize_task_text(title), normalize_task_text(detail))
+    cached = tag_cache.get(key) if use_cache else None
+    if cached:
+        return [str(t) for t in cached if str(t) in tag_candidates][:3]
+
     system_msg = f"""
 あなたは「千紗（ちさ）」です。
 タスク管理・分類専用のAIとして動作します。
@@ -376,17 +458,8 @@ JSONのみで返してください。
 
 
     try:
-        resp = client.responses.create(
-            model="gpt-4o-mini",
-            input=[
-                {"role": "system", "content": system_msg},
-                {"role": "user", "content": user_msg},
-            ],
-            text={"format": {"type": "json_object"}},
-            timeout=30.0,
-)
-
-        content: str = resp.output_text or "{}"
+        content, latency = _create_response(system_msg, user_msg, budget)
+
 
     except Exception as e:
         print(f"[警告] 千紗へのタグ提案に失敗しました: {e}")
@@ -401,16 +474,140 @@ JSONのみで返してください。
         return []
 
     tags: list[str] = data.get("tags", [])
+    if not isinstance(tags, list):
+        tags = []
     
     # 候補リスト内のタグのみ返す
-    tag_candidates = load_tag_candidates()
     valid_tags = [str(t) for t in tags if str(t) in tag_candidates]
     
     # 候補外のタグがあれば警告
     if len(valid_tags) < len(tags):
-        invalid = set(tags) - set(valid_tags)
+        invalid = {str(t) for t in tags} - set(valid_tags)
         print(f"[警告] 候補外のタグが提案されました: {invalid}")
     
+    # 空の答えは覚えない（1回外しただけで TTL のあいだ付け直せなくなるので）
+    if valid_tags:
+        tag_cache.put(key, valid_tags[:3], latency)
     return valid_tags[:3]  # 最大3個に制限
 
 
+
+
+def _chisa_tag_chunk(
+    chunk: list[tuple[str, str, str]],
+    tag_candidates: tuple[str, ...],
+    budget: float | None,
+) -> tuple[dict[str, list[str]], float]:
+    """
+    (キャッシュキー, タイトル, 詳細) の並びを1回のリクエストでタグ付けする。
+    戻り値: (キャッシュキー -> タグ, かかった秒数)。返ってこなかったものは入らない。
+    """
+    tags_list_str = ", ".join(tag_candidates)
+    system_msg = f"""
+あなたは「千紗（ちさ）」です。
+タスク管理・分類専用のAIとして動作します。
+
+あなたの目的：
+- 与えられた複数のタスクそれぞれについて、最も適切なタグを0〜3個選択する。
+- タグは必ず定義済みリストから選ぶ。
+- 出力は必ず JSON のみとし、余計な文章は付けない。
+
+【タグ候補リスト】
+{tags_list_str}
+
+【出力形式】
+{{
+  "results": [
+    {{ "id": 入力の id（数値）, "tags": ["tag1", "tag2", ...] }}
+  ]
+}}
+
+【ルール】
+- タスクのタイトル・詳細を読み、カテゴリ → 性質 → 重さ の順に関連性を判断する。
+- 候補リストにない語は生成しない。
+- タグ数は各タスク最大3個。迷ったら重要度の高いものを優先する。
+- すべてのタスクについて、入力の id をそのまま付けて返す。
+- JSON以外の文章は出さない。
+""".strip()
+
+    payload = [{"id": i, "title": title, "detail": detail} for i, (_, title, detail) in enumerate(chunk)]
+    user_msg = f"""
+以下はタスクの一覧です。
+それぞれのタスクにふさわしいタグを選んでください。
+
+【タスク一覧（JSON）】
+{json.dumps(payload, ensure_ascii=False)}
+
+JSONのみで返してください。
+""".strip()
+
+    content, latency = _create_response(system_msg, user_msg, budget)
+
+    data = _safe_parse_json_object(content)
+    results = data.get("results", [])
+    out: dict[str, list[str]] = {}
+    for item in results if isinstance(results, list) else []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            i = int(item.get("id"))
+        except (TypeError, ValueError):
+            continue
+        tags = item.get("tags")
+        if not 0 <= i < len(chunk) or not isinstance(tags, list):
+            continue
+        out[chunk[i][0]] = [str(t) for t in tags if str(t) in tag_candidates][:3]
+    return out, latency
+
+
+def chisa_suggest_tags_batch(
+    items: list[dict[str, Any]],
+    use_cache: bool = True,
+    budget: float | None = None,
+) -> dict[Any, list[str]]:
+    """
+    たくさんのタスクをまとめてタグ付けする。
+    items: [{"id": 何か, "title": str, "detail": str（省略可）}, ...]
+    戻り値: {id: [タグ, ...]}。失敗したチャンクのタスクは入らない（呼び出し側で「未タグのまま」扱い）。
+
+    chisa_suggest_tags と同じ tag_cache を先に引き、外れたものだけを TAG_BATCH_SIZE 件ずつ
+    1リクエストにして、TAG_BATCH_WORKERS 本までの並列で投げる。
+    正規化したタイトル・詳細が同じタスクは1回だけ聞く。budget は1リクエストあたりの上限の秒数。
+    """
+    tag_candidates, tags_version = _tag_candidates()
+
+    keys_by_id: dict[Any, str] = {}
+    pending: dict[str, tuple[str, str, str]] = {}
+    results: dict[str, list[str]] = {}
+    for item in items:
+        title = str(item.get("title") or "")
+        detail = str(item.get("detail") or "")
+        key = cache_key("tags", cache_scope(), tags_version, normalize_task_text(title), normalize_task_text(detail))
+        keys_by_id[item.get("id")] = key
+        if key in results or key in pending:
+            continue
+        cached = tag_cache.get(key) if use_cache else None
+        if cached:
+            results[key] = [str(t) for t in cached if str(t) in tag_candidates][:3]
+        else:
+            pending[key] = (key, title, detail)
+
+    todo = list(pending.values())
+    chunks = [todo[i:i + TAG_BATCH_SIZE] for i in range(0, len(todo), max(TAG_BATCH_SIZE, 1))]
+    print(f"[DEBUG] chisa_suggest_tags_batch: items={len(items)} cached={len(results)} requests={len(chunks)}")
+
+    if chunks:
+        from concurrent.futures import ThreadPoolExecutor, as_completed  # まとめてタグ付けのときだけ使う
+
+        with ThreadPoolExecutor(max_workers=max(1, min(TAG_BATCH_WORKERS, len(chunks)))) as pool:
+            futures = {pool.submit(_chisa_tag_chunk, chunk, tag_candidates, budget): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                try:
+                    got, latency = future.result()
+                except Exception as e:
+                    print(f"[警告] 千紗へのまとめてタグ提案に失敗しました（{len(futures[future])}件）: {e}")
+                    continue
+                results.update(got)
+                tag_cache.put_many([(key, tags, latency / len(got)) for key, tags in got.items() if tags])
+
+    return {tid: results[key] for tid, key in keys_by_id.items() if key in results}
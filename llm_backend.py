@@ -0,0 +1,169 @@
+# llm_backend.py
+"""
+千紗（LLM）に「system と user のメッセージを渡して JSON の文字列をもらう」部分の差し替え口。
+gpt_client は get_backend().complete_json(...) だけを呼ぶので、どこに聞くかはここで決まる。
+
+- "openai"（既定）: openai パッケージの OpenAI クライアント（Responses API）。
+  CHISA_LLM_BASE_URL を付けると、そこ（例: llm_stub_server.py）に向く
+- "http": 標準ライブラリ（urllib）だけで OpenAI 互換の POST {base_url}/responses を叩く。
+  openai パッケージが無い環境（CI など）で llm_stub_server.py に向けて使う
+
+モデル名は CHISA_LLM_MODEL（既定 gpt-4o-mini）。
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+import urllib.error
+import urllib.request
+from typing import Any
+
+from config import LLM_BACKEND, LLM_BASE_URL, LLM_MODEL
+
+
+class LLMBackend(ABC):
+    """complete_json(system_msg, user_msg, timeout) -> モデルが返した文字列（サブクラスで実装する）。"""
+
+    name = "base"
+
+    def __init__(self, model: str, base_url: str = "") -> None:
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+
+    @property
+    def cache_scope(self) -> str:
+        """返答キャッシュのキーに入れる「どこの・どのモデルの答えか」。"""
+        return f"{self.name}:{self.base_url or 'default'}:{self.model}"
+
+    @abstractmethod
+    def complete_json(self, system_msg: str, user_msg: str, timeout: float) -> str:
+        """system と user のメッセージを送り、JSON の文字列を返す（timeout 秒まで待つ）。"""
+
+
+class OpenAIBackend(LLMBackend):
+    """openai パッケージの Responses API（import とクライアント作成は初めて呼ばれたとき）。"""
+
+    name = "openai"
+
+    def __init__(self, model: str, base_url: str = "") -> None:
+        super().__init__(model, base_url)
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is not None:
+            return self._client
+        with self._lock:
+            if self._client is None:
+                api_key = os.environ.get("OPENAI_API_KEY", "")
+                if not api_key and not self.base_url:
+                    raise RuntimeError(
+                        "環境変数 OPENAI_API_KEY が設定されていません。\n"
+                        "設定方法:\n"
+                        "  Windows: set OPENAI_API_KEY=sk-...\n"
+                        "  Mac/Linux: export OPENAI_API_KEY=sk-..."
+                    )
+                from openai import OpenAI
+
+                # SDK の自動リトライ（既定2回）は切る: 1回の timeout が呼び出し側の budget 全体になるように。
+                # 失敗の扱いはブレーカー側に任せる。スタブに向けるときはキーが無くてもよい
+                if self.base_url:
+                    self._client = OpenAI(api_key=api_key or "stub", base_url=self.base_url, max_retries=0)
+                else:
+                    self._client = OpenAI(api_key=api_key, max_retries=0)
+        return self._client
+
+    def complete_json(self, system_msg: str, user_msg: str, timeout: float) -> str:
+        resp = self._get_client().responses.create(
+            model=self.model,
+            input=[
+                {"role": "system", "content": system_msg},
+                {"role": "user", "content": user_msg},
+            ],
+            text={"format": {"type": "json_object"}},
+            timeout=timeout,
+        )
+        return resp.output_text or "{}"
+
+
+class HTTPBackend(LLMBackend):
+    """urllib だけで OpenAI 互換の /responses を叩く（openai パッケージ不要）。"""
+
+    name = "http"
+
+    def complete_json(self, system_msg: str, user_msg: str, timeout: float) -> str:
+        if not self.base_url:
+            raise RuntimeError("CHISA_LLM_BACKEND=http には CHISA_LLM_BASE_URL が必要です")
+        body = json.dumps({
+            "model": self.model,
+            "input": [
+                {"role": "system", "content": system_msg},
+                {"role": "user", "content": user_msg},
+            ],
+            "text": {"format": {"type": "json_object"}},
+        }, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        api_key = os.environ.get("OPENAI_API_KEY", "")
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+
+        req = urllib.request.Request(f"{self.base_url}/responses", data=body, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as res:
+                data = json.loads(res.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"HTTP {e.code}: {e.read()[:200]!r}") from e
+        return output_text(data) or "{}"
+
+
+def output_text(response: dict[str, Any]) -> str:
+    """Responses API の返り値から output_text を組み立てる（SDK の resp.output_text と同じ）。"""
+    if isinstance(response.get("output_text"), str):
+        return response["output_text"]
+    texts = []
+    for item in response.get("output") or []:
+        if not isinstance(item, dict) or item.get("type") != "message":
+            continue
+        for part in item.get("content") or []:
+            if isinstance(part, dict) and part.get("type") == "output_text":
+                texts.append(str(part.get("text", "")))
+    return "".join(texts)
+
+
+BACKENDS: dict[str, type[LLMBackend]] = {
+    OpenAIBackend.name: OpenAIBackend,
+    HTTPBackend.name: HTTPBackend,
+}
+
+_backend: LLMBackend | None = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> LLMBackend:
+    """設定（CHISA_LLM_BACKEND / CHISA_LLM_BASE_URL / CHISA_LLM_MODEL）どおりの backend（1つを使い回す）。"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                cls = BACKENDS.get(LLM_BACKEND)
+                if cls is None:
+                    raise RuntimeError(f"未知の CHISA_LLM_BACKEND です: {LLM_BACKEND}（{', '.join(BACKENDS)} のどれか）")
+                _backend = cls(LLM_MODEL, LLM_BASE_URL)
+    return _backend
+
+
+def cache_scope() -> str:
+    """今の backend の cache_scope（まだ作っていなければ設定から。未知の backend 名でも例外にしない）。"""
+    backend = _backend
+    if backend is not None:
+        return backend.cache_scope
+    return f"{LLM_BACKEND}:{LLM_BASE_URL.rstrip('/') or 'default'}:{LLM_MODEL}"
+
+
+def set_backend(backend: LLMBackend | None) -> None:
+    """backend を差し替える（ベンチマークなど。None で設定どおりに戻す）。"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
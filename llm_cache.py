@@ -0,0 +1,189 @@
+# llm_cache.py
+"""
+千紗（LLM）の返答をディスクに覚えておくキャッシュ。
+キーは (モデル, system プロンプト, 正規化した state, 送るタスクの中身) などを
+正規化した JSON の sha256 にする。同じ入力なら同じ答えが返ってくる前提で、
+TTL を過ぎたものと、件数の上限を超えた古いもの（LRU）から捨てる。
+
+ファイルは data/llm_cache/<名前>.json に
+{"entries": [[key, 保存時刻, かかった秒数, 値], ...]}（古い順）で置く。
+書き込みは put のときだけ（当たったときの並び替えはメモリ上だけで、次の put で保存される）。
+flush_delay を付けたキャッシュは、put をメモリに溜めて flush_delay 秒後（とプロセス終了時）に1回で書く。
+別プロセスが書き換えたら sig が変わるので読み直す（まだ書いていない分はその上に載せ直す）。
+"""
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from config import (
+    LLM_CACHE_DIR, LLM_CACHE_ENABLED, LLM_CACHE_SIZE, LLM_CACHE_TTL,
+    LLM_TAG_CACHE_FLUSH, LLM_TAG_CACHE_SIZE, LLM_TAG_CACHE_TTL,
+)
+from storage import atomic_write_json, file_lock
+
+
+def cache_key(*parts: Any) -> str:
+    """parts を正規化した JSON（キー順固定・空白なし）の sha256。"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """key -> (保存時刻, かかった秒数, 値) の LRU（TTL 付き、ディスクに保存）。"""
+
+    def __init__(self, path: Path, maxsize: int, ttl: float, enabled: bool = True, flush_delay: float = 0.0) -> None:
+        self.path = Path(path)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled and maxsize > 0
+        self.flush_delay = flush_delay
+        self._data: OrderedDict[str, tuple[float, float, Any]] = OrderedDict()
+        self._pending: dict[str, tuple[float, float, Any]] = {}  # まだファイルに書いていない put
+        self._timer: threading.Timer | None = None
+        self._sig: tuple[int, int] | None = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+
+    def _file_sig(self) -> tuple[int, int] | None:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def _reload_if_changed(self) -> None:
+        """ファイルが前回読んだときから変わっていたら読み直す（_lock を持って呼ぶ）。"""
+        sig = self._file_sig()
+        if self._loaded and sig == self._sig:
+            return
+        data: OrderedDict[str, tuple[float, float, Any]] = OrderedDict()
+        if sig is not None:
+            try:
+                with self.path.open("r", encoding="utf-8") as f:
+                    raw = json.load(f)
+                for row in raw.get("entries", []):
+                    key, saved_at, latency, value = row
+                    data[str(key)] = (float(saved_at), float(latency), value)
+            except (json.JSONDecodeError, AttributeError, TypeError, ValueError) as e:
+                print(f"[警告] LLMキャッシュが壊れているので空から始めます: {self.path} ({e})")
+                data = OrderedDict()
+        for key, entry in self._pending.items():
+            data[key] = entry
+            data.move_to_end(key)
+        self._data = data
+        self._sig = sig
+        self._loaded = True
+
+    def get(self, key: str) -> Any | None:
+        """当たれば値、外れ（期限切れ・無効を含む）なら None。"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            self._reload_if_changed()
+            entry = self._data.get(key)
+            if entry is not None and now - entry[0] > self.ttl:
+                del self._data[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[1]
+            return entry[2]
+
+    def put(self, key: str, value: Any, latency: float) -> None:
+        """値と、それを得るのにかかった秒数（当たったときに浮いた時間として数える）を保存する。"""
+        self.put_many([(key, value, latency)])
+
+    def put_many(self, items: list[tuple[str, Any, float]]) -> None:
+        """(key, 値, 秒数) をまとめて保存する（ファイルの書き直しは1回。flush_delay があれば後でまとめて）。"""
+        if not self.enabled or not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._reload_if_changed()
+            for key, value, latency in items:
+                self._pending[key] = (now, latency, value)
+                self._data[key] = (now, latency, value)
+                self._data.move_to_end(key)
+            if self.flush_delay <= 0:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        """溜めている put をファイルに書く。"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._pending:
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        """_lock を持って呼ぶ。ファイルを読み直して _pending を載せ、古いものを捨てて書き直す。"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        with file_lock(self.path):
+            self._reload_if_changed()
+            data = self._data
+            for k in [k for k, (saved_at, _, _) in data.items() if now - saved_at > self.ttl]:
+                del data[k]
+                self.expired += 1
+            while len(data) > self.maxsize:
+                data.popitem(last=False)
+                self.evictions += 1
+            atomic_write_json(self.path, {"entries": [[k, *v] for k, v in data.items()]})
+            self._sig = self._file_sig()
+            self._pending.clear()
+
+    def clear(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, file_lock(self.path):
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending.clear()
+            self._data.clear()
+            self.path.unlink(missing_ok=True)
+            self._sig = None
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "pending": len(self._pending),
+                "maxsize": self.maxsize,
+                "saved_seconds": round(self.saved_seconds, 3),
+            }
+
+
+# gpt_client が使う返答キャッシュ
+priority_cache = LLMCache(LLM_CACHE_DIR / "priority.json", LLM_CACHE_SIZE, LLM_CACHE_TTL, LLM_CACHE_ENABLED)
+tag_cache = LLMCache(LLM_CACHE_DIR / "tags.json", LLM_TAG_CACHE_SIZE, LLM_TAG_CACHE_TTL, LLM_CACHE_ENABLED,
+                     flush_delay=LLM_TAG_CACHE_FLUSH)
+atexit.register(tag_cache.flush)
@@ -0,0 +1,219 @@
+# llm_stub_server.py
+"""
+負荷試験・ベンチマーク用の、OpenAI 互換（Responses API）のローカルのスタブサーバー（標準ライブラリだけ）。
+本物の API を呼ばずに、gpt_client → llm_backend → HTTP の経路をそのまま通せる。
+
+- POST /v1/responses（/responses も可）: 千紗のプロンプトを見て、決まった答えを JSON で返す
+    - おすすめ順（【タスク一覧 tasks（JSON）】）: score の高い順に最大5件
+    - まとめてタグ付け（【タスク一覧（JSON）】）/ 1件のタグ付け（【タスク】）:
+      タイトルのハッシュでタグ候補リストから 1〜2 個（同じタイトルなら毎回同じ）
+- GET /health: {"ok": true}
+- GET /stats: リクエスト数・わざと失敗させた数
+
+遅延（--latency 秒と --jitter 秒）と失敗率（--error-rate、HTTP 500 を返す）は起動時に決める。
+失敗させるかどうかは --seed で決まる乱数列なので、同じ順で叩けば同じところで失敗する。
+
+使い方:
+  python llm_stub_server.py --port 8765 --latency 0.2 --error-rate 0.05
+  CHISA_LLM_BASE_URL=http://127.0.0.1:8765/v1 python web_server.py
+  （openai パッケージが無ければ CHISA_LLM_BACKEND=http も付ける）
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+PRIORITY_MARKER = "【タスク一覧 tasks（JSON）】"
+BATCH_TAGS_MARKER = "【タスク一覧（JSON）】"
+SINGLE_TAG_MARKER = "【タスク】"
+TAG_LIST_MARKER = "【タグ候補リスト】"
+
+
+def _section(text: str, marker: str) -> str:
+    """marker の次の行から、次の空行までを返す。"""
+    after = text.split(marker, 1)[1].lstrip("\n")
+    return after.split("\n\n", 1)[0].strip()
+
+
+def _stable_index(text: str, n: int, salt: str = "") -> int:
+    digest = hashlib.blake2b((salt + text).encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(digest, "big") % n
+
+
+def _pick_tags(title: str, candidates: list[str]) -> list[str]:
+    if not candidates:
+        return []
+    tags = [candidates[_stable_index(title, len(candidates))]]
+    if len(candidates) > 1 and _stable_index(title, 2, "more") == 1:
+        second = candidates[_stable_index(title, len(candidates), "second")]
+        if second not in tags:
+            tags.append(second)
+    return tags
+
+
+def answer(system_msg: str, user_msg: str) -> dict[str, Any]:
+    """千紗のプロンプトへの決まった答え（JSON オブジェクト）。"""
+    if PRIORITY_MARKER in user_msg:
+        tasks = json.loads(_section(user_msg, PRIORITY_MARKER))
+        ranked = sorted(tasks, key=lambda t: (t.get("score") is not None, t.get("score") or 0), reverse=True)
+        return {"ordered_tasks": [
+            {"id": t.get("id"), "reason": f"スタブ: score={t.get('score')}, days_left={t.get('days_left')}"}
+            for t in ranked[:5]
+        ]}
+
+    candidates = [c.strip() for c in _section(system_msg, TAG_LIST_MARKER).split(",") if c.strip()] \
+        if TAG_LIST_MARKER in system_msg else []
+    if BATCH_TAGS_MARKER in user_msg:
+        items = json.loads(_section(user_msg, BATCH_TAGS_MARKER))
+        return {"results": [{"id": it.get("id"), "tags": _pick_tags(str(it.get("title", "")), candidates)}
+                            for it in items]}
+    if SINGLE_TAG_MARKER in user_msg:
+        section = _section(user_msg, SINGLE_TAG_MARKER)
+        title = section.split("\n", 1)[0].replace("タイトル:", "", 1).strip()
+        return {"tags": _pick_tags(title, candidates)}
+    return {}
+
+
+class StubState:
+    def __init__(self, latency: float, jitter: float, error_rate: float, seed: int) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rand = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def next_call(self) -> tuple[int, float, bool]:
+        """(通し番号, この呼び出しの遅延, わざと失敗させるか)。"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + (self._rand.uniform(0, self.jitter) if self.jitter > 0 else 0.0)
+            fail = self.error_rate > 0 and self._rand.random() < self.error_rate
+            if fail:
+                self.errors += 1
+            return self.requests, delay, fail
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"requests": self.requests, "errors": self.errors,
+                    "latency": self.latency, "jitter": self.jitter, "error_rate": self.error_rate}
+
+
+def _response_body(model: str, text: str, n: int) -> dict[str, Any]:
+    return {
+        "id": f"resp_stub_{n}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": "completed",
+        "model": model,
+        "output": [{
+            "type": "message",
+            "id": f"msg_stub_{n}",
+            "status": "completed",
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }],
+        "parallel_tool_calls": False,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0},
+    }
+
+
+def make_handler(state: StubState) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args: Any) -> None:  # 1リクエストごとのログは出さない
+            pass
+
+        def _send_json(self, status: int, body: dict[str, Any]) -> None:
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            if self.path == "/health":
+                self._send_json(200, {"ok": True})
+            elif self.path == "/stats":
+                self._send_json(200, state.stats())
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length)
+            if self.path.rstrip("/") not in ("/v1/responses", "/responses"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+
+            n, delay, fail = state.next_call()
+            if delay > 0:
+                time.sleep(delay)
+            if fail:
+                self._send_json(500, {"error": {"message": "stub: injected failure", "type": "server_error"}})
+                return
+
+            try:
+                req = json.loads(raw.decode("utf-8"))
+                messages = {m.get("role"): str(m.get("content", "")) for m in req.get("input", [])}
+                body = answer(messages.get("system", ""), messages.get("user", ""))
+            except (ValueError, AttributeError, TypeError) as e:
+                self._send_json(400, {"error": {"message": f"stub: bad request ({e})"}})
+                return
+            self._send_json(200, _response_body(str(req.get("model", "stub")), json.dumps(body, ensure_ascii=False), n))
+
+    return Handler
+
+
+def start_stub_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    error_rate: float = 0.0,
+    seed: int = 0,
+) -> tuple[ThreadingHTTPServer, StubState]:
+    """別スレッドでスタブを起動する（port=0 なら空いているポート）。base_url は http://host:port/v1。"""
+    state = StubState(latency, jitter, error_rate, seed)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="llm-stub", daemon=True).start()
+    return server, state
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OpenAI 互換のローカルスタブ（千紗のベンチマーク用）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="1リクエストの遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延に足すゆらぎの最大値（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="HTTP 500 を返す割合（0〜1）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    state = StubState(args.latency, args.jitter, args.error_rate, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    server.daemon_threads = True
+    print(f"LLM スタブ: http://{args.host}:{args.port}/v1 "
+          f"(latency={args.latency}s jitter={args.jitter}s error_rate={args.error_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
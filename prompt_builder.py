@@ -0,0 +1,104 @@
+# prompt_builder.py
+"""
+千紗に送るタスク一覧を小さくする。
+todo 全件ではなく、ローカルのスコア上位から PROMPT_CANDIDATES 件だけを選び
+（1プロジェクトから PROMPT_PER_PROJECT 件まで。足りなければ上位から埋める）、
+{id, text（切り詰め）, tags, days_left, score} だけにして渡す。
+返ってくるのは最大5件なので、backlog が増えてもプロンプトの大きさ（＝待ち時間と料金）は一定になる。
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any
+
+from config import PROMPT_CANDIDATES, PROMPT_PER_PROJECT, PROMPT_TEXT_MAX
+from scoring import local_rank_key, top_k
+
+
+def select_prompt_candidates(
+    todo: list[dict[str, Any]],
+    limit: int = PROMPT_CANDIDATES,
+    per_project: int = PROMPT_PER_PROJECT,
+) -> list[dict[str, Any]]:
+    """ローカル優先度の高い順に limit 件（プロジェクトごとの上限つき）。並びは優先度順。"""
+    ranked = top_k(todo, len(todo), key=local_rank_key)
+    if per_project <= 0 or len(ranked) <= limit:
+        return ranked[:limit]
+
+    picked: list[dict[str, Any]] = []
+    skipped: list[dict[str, Any]] = []
+    per: dict[Any, int] = {}
+    for t in ranked:
+        if len(picked) >= limit:
+            break
+        project = t.get("project") or "default"
+        if per.get(project, 0) >= per_project:
+            skipped.append(t)
+            continue
+        per[project] = per.get(project, 0) + 1
+        picked.append(t)
+
+    # 上限で弾いた分で埋める（プロジェクトが少ないときに件数が減りすぎないように）
+    if len(picked) < limit:
+        picked.extend(skipped[:limit - len(picked)])
+        picked.sort(key=local_rank_key, reverse=True)
+    return picked
+
+
+def _tag_key(tag: Any) -> str:
+    if isinstance(tag, dict):
+        k = tag.get("key") or tag.get("name")
+        return str(k) if k is not None else ""
+    return str(tag)
+
+
+def project_for_prompt(task: dict[str, Any], text_max: int = PROMPT_TEXT_MAX) -> dict[str, Any]:
+    """千紗に渡す最小限の形（id, text, tags, days_left, score）。"""
+    text = str(task.get("text") or "")
+    if len(text) > text_max:
+        text = text[:text_max - 1] + "…"
+    tags = task.get("tags")
+    return {
+        "id": task.get("id"),
+        "text": text,
+        "tags": [k for k in map(_tag_key, tags) if k] if isinstance(tags, list) else [],
+        "days_left": task.get("days_left"),
+        "score": task.get("score"),
+    }
+
+
+def estimate_tokens(text: str) -> int:
+    """ざっくりしたトークン数（ASCII は4文字で1、それ以外は1文字で1と数える）。"""
+    ascii_chars = sum(1 for c in text if c < "\x80")
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+class PromptStats:
+    """千紗への問い合わせごとのプロンプトの大きさ（推定トークン数）。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+        self.last: dict[str, int] = {}
+
+    def record(self, tokens: int, sent: int, todo: int) -> None:
+        with self._lock:
+            self.calls += 1
+            self.total_tokens += tokens
+            self.max_tokens = max(self.max_tokens, tokens)
+            self.last = {"tokens": tokens, "sent": sent, "todo": todo}
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "avg_tokens": round(self.total_tokens / self.calls, 1) if self.calls else 0.0,
+                "max_tokens": self.max_tokens,
+                "last": dict(self.last),
+            }
+
+
+# gpt_client が記録する
+prompt_stats = PromptStats()
@@ -0,0 +1,530 @@
+# scoring.py
+"""
+おすすめ用のスコア計算を1か所にまとめたもの。
+- ScoringContext: tags_master / projects / state をリクエストごとに1回だけ前処理した結果
+- ScoringEngine:  ScoringContext を使って Task を ScoredTask にする（タスクごとの処理は辞書引きと足し算だけ）
+- ScoreCache:     (タスクの中身, ScoringContext.digest) -> (base_score, score, days_left) の LRU
+
+スコア = タグの重み合計 + priority_hint 補正 + state 補正 + 締切ボーナス
+（タグは str / list / dict の型ゆれを許し、tags_master に無いタグは 1 点として数える）
+
+todo が VECTOR_SCORING_MIN_TASKS 件以上で NumPy があれば、タスクを列（タグの CSR・hint・期日・
+state 用のフラグ）に直して1回の配列計算でまとめて出す。NumPy が無ければ Python のループだけで動く。
+"""
+from __future__ import annotations
+
+import hashlib
+import heapq
+import json
+import threading
+from collections import OrderedDict
+from datetime import date
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, Sequence, TypeVar
+
+from config import SCORE_CACHE_SIZE, VECTOR_SCORING_MIN_TASKS
+from priority import apply_priority_hint
+from state_effect import OUTSIDE_RELATED, StateEffect, compile_state_effect
+from task_model import MISSING, ScoredTask, Task, tag_keys
+
+# NumPy は任意。import が重いので、初めて配列計算が要るときに load_numpy() が読み込む
+np = None
+_numpy_checked = False
+
+
+def load_numpy() -> Any:
+    """NumPy を（まだなら）import して返す。入っていなければ None。"""
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+        _numpy_checked = True
+    return np
+
+# tags_master に無いタグの重み（0固定にしない）
+UNKNOWN_TAG_WEIGHT = 1
+
+T = TypeVar("T")
+
+
+def top_k(items: Iterable[T], k: int, key: Callable[[T], Any]) -> list[T]:
+    """
+    key の大きい順に先頭 k 件を返す（同じ key なら入力順）。
+    heapq.nlargest は sorted(..., reverse=True)[:k] と同じ並びになるので、全件を並べ替えずに済む
+    （O(N log k)、手元に持つのは k 件だけ）。items はジェネレータでよい。
+    """
+    if k <= 0:
+        return []
+    return heapq.nlargest(k, items, key=key)
+
+
+def local_rank_key(task: dict[str, Any]) -> tuple[bool, Any]:
+    """dict のタスクをローカル優先度で並べるときの key（score が大きい順、score なしは最後）。"""
+    score = task.get("score")
+    return (score is not None, score or 0)
+
+
+def deadline_bonus(days_left: int | None) -> int:
+    """締切ボーナス（タグが未整備でも優先度が動く）。"""
+    if days_left is None:
+        return 0
+    if days_left <= 0:
+        return 50
+    if days_left <= 3:
+        return 20
+    if days_left <= 7:
+        return 10
+    return 0
+
+
+def _tag_weights(tags_master: Any) -> dict[str, int]:
+    tag_defs = tags_master.get("tags", []) if isinstance(tags_master, dict) else []
+    weights: dict[str, int] = {}
+    for tag_def in tag_defs:
+        if not isinstance(tag_def, dict):
+            continue
+        key = tag_def.get("key")
+        if not key:
+            continue
+        try:
+            w = int(tag_def.get("weight_for_priority", 0))
+        except Exception:
+            w = 0
+        weights[str(key)] = w
+    return weights
+
+
+class ScoringContext:
+    """1リクエスト分の前処理済みの材料。作ったら中身は変えない（増えるのはメモと StateEffect の覚えたタグだけ）。"""
+
+    __slots__ = ("today", "tag_weights", "project_due", "state_effect", "digest", "_days_left", "_hint_bonus")
+
+    def __init__(
+        self,
+        today: date,
+        tag_weights: dict[str, int],
+        project_due: dict[str, str],
+        state_effect: StateEffect,
+    ) -> None:
+        self.today = today
+        self.tag_weights = tag_weights
+        self.project_due = project_due
+        self.state_effect = state_effect
+        # スコアに効く材料だけのハッシュ（state の free_note などが変わっても同じ値になる）
+        effect = state_effect
+        self.digest = hashlib.blake2b(json.dumps(
+            [today.isoformat(), sorted(tag_weights.items()), sorted(project_due.items()),
+             effect.low_focus, effect.no_go_out, effect.prefer_axes, effect.avoid_axes],
+            ensure_ascii=False, default=str,
+        ).encode("utf-8"), digest_size=8).hexdigest()
+        # 同じ期日・同じ hint は何度も出てくるので、結果を覚えておく
+        self._days_left: dict[str, int | None] = {}
+        self._hint_bonus: dict[Any, int] = {}
+
+    @classmethod
+    def build(
+        cls,
+        tags_master: Any,
+        projects: Any,
+        state: Any,
+        today: date | None = None,
+    ) -> "ScoringContext":
+        if isinstance(state, list):
+            state = state[0] if state else {}
+        if not isinstance(state, dict):
+            state = {}
+        if not isinstance(projects, dict):
+            projects = {}
+
+        project_due: dict[str, str] = {}
+        for pid, info in projects.items():
+            if isinstance(info, dict) and info.get("default_due_date"):
+                project_due[pid] = info["default_due_date"]
+
+        return cls(
+            today=today or date.today(),
+            tag_weights=_tag_weights(tags_master),
+            project_due=project_due,
+            state_effect=compile_state_effect(state),
+        )
+
+    def days_left(self, due_str: Any) -> int | None:
+        if not due_str or not isinstance(due_str, str):
+            return None
+        try:
+            return self._days_left[due_str]
+        except KeyError:
+            pass
+        try:
+            days = (date.fromisoformat(due_str) - self.today).days
+        except ValueError:
+            days = None
+        self._days_left[due_str] = days
+        return days
+
+    def hint_bonus(self, hint: Any) -> int:
+        try:
+            return self._hint_bonus[hint]
+        except KeyError:
+            bonus = apply_priority_hint(0, hint)
+            self._hint_bonus[hint] = bonus
+            return bonus
+        except TypeError:  # dict など hash できない値
+            return apply_priority_hint(0, hint)
+
+
+class ScoringEngine:
+    """ScoringContext を使ってタスクにスコアを付ける。"""
+
+    __slots__ = ("ctx", "cache")
+
+    def __init__(self, ctx: ScoringContext, cache: "ScoreCache | None" = None) -> None:
+        self.ctx = ctx
+        self.cache = cache
+
+    @classmethod
+    def from_sources(
+        cls,
+        tags_master: Any,
+        projects: Any,
+        state: Any,
+        today: date | None = None,
+        cache: "ScoreCache | None" = None,
+    ) -> "ScoringEngine":
+        return cls(ScoringContext.build(tags_master, projects, state, today), cache)
+
+    def score(self, task: Task) -> ScoredTask:
+        return self.score_all((task,))[0]
+
+    def score_all(self, tasks: Iterable[Task]) -> list[ScoredTask]:
+        """tasks（Task）を順番どおり ScoredTask にする。元の Task は書き換えない。"""
+        if isinstance(tasks, Sequence) and len(tasks) >= VECTOR_SCORING_MIN_TASKS and load_numpy() is not None:
+            return self.score_all_vectorized(tasks)
+        return self.score_all_python(tasks)
+
+    def score_all_python(self, tasks: Iterable[Task]) -> list[ScoredTask]:
+        return list(self.iter_scored(tasks))
+
+    def top_k(self, tasks: Iterable[Task], k: int) -> list[ScoredTask]:
+        """
+        スコアの高い順に k 件だけ返す（同点は入力順）。全件分の ScoredTask は作らない。
+        件数が多く NumPy があれば配列で選び、なければ iter_scored を heap に流す。
+        """
+        if isinstance(tasks, Sequence) and len(tasks) >= VECTOR_SCORING_MIN_TASKS and load_numpy() is not None:
+            return self._top_k_vectorized(tasks, k)
+        return top_k(self.iter_scored(tasks), k, key=lambda st: st.score)
+
+    def iter_scored(self, tasks: Iterable[Task]) -> Iterator[ScoredTask]:
+        """tasks を1件ずつ ScoredTask にして返すイテレータ（cache があれば先に引く）。"""
+        if self.cache is not None and self.cache.maxsize > 0:
+            return self._iter_scored_cached(tasks)
+        return self._iter_scored_uncached(tasks)
+
+    def _iter_scored_uncached(self, tasks: Iterable[Task]) -> Iterator[ScoredTask]:
+        ctx = self.ctx
+        weights_get = ctx.tag_weights.get
+        project_due_get = ctx.project_due.get
+        days_left_of = ctx.days_left
+        hint_bonus = ctx.hint_bonus
+        state_bonus = ctx.state_effect.bonus
+
+        for t in tasks:
+            # 期日（タスク → プロジェクトの default_due_date）
+            due_str = t.due_date
+            if due_str is MISSING or not due_str:
+                project = t.project
+                due_str = project_due_get(project) if isinstance(project, str) else None
+            days_left = days_left_of(due_str)
+
+            tags = tag_keys(t.tags)
+            base_score = 0
+            for k in tags:
+                base_score += weights_get(k, UNKNOWN_TAG_WEIGHT)
+
+            hint = t.priority_hint
+            score = base_score + hint_bonus(None if hint is MISSING else hint)
+            score += state_bonus(tags)
+            score += deadline_bonus(days_left)
+
+            yield ScoredTask(t, days_left=days_left, base_score=base_score, score=score)
+
+    def _iter_scored_cached(self, tasks: Iterable[Task]) -> Iterator[ScoredTask]:
+        """_CACHE_CHUNK 件ずつ、キャッシュに無い分だけまとめて計算して入力順に返す。"""
+        cache = self.cache
+        digest = self.ctx.digest
+        it = iter(tasks)
+        while True:
+            chunk = list(islice(it, _CACHE_CHUNK))
+            if not chunk:
+                return
+            keys = [_task_score_key(t, digest) for t in chunk]
+            found = cache.get_many(keys)
+
+            misses = [t for t, hit in zip(chunk, found) if hit is None]
+            computed = self._iter_scored_uncached(misses)
+            fresh: list[tuple[tuple, tuple]] = []
+            for t, key, hit in zip(chunk, keys, found):
+                if hit is None:
+                    st = next(computed)
+                    if key is not None:
+                        fresh.append((key, (st.base_score, st.score, st.days_left)))
+                    yield st
+                else:
+                    base_score, score, days_left = hit
+                    yield ScoredTask(t, days_left=days_left, base_score=base_score, score=score)
+            cache.put_many(fresh)
+
+    def score_all_vectorized(self, tasks: Sequence[Task]) -> list[ScoredTask]:
+        """score_all_python と同じ結果を NumPy で出す。"""
+        days_left, base_score, score = self.score_arrays(tasks)
+        out: list[ScoredTask] = []
+        append = out.append
+        for t, d, b, s in zip(tasks, days_left, base_score.tolist(), score.tolist()):
+            append(ScoredTask(t, days_left=d, base_score=b, score=s))
+        return out
+
+    def _top_k_vectorized(self, tasks: Sequence[Task], k: int) -> list[ScoredTask]:
+        days_left, base_score, score = self.score_arrays(tasks)
+        n = len(score)
+        if k <= 0:
+            return []
+        if k >= n:
+            idx = np.argsort(-score, kind="stable")
+        else:
+            # k 番目の値より大きいもの全部＋同点のうち先頭から足りない分（O(N) で選んでから k 件だけ並べる）
+            threshold = np.partition(score, n - k)[n - k]
+            above = np.flatnonzero(score > threshold)
+            ties = np.flatnonzero(score == threshold)[: k - len(above)]
+            idx = np.concatenate([above, ties])
+            idx = idx[np.argsort(-score[idx], kind="stable")]
+        return [
+            ScoredTask(tasks[i], days_left=days_left[i], base_score=int(base_score[i]), score=int(score[i]))
+            for i in idx.tolist()
+        ]
+
+    def score_arrays(self, tasks: Sequence[Task]) -> tuple[list, Any, Any]:
+        """(days_left の list（None あり）, base_score の配列, score の配列) を返す。"""
+        if load_numpy() is None:
+            raise RuntimeError("NumPy がインストールされていません")
+        ctx = self.ctx
+        cols = TaskColumns.of(tasks)
+        n = cols.n
+
+        # タグごとの値（語彙の数だけ Python で作り、あとは配列で引く）
+        weights_get = ctx.tag_weights.get
+        tag_weight = np.array([weights_get(k, UNKNOWN_TAG_WEIGHT) for k in cols.tag_vocab] or [0], dtype=np.int64)
+        tag_flags = np.array([_state_flags(k, ctx.state_effect) for k in cols.tag_vocab] or [0], dtype=np.int64)
+
+        rows = cols.tag_rows
+        base = np.bincount(rows, weights=tag_weight[cols.tag_idx], minlength=n).astype(np.int64)
+        flags = np.zeros(n, dtype=np.int64)
+        np.bitwise_or.at(flags, rows, tag_flags[cols.tag_idx])
+
+        hint = np.array([ctx.hint_bonus(h) for h in cols.hint_vocab], dtype=np.int64)[cols.hint_codes]
+
+        # 期日: タスクの due_date（無ければプロジェクトの default_due_date）→ 今日からの日数
+        due_days = [ctx.days_left(d) for d in cols.due_vocab]
+        project_days = [ctx.days_left(ctx.project_due.get(p)) if isinstance(p, str) else None
+                        for p in cols.project_vocab]
+        due_days.append(None)  # -1（期日なし）用
+        day_table = np.array([_NO_DUE if d is None else d for d in due_days], dtype=np.int64)
+        project_table = np.array([_NO_DUE if d is None else d for d in project_days] or [_NO_DUE], dtype=np.int64)
+        days = np.where(cols.due_codes >= 0, day_table[cols.due_codes], project_table[cols.project_codes])
+
+        deadline = np.select(
+            [days == _NO_DUE, days <= 0, days <= 3, days <= 7],
+            [0, 50, 20, 10],
+            default=0,
+        )
+
+        score = base + hint + _state_bonus(flags, ctx.state_effect) + deadline
+        days_left = [None if d == _NO_DUE else d for d in days.tolist()]
+        return days_left, base, score
+
+
+# === NumPy 用の列データ ===
+_NO_DUE = -(2 ** 62)  # days_left が None の印
+
+_FLAG_HEAVY = 1
+_FLAG_OUTSIDE = 2
+_FLAG_PREFER = 4
+_FLAG_AVOID = 8
+
+
+def _state_flags(tag: str, effect: StateEffect) -> int:
+    """タグ1つが StateEffect.bonus のどの条件に当たるか（タスク単位ではこれを OR する）。"""
+    flags = 0
+    if tag == "heavy":
+        flags |= _FLAG_HEAVY
+    if tag in OUTSIDE_RELATED:
+        flags |= _FLAG_OUTSIDE
+    if effect.prefers(tag):
+        flags |= _FLAG_PREFER
+    if effect.avoids(tag):
+        flags |= _FLAG_AVOID
+    return flags
+
+
+def _state_bonus(flags: Any, effect: StateEffect) -> Any:
+    bonus = np.zeros(flags.shape, dtype=np.int64)
+    if effect.low_focus:
+        bonus -= 20 * ((flags & _FLAG_HEAVY) != 0)
+    if effect.no_go_out:
+        bonus -= 15 * ((flags & _FLAG_OUTSIDE) != 0)
+    bonus += 10 * ((flags & _FLAG_PREFER) != 0)
+    bonus -= 10 * ((flags & _FLAG_AVOID) != 0)
+    return bonus
+
+
+class TaskColumns:
+    """
+    Task の並びを列にしたもの（state / tags_master / 今日の日付には依存しない）。
+    - tag_idx / tag_rows: タグの CSR（tag_rows[i] 行目のタスクが tag_vocab[tag_idx[i]] を持つ）
+    - hint_codes:   hint_vocab の番号
+    - due_codes:    due_vocab の番号（due_date が空なら -1）
+    - project_codes: project_vocab の番号
+    load_todo_task_models の tuple はファイルが変わるまで同じオブジェクトなので、
+    直前の tuple の分は作り直さずに使い回す。
+    """
+
+    __slots__ = ("n", "tag_vocab", "tag_idx", "tag_rows", "hint_vocab", "hint_codes",
+                 "due_vocab", "due_codes", "project_vocab", "project_codes")
+
+    _last: tuple[Any, "TaskColumns"] | None = None
+
+    @classmethod
+    def of(cls, tasks: Sequence[Task]) -> "TaskColumns":
+        last = cls._last
+        if last is not None and last[0] is tasks:
+            return last[1]
+        cols = cls(tasks)
+        if isinstance(tasks, tuple):
+            cls._last = (tasks, cols)
+        return cols
+
+    def __init__(self, tasks: Sequence[Task]) -> None:
+        tag_ids: dict[str, int] = {}
+        hint_ids: dict[Any, int] = {}
+        due_ids: dict[str | None, int] = {}
+        project_ids: dict[Any, int] = {}
+        self.hint_vocab: list[Any] = []
+        self.project_vocab: list[Any] = []
+
+        tag_idx: list[int] = []
+        tag_rows: list[int] = []
+        hint_codes: list[int] = []
+        due_codes: list[int] = []
+        project_codes: list[int] = []
+
+        for row, t in enumerate(tasks):
+            for k in tag_keys(t.tags):
+                tag_idx.append(tag_ids.setdefault(k, len(tag_ids)))
+                tag_rows.append(row)
+
+            hint = t.priority_hint
+            hint = None if hint is MISSING else hint
+            try:
+                code = hint_ids[hint]
+            except KeyError:
+                code = hint_ids[hint] = len(self.hint_vocab)
+                self.hint_vocab.append(hint)
+            except TypeError:  # hash できない値は毎回別の語彙にする
+                code = len(self.hint_vocab)
+                self.hint_vocab.append(hint)
+            hint_codes.append(code)
+
+            due = t.due_date
+            if due is MISSING or not due:
+                due_codes.append(-1)
+            else:
+                # 文字列でない期日は days_left=None（プロジェクトの期日にも戻らない）
+                due_codes.append(due_ids.setdefault(due if isinstance(due, str) else None, len(due_ids)))
+
+            project = t.project
+            project = project if isinstance(project, str) else None
+            pcode = project_ids.get(project)
+            if pcode is None:
+                pcode = project_ids[project] = len(self.project_vocab)
+                self.project_vocab.append(project)
+            project_codes.append(pcode)
+
+        self.n = len(hint_codes)
+        self.tag_vocab = list(tag_ids)
+        self.due_vocab = list(due_ids)
+        self.tag_idx = np.array(tag_idx, dtype=np.int64)
+        self.tag_rows = np.array(tag_rows, dtype=np.int64)
+        self.hint_codes = np.array(hint_codes, dtype=np.int64)
+        self.due_codes = np.array(due_codes, dtype=np.int64)
+        self.project_codes = np.array(project_codes, dtype=np.int64)
+
+
+# === スコアのキャッシュ ===
+_CACHE_CHUNK = 1024  # ロックを取る回数を減らすため、この件数ずつまとめて引く
+
+def _task_score_key(t: Task, digest: str) -> tuple | None:
+    """スコアに効く項目だけでキーを作る（id や text が違っても中身が同じなら同じスコア）。"""
+    key = (digest, t.due_date, t.project, tag_keys(t.tags), t.priority_hint)
+    try:
+        hash(key)
+    except TypeError:  # hash できない hint / due_date
+        return None
+    return key
+
+
+class ScoreCache:
+    """
+    (タスクの中身, ScoringContext.digest) -> (base_score, score, days_left) の LRU。
+    digest に今日の日付・state・tags_master・projects の効く部分が入っているので、
+    それらが変わると自然に外れる。タスクを1件完了しても、ほかのタスクの分はそのまま当たる。
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict[tuple, tuple[int, int, int | None]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, keys: list[tuple | None]) -> list[tuple[int, int, int | None] | None]:
+        """keys の順に値（無ければ None）を返す。None のキーは常に外れ扱い。"""
+        out: list[tuple[int, int, int | None] | None] = []
+        with self._lock:
+            data = self._data
+            for key in keys:
+                value = data.get(key) if key is not None else None
+                if value is None:
+                    self.misses += 1
+                else:
+                    data.move_to_end(key)
+                    self.hits += 1
+                out.append(value)
+        return out
+
+    def put_many(self, items: list[tuple[tuple, tuple[int, int, int | None]]]) -> None:
+        if not items:
+            return
+        with self._lock:
+            data = self._data
+            for key, value in items:
+                data[key] = value
+                data.move_to_end(key)
+            while len(data) > self.maxsize:
+                data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "size": len(self._data), "maxsize": self.maxsize}
+
+
+# app / web_server が共有するキャッシュ
+score_cache = ScoreCache(SCORE_CACHE_SIZE)
@@ -1,13 +1,14 @@
 # state_effect.py
 from __future__ import annotations
+import threading
 from typing import Any, Dict, List, Optional
 
+from task_model import tag_keys
+
 
 def _task_tags(task: Dict[str, Any]) -> List[str]:
-    """タスクから tags を安全に取り出す小さいヘルパー。"""
-    tags = task.get("tags") or []
-    # 文字列以外が混ざっていても落ちないようにしておく
-    return [str(t) for t in tags]
+    """タスクから tags を安全に取り出す小さいヘルパー（ScoringEngine と同じ tag_keys でそろえる）。"""
+    return list(tag_keys(task.get("tags")))
 
 
 from typing import Any, Dict, List, Optional
@@ -30,17 +31,14 @@ def _as_list(v: Any) -> List[Any]:
     # それ以外（数値/dict等）は無視
     return []
 
-def adjust_score_by_state(
-    score: int,
-    task: Dict[str, Any],
-    state: Dict[str, Any],
-) -> int:
-    """今日の状態(meta/constraints/focus_plan)を使ってスコアを少し補正する。"""
-    tags = _task_tags(task)
+OUTSIDE_RELATED = frozenset({"outside", "shopping", "errand"})
+
+# state に一緒に保存する「どのタグが prefer_axes / avoid_axes に当たるか」の前計算
+# {"prefer_axes": [...], "avoid_axes": [...], "vocab": [...], "preferred_tags": [...], "avoided_tags": [...]}
+AXIS_INDEX_KEY = "axis_index"
 
-    meta = _as_dict((state or {}).get("meta"))
-    constraints = _as_dict((state or {}).get("constraints"))
 
+def _plan_axes(state: Dict[str, Any]) -> tuple[List[str], List[str]]:
     # ★ここが今回の要：focus_planがlistでも落ちない
     plan_raw = (state or {}).get("focus_plan")
     plan = _as_dict(plan_raw)
@@ -48,34 +46,136 @@ def adjust_score_by_state(
     # prefer_axes / avoid_axes は list に正規化
     prefer_axes = [str(x) for x in _as_list(plan.get("prefer_axes")) if str(x).strip()]
     avoid_axes  = [str(x) for x in _as_list(plan.get("avoid_axes")) if str(x).strip()]
+    return prefer_axes, avoid_axes
+
+
+def build_axis_index(state: Dict[str, Any], vocab: Any) -> Dict[str, Any]:
+    """
+    タグの語彙（tags_master のキー＋既存タスクのタグ）を prefer_axes / avoid_axes と
+    1回だけ突き合わせる。タスクごとの判定はこの結果との集合演算で済む。
+    """
+    prefer_axes, avoid_axes = _plan_axes(state)
+    tags = sorted({str(t) for t in vocab if t})
+    return {
+        "prefer_axes": prefer_axes,
+        "avoid_axes": avoid_axes,
+        "vocab": tags,
+        "preferred_tags": [t for t in tags if any(ax in t for ax in prefer_axes)],
+        "avoided_tags": [t for t in tags if any(ax in t for ax in avoid_axes)],
+    }
+
+
+class StateEffect:
+    """
+    state から前もって取り出した補正の材料。
+    _as_dict / _as_list の正規化を state ごとに1回で済ませ、タスクごとには bonus() だけを呼ぶ。
+    prefer_axes / avoid_axes は preferred_tags / avoided_tags（タグの集合）にしておき、
+    語彙に無いタグが来たときだけ部分一致で調べて足す。
+    1つの StateEffect は ScoringContext ごとスコア計算のスレッド間で共有されるので、足すときは
+    ロックの中で新しい frozenset の組を作って差し替える（読む側は組を1回取り出すだけで、ロックは取らない）。
+    """
+    __slots__ = ("low_focus", "no_go_out", "prefer_axes", "avoid_axes", "_axis_sets", "_learn_lock")
+
+    def __init__(
+        self,
+        low_focus: bool,
+        no_go_out: bool,
+        prefer_axes: List[str],
+        avoid_axes: List[str],
+        axis_index: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.low_focus = low_focus
+        self.no_go_out = no_go_out
+        self.prefer_axes = prefer_axes
+        self.avoid_axes = avoid_axes
+        self._learn_lock = threading.Lock()
+
+        # 保存済みの前計算が今の axes と同じものなら使う（違えば空から覚えていく）
+        index = axis_index if isinstance(axis_index, dict) else {}
+        if index.get("prefer_axes") == prefer_axes and index.get("avoid_axes") == avoid_axes:
+            self._axis_sets = (
+                frozenset(_as_list(index.get("vocab"))),
+                frozenset(_as_list(index.get("preferred_tags"))),
+                frozenset(_as_list(index.get("avoided_tags"))),
+            )
+        else:
+            self._axis_sets = (frozenset(), frozenset(), frozenset())
+
+    def _learn_tags(self, tags: Any) -> tuple[frozenset, frozenset, frozenset]:
+        """語彙に無いタグを調べて (vocab, preferred, avoided) を差し替え、新しい組を返す。"""
+        with self._learn_lock:
+            vocab, preferred, avoided = self._axis_sets
+            new = [tag for tag in dict.fromkeys(tags) if tag not in vocab]
+            if not new:
+                return self._axis_sets
+            self._axis_sets = (
+                vocab.union(new),
+                preferred.union(t for t in new if any(ax in t for ax in self.prefer_axes)),
+                avoided.union(t for t in new if any(ax in t for ax in self.avoid_axes)),
+            )
+            return self._axis_sets
+
+    def _axes_for(self, tags: Any) -> tuple[frozenset, frozenset, frozenset]:
+        sets = self._axis_sets
+        if not sets[0].issuperset(tags):
+            sets = self._learn_tags(tags)
+        return sets
+
+    def prefers(self, tag: str) -> bool:
+        return tag in self._axes_for((tag,))[1]
+
+    def avoids(self, tag: str) -> bool:
+        return tag in self._axes_for((tag,))[2]
+
+    def bonus(self, tags: List[str]) -> int:
+        bonus = 0
+
+        # 1. 集中力が低い日は heavy タグを下げる
+        if self.low_focus and "heavy" in tags:
+            bonus -= 20
+
+        # 2. 外出できない日は outside / shopping タグを下げる
+        if self.no_go_out and any(tag in OUTSIDE_RELATED for tag in tags):
+            bonus -= 15
+
+        # 3. prefer_axes / avoid_axes をタグ名にざっくり反映（タグの集合との交わりで見る）
+        if self.prefer_axes or self.avoid_axes:
+            _, preferred, avoided = self._axes_for(tags)
+            if preferred and not preferred.isdisjoint(tags):
+                bonus += 10
+            if avoided and not avoided.isdisjoint(tags):
+                bonus -= 10
+
+        return bonus
 
-    bonus = 0
 
-    # 1. 集中力が低い日は heavy タグを下げる
+def compile_state_effect(state: Dict[str, Any]) -> StateEffect:
+    """state（meta/constraints/focus_plan と、あれば axis_index）を StateEffect にする。"""
+    meta = _as_dict((state or {}).get("meta"))
+    constraints = _as_dict((state or {}).get("constraints"))
+    prefer_axes, avoid_axes = _plan_axes(state)
+
     focus = meta.get("focus_level")
     try:
         focus_int: Optional[int] = int(focus) if focus is not None else None
     except (TypeError, ValueError):
         focus_int = None
 
-    if focus_int is not None and focus_int <= 2:
-        if "heavy" in tags:
-            bonus -= 20
-
-    # 2. 外出できない日は outside / shopping タグを下げる
-    if constraints.get("can_go_out") is False:
-        outside_related = {"outside", "shopping", "errand"}
-        if any(tag in outside_related for tag in tags):
-            bonus -= 15
-
-    # 3. prefer_axes / avoid_axes をタグ名にざっくり反映
-    if prefer_axes:
-        if any(ax in tag for tag in tags for ax in prefer_axes):
-            bonus += 10
+    return StateEffect(
+        low_focus=focus_int is not None and focus_int <= 2,
+        no_go_out=constraints.get("can_go_out") is False,
+        prefer_axes=prefer_axes,
+        avoid_axes=avoid_axes,
+        axis_index=(state or {}).get(AXIS_INDEX_KEY),
+    )
 
-    if avoid_axes:
-        if any(ax in tag for tag in tags for ax in avoid_axes):
-            bonus -= 10
-
-    return score + bonus
 
+def adjust_score_by_state(
+    score: int,
+    task: Dict[str, Any],
+    state: Dict[str, Any],
+) -> int:
+    """今日の状態(meta/constraints/focus_plan)を使ってスコアを少し補正する。
+    たくさんのタスクに使うときは compile_state_effect(state) を1回だけ作って bonus() を呼ぶこと。
+    """
+    return score + compile_state_effect(state).bonus(_task_tags(task))
@@ -1,29 +1,530 @@
+import copy
+import hashlib
+from collections import Counter
 import json
+import mmap
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
-from typing import Any, TypedDict
-from config import TAGS_MASTER_PATH,TASKS_PATH,PROJECTS_PATH
+from typing import Any, Callable, Iterator, TypedDict
+from config import (
+    TAGS_MASTER_PATH, TASKS_PATH, TASKS_INDEX_PATH, TASKS_EVENTS_PATH, TASKS_SEQ_PATH,
+    PROJECTS_PATH, STATE_PATH, ARCHIVE_DIR, ARCHIVE_MANIFEST_PATH, ARCHIVE_TEXTS_PATH,
+    SQLITE_PATH, TODAY_PATH,
+    STORAGE_BACKEND, FSYNC_POLICY, TASKS_EVENT_LOG, TASKS_COMPACT_THRESHOLD,
+)
 from errors import ChisaError
+from task_model import Task, task_text_hash
+from deadline_index import DeadlineIndex
+import storage_sqlite
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# CHISA_STORAGE_BACKEND=sqlite なら、以下の公開関数は storage_sqlite に委譲する
+_SQLITE = STORAGE_BACKEND == "sqlite"
 
 TagsMaster = dict[str, Any]
 
+
+# === ファイルロックとアトミック書き込み ===
+# 書き込みはすべて file_lock(path) の中で行う。読むだけなら file_lock(path, shared=True)。
+# - 同じプロセス内のスレッド同士: path ごとの読み書きロック
+#   （共有どうしは同時に持てる。同じスレッドなら再入でき、排他の中で共有を取るのも可）
+# - 別プロセス同士: <path>.lock に対する flock（LOCK_SH / LOCK_EX。Windows の msvcrt.locking は常に排他）
+# 丸ごと書き直すファイルは一時ファイルに書いてから os.replace で差し替える。
+
+
+class _PathLock:
+    __slots__ = ("cond", "writer", "depth", "readers", "waiting_writers", "f")
+
+    def __init__(self) -> None:
+        self.cond = threading.Condition(threading.Lock())
+        self.writer: int | None = None  # 排他で持っているスレッド
+        self.depth = 0  # writer の再入の深さ
+        self.readers: dict[int, int] = {}  # 共有で持っているスレッド -> 深さ
+        self.waiting_writers = 0
+        self.f = None  # ロックファイル（誰かが持っている間だけ開いている）
+
+
+_path_locks: dict[str, _PathLock] = {}
+_path_locks_guard = threading.Lock()
+
+
+def _os_lock(f, shared: bool = False) -> None:
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue  # LK_LOCK は約10秒で諦めるので取れるまで繰り返す
+
+
+def _os_unlock(f) -> None:
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return
+    f.seek(0)
+    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _acquire(lock: _PathLock, key: str, shared: bool) -> str:
+    """ロックを取り、解放のときに使う種類（"write" / "nested" / "read"）を返す。"""
+    me = threading.get_ident()
+    with lock.cond:
+        if lock.writer == me:
+            lock.depth += 1  # 排他の中での再入（共有の要求も排他のまま数える）
+            return "nested"
+        if shared:
+            if me not in lock.readers:
+                # 排他を待っている人がいれば先に通す（読み手が続いて書き手が飢えないように）
+                while lock.writer is not None or lock.waiting_writers:
+                    lock.cond.wait()
+            if not lock.readers:
+                lock.f = open(key + ".lock", "a+b")
+                _os_lock(lock.f, shared=True)
+            lock.readers[me] = lock.readers.get(me, 0) + 1
+            return "read"
+
+        if me in lock.readers:
+            raise RuntimeError(f"共有ロックを持ったまま排他ロックは取れません: {key}")
+        lock.waiting_writers += 1
+        try:
+            while lock.writer is not None or lock.readers:
+                lock.cond.wait()
+        finally:
+            lock.waiting_writers -= 1
+        lock.f = open(key + ".lock", "a+b")
+        _os_lock(lock.f)
+        lock.writer = me
+        lock.depth = 1
+        return "write"
+
+
+def _release(lock: _PathLock, kind: str) -> None:
+    me = threading.get_ident()
+    with lock.cond:
+        if kind == "read":
+            lock.readers[me] -= 1
+            if lock.readers[me]:
+                return
+            del lock.readers[me]
+            if lock.readers:
+                return
+        else:
+            lock.depth -= 1
+            if lock.depth:
+                return
+            lock.writer = None
+        f, lock.f = lock.f, None
+        _os_unlock(f)
+        f.close()
+        lock.cond.notify_all()
+
+
+@contextmanager
+def file_lock(path: Path, shared: bool = False):
+    """
+    path 単位のロック（スレッド間・プロセス間の両方）。
+    shared=True は読むだけのとき用で、ほかの共有ロックとは同時に持てる（排他とは待ち合う）。
+    """
+    key = str(Path(path).resolve())
+    with _path_locks_guard:
+        lock = _path_locks.get(key)
+        if lock is None:
+            lock = _path_locks[key] = _PathLock()
+
+    kind = _acquire(lock, key, shared)
+    try:
+        yield
+    finally:
+        _release(lock, kind)
+
+
+def _fsync_file(f, kind: str) -> None:
+    """kind は "append" か "replace"。FSYNC_POLICY に応じて fsync する。"""
+    if FSYNC_POLICY == "always" or (FSYNC_POLICY == "replace" and kind == "replace"):
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _fsync_dir(path: Path) -> None:
+    """rename をディスクに確定させる（POSIX のみ、always のとき）。"""
+    if FSYNC_POLICY != "always" or fcntl is None:
+        return
+    fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """一時ファイルに書いてから os.replace で差し替える（途中で落ちても中途半端なファイルを残さない）。"""
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with tmp.open("wb") as f:
+            f.write(data)
+            _fsync_file(f, "replace")
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    _fsync_dir(path)
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    atomic_write_bytes(path, text.encode("utf-8"))
+
+
+def atomic_write_json(path: Path, data: Any) -> None:
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=2))
+
+
+# === 読み込みキャッシュ ===
+# ファイルごとの (mtime_ns, size) が変わらない間は、パース済みの値を使い回す。
+# キャッシュの中身は書き換えない前提のスナップショットで、呼び出し側にはコピーを渡す。
+# このプロセスからの書き込みでは invalidate_read_cache() で明示的に捨てる
+# （同じ大きさ・同じ時刻刻みの上書きは sig だけでは見分けられないため）。
+
+_read_cache: dict[str, tuple[tuple, Any]] = {}
+_read_cache_stats: dict[str, dict[str, int]] = {}
+_read_cache_lock = threading.Lock()
+
+
+def _cached_read(name: str, paths: tuple[Path, ...], parse) -> Any:
+    """paths の sig が前回と同じなら前回の parse() 結果を返す。"""
+    sig = tuple(_file_sig(p) for p in paths)
+    with _read_cache_lock:
+        stats = _read_cache_stats.setdefault(name, {"hits": 0, "misses": 0})
+        hit = _read_cache.get(name)
+        if hit is not None and hit[0] == sig:
+            stats["hits"] += 1
+            return hit[1]
+
+    value = parse()
+    with _read_cache_lock:
+        _read_cache[name] = (sig, value)
+        stats["misses"] += 1
+    return value
+
+
+# タスクを書き換えたら捨てるキャッシュ
+_TASK_CACHES = ("tasks", "all_tasks", "todo_tasks", "deadline_index")
+
+
+# 書き換えたら今日のおすすめ（data/today.json）も古くなるキャッシュ
+_TODAY_INPUT_CACHES = frozenset(("state", "tags_master", *_TASK_CACHES))
+
+
+def invalidate_read_cache(*names: str) -> None:
+    """キャッシュを捨てる。名前を省略すると全部。"""
+    with _read_cache_lock:
+        for name in (names or list(_read_cache)):
+            _read_cache.pop(name, None)
+    if not names or not _TODAY_INPUT_CACHES.isdisjoint(names):
+        invalidate_today()
+
+
+def read_cache_stats() -> dict[str, dict[str, int]]:
+    """キャッシュのヒット/ミス回数（名前ごと）。"""
+    with _read_cache_lock:
+        return {name: dict(v) for name, v in _read_cache_stats.items()}
+
+
 def load_tags_master() -> TagsMaster:
     path: Path = TAGS_MASTER_PATH
     
     if not path.exists():
         raise FileNotFoundError(f"タグマスタがありません: {path}")
-    
-    with path.open("r", encoding="utf-8") as f:
-        data: TagsMaster = json.load(f)
-    return data
+
+    def parse() -> TagsMaster:
+        with path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+
+    return copy.deepcopy(_cached_read("tags_master", (path,), parse))
 
 def save_tags_master(data: TagsMaster) -> None:
     path: Path = TAGS_MASTER_PATH
     
-    with path.open("W",encoding="utf-8") as f:
-        json.dump(data,f,ensure_ascii=False,indent=2)
+    with file_lock(path):
+        atomic_write_json(path, data)
+        invalidate_read_cache("tags_master")
+
+
+# === 状態（state）読み込み ===
+def load_state() -> dict[str, Any]:
+    if _SQLITE:
+        return storage_sqlite.load_kv("state", {})
+    return copy.deepcopy(_cached_read("state", (STATE_PATH,), _load_state_file))
+
+def _load_state_file() -> dict[str, Any]:
+    if STATE_PATH.exists():
+        with STATE_PATH.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    # なければデフォルトの空の state
+    return {}
+
+def save_state(state: dict[str, Any]) -> None:
+    """state.json を保存するヘルパー。"""
+    if _SQLITE:
+        storage_sqlite.save_kv("state", state)
+        return
+    with file_lock(STATE_PATH):
+        atomic_write_json(STATE_PATH, state)
+        invalidate_read_cache("state")
+
 
 def load_tasks() -> list[dict]:
-    path = TASKS_PATH
+    """
+    全タスク（ホットの tasks.jsonl にイベントログを畳み込んだもの＋アーカイブの done）を id 順で返す
+    （アーカイブに分ける前の tasks.jsonl と同じ並び。id が無いものは最後）。
+    パース結果はホット・アーカイブ・並べた結果をそれぞれキャッシュし、各タスクは浅いコピーで返す
+    （tags などの入れ子の list/dict はキャッシュと共有なので書き換えないこと）。
+    """
+    if _SQLITE:
+        return storage_sqlite.load_tasks()
+
+    def merge() -> tuple[dict, ...]:
+        hot = _cached_read("tasks", (TASKS_PATH, TASKS_EVENTS_PATH), _load_folded_tasks)
+        archived = _cached_read("archive_tasks", (ARCHIVE_MANIFEST_PATH,), _load_archive_tasks)
+        return tuple(sorted((*hot, *archived), key=_id_order))  # 同じ id は元の順（sorted は安定）
+
+    with file_lock(TASKS_PATH, shared=True):  # 読んでいる間にホットからアーカイブへ移されないように
+        tasks = _cached_read("all_tasks", (TASKS_PATH, TASKS_EVENTS_PATH, ARCHIVE_MANIFEST_PATH), merge)
+    return [dict(t) for t in tasks]
+
+
+def _id_order(task: dict) -> tuple[int, int]:
+    tid = task.get("id")
+    return (0, tid) if isinstance(tid, int) else (1, 0)
+
+
+def load_todo_tasks() -> list[dict]:
+    """status == "todo" のタスクだけを dict で返す。"""
+    return [t.to_dict() for t in load_todo_task_models()]
+
+
+def load_todo_task_models() -> tuple[Task, ...]:
+    """
+    status == "todo" のタスクだけを Task で返す（SQLite なら WHERE で絞る）。
+    JSONL では iter_tasks で done を読み飛ばすので、キャッシュも todo 分しか持たない。
+    Task は書き換えない前提なので、キャッシュをコピーせずにそのまま渡す。
+    """
+    if _SQLITE:
+        return tuple(Task.from_dict(d) for d in storage_sqlite.iter_tasks(status="todo"))
+
+    def parse() -> tuple[Task, ...]:
+        return tuple(Task.from_dict(d) for d in iter_tasks(status="todo"))
+
+    return _cached_read("todo_tasks", (TASKS_PATH, TASKS_EVENTS_PATH), parse)
+
+
+def load_deadline_index() -> DeadlineIndex:
+    """
+    todo タスクの締切インデックス（期日の解決は tasks.jsonl / projects.json が変わったときだけ）。
+    日付が変わっても作り直さない。問い合わせ側が今日の日付を渡す。
+    """
+    def parse() -> DeadlineIndex:
+        return DeadlineIndex(load_todo_task_models(), load_projects())
+
+    if _SQLITE:
+        return parse()
+    return _cached_read("deadline_index", (TASKS_PATH, TASKS_EVENTS_PATH, PROJECTS_PATH), parse)
+
+
+def iter_tasks(status: str | None = None, project: str | None = None) -> Iterator[dict]:
+    """
+    tasks.jsonl を mmap して1件ずつ返すジェネレータ（イベントログも反映）。
+    status が None か "done" のときは、続けてアーカイブのセグメントも読む。
+    status / project を指定すると、json.loads の前に行のバイト列へ '"todo"' などが
+    含まれるかを見て、明らかに違う行はパースせずに読み飛ばす。
+    共有ロックは該当行を集める間だけ持ち、yield の間は持たない（途中でやめてもよい）。
+    """
+    if _SQLITE:
+        yield from storage_sqlite.iter_tasks(status=status, project=project)
+        return
+
+    # 値そのもの（JSON文字列表現）が行に含まれていなければ、その行は条件に合わない
+    needles: list[bytes] = []
+    if status is not None:
+        needles.append(json.dumps(status, ensure_ascii=False).encode("utf-8"))
+    if project is not None:
+        needles.append(json.dumps(project, ensure_ascii=False).encode("utf-8"))
+
+    with file_lock(TASKS_PATH, shared=True):
+        overlay = _task_event_overlay()
+        # イベントで status/project が書き換わるタスクがあると行だけでは判定できない
+        hot_needles = needles
+        if any("status" in p or "project" in p for p in overlay.values()):
+            hot_needles = []
+        hot_rows = _matching_lines(TASKS_PATH, hot_needles)
+        archive_rows = []
+        if status is None or status == "done":  # アーカイブには done しか無い
+            archive_rows = [(path, _matching_lines(path, needles)) for path in _archive_paths()]
+
+    for task in _parse_lines(TASKS_PATH, hot_rows):
+        if overlay:
+            patch = overlay.get(task.get("id"))
+            if patch:
+                task.update(patch)
+        if status is not None and task.get("status") != status:
+            continue
+        if project is not None and task.get("project") != project:
+            continue
+        yield task
+
+    for path, rows in archive_rows:
+        for task in _parse_lines(path, rows):
+            if status is not None and task.get("status") != status:
+                continue
+            if project is not None and task.get("project") != project:
+                continue
+            yield task
+
+
+def _looks_like_one_object(s: bytes) -> bool:
+    """行が JSON オブジェクト1個に見えるか（途中で切れた行・連結された行なら False）。"""
+    return s[:1] == b"{" and s[-1:] == b"}" and b"}{" not in s and s.count(b"{") == s.count(b"}")
+
+
+def _matching_lines(path: Path, needles: list[bytes]) -> list[tuple[int, int, bytes]]:
+    """
+    JSONL を mmap して、needles を全部含む行（と \\u を含む行）を (行番号, オフセット, 中身) で集める。
+    形が怪しい行は needles に関係なく残すので、条件に合わない行が混ざることがある（パース後に絞ること）。
+    """
+    sig = _file_sig(path)
+    if sig is None or sig[0] == 0:
+        return []  # 空ファイルは mmap できない
+
+    rows: list[tuple[int, int, bytes]] = []
+    with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        pos = 0
+        lineno = 0
+        while pos < size:
+            end = mm.find(b"\n", pos)
+            if end == -1:
+                end = size
+            lineno += 1
+            offset = pos
+            raw = mm[pos:end]
+            pos = end + 1
+
+            s = raw.strip()
+            if not s:
+                continue
+            # \uXXXX エスケープされた行はバイト比較できないので必ずパースする。
+            # 読み飛ばすのは {...} 1個に見える行だけ（壊れた行は条件に関係なくパースして E_TASKS_JSONL_CORRUPT にする）
+            if needles and b"\\u" not in s and not all(n in s for n in needles) and _looks_like_one_object(s):
+                continue
+            rows.append((lineno, offset, s))
+    return rows
+
+
+def _parse_lines(path: Path, rows: list[tuple[int, int, bytes]]) -> Iterator[dict]:
+    for lineno, offset, s in rows:
+        try:
+            yield json.loads(s)
+        except json.JSONDecodeError as e:
+            raise ChisaError(
+                "E_TASKS_JSONL_CORRUPT",
+                f"{path.name} が壊れています（JSON連結/欠損の可能性）",
+                meta={"line": lineno, "offset": offset, "head": s[:200].decode("utf-8", "replace"),
+                      "path": str(path), "err": str(e)}
+            )
+
+
+def _scan_jsonl(path: Path, needles: list[bytes]) -> Iterator[dict]:
+    """_matching_lines で集めた行をパースして返す（呼び出し側でロックを持つこと）。"""
+    yield from _parse_lines(path, _matching_lines(path, needles))
+
+
+def max_task_id() -> int:
+    """今ある最大の id（タスクが無ければ 0）。"""
+    if _SQLITE:
+        return storage_sqlite.max_task_id()
+    archived = (seg.get("max_id") or 0 for seg in _load_archive_manifest().values())
+    return max(max(load_task_index(), default=0), max(archived, default=0))
+
+
+def _read_task_seq() -> int | None:
+    """data/tasks.seq の値（無い・壊れているときは None）。tasks.seq のロックの中で呼ぶこと。"""
+    try:
+        return int(TASKS_SEQ_PATH.read_text(encoding="utf-8").strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _raise_task_seq(max_id: int) -> None:
+    """
+    tasks.seq を max_id 以上にする（id を指定して書き込んだとき・外から書き換えられたのを見つけたとき用）。
+    tasks.jsonl のロックの中で呼ぶこと（ロックの順は tasks.jsonl → tasks.seq）。
+    """
+    if max_id <= 0:
+        return
+    with file_lock(TASKS_SEQ_PATH):
+        last = _read_task_seq()
+        if last is not None and last >= max_id:
+            return
+        atomic_write_text(TASKS_SEQ_PATH, f"{max(max_id, last or 0)}\n")
+
+
+def allocate_task_ids(n: int = 1) -> list[int]:
+    """
+    新しい id を n 個まとめて払い出す。
+    data/tasks.seq（最後に払い出した id）をロックして進める。
+    tasks.jsonl を戻したり手で書き換えたりしたときは、load_task_index が作り直すときに
+    tasks.seq も今ある最大の id まで進めるので、ここではインデックスが今のものかを見るだけ。
+    tasks.seq が無い・壊れているときだけ、tasks.jsonl をロックして今ある最大の id から作り直す。
+    """
+    if n <= 0:
+        return []
+    if _SQLITE:
+        return storage_sqlite.allocate_task_ids(n)
+
+    load_task_index()  # 外から書き換えられていれば、ここで tasks.seq が追いつく
+    with file_lock(TASKS_SEQ_PATH):
+        last = _read_task_seq()
+        if last is not None:
+            atomic_write_text(TASKS_SEQ_PATH, f"{last + n}\n")
+            return list(range(last + 1, last + n + 1))
+
+    with file_lock(TASKS_PATH), file_lock(TASKS_SEQ_PATH):
+        last = _read_task_seq()
+        if last is None:
+            last = max_task_id()
+        atomic_write_text(TASKS_SEQ_PATH, f"{last + n}\n")
+    return list(range(last + 1, last + n + 1))
+
+
+def _load_folded_tasks() -> tuple[dict, ...]:
+    tasks = _load_snapshot_tasks()
+    overlay = _task_event_overlay()
+    if overlay:
+        for t in tasks:
+            patch = overlay.get(t.get("id"))
+            if patch:
+                t.update(patch)
+    return tuple(tasks)
+
+
+def _load_snapshot_tasks() -> list[dict]:
+    with file_lock(TASKS_PATH, shared=True):
+        return _read_jsonl_tasks(TASKS_PATH)
+
+
+def _read_jsonl_tasks(path: Path) -> list[dict]:
     if not path.exists():
         return []
 
@@ -38,11 +539,811 @@ def load_tasks() -> list[dict]:
             except Exception as e:
                 raise ChisaError(
                     "E_TASKS_JSONL_CORRUPT",
-                    "tasks.jsonl が壊れています（JSON連結/欠損の可能性）",
+                    f"{path.name} が壊れています（JSON連結/欠損の可能性）",
                     meta={"line": i, "head": s[:200], "path": str(path), "err": str(e)}
                 )
     return tasks
 
+# === id インデックス（tasks.jsonl のバイト位置） ===
+# data/tasks.idx は1行1レコードのJSONL:
+#   [id, offset, length, status, text_hash]   … エントリ（同じidは後の行が勝つ）
+#   {"del": id}                    … その id をホットから外した（アーカイブへ移した）
+#   {"sig": [size, mtime_ns]}      … ここまでのエントリが対応する tasks.jsonl の状態
+# 末尾の sig が今の tasks.jsonl と一致しなければ、外から書き換えられたとみなして作り直す。
+# 更新のたびに追記するので、上書きされた古い行（と古い sig 行）が
+# 生きているエントリ数と INDEX_DEAD_ROWS_MAX の大きい方を超えたら丸ごと書き直す。
+# tasks.jsonl も同じで、空白で潰した行・追記で置き換わった行（エントリから指されていないバイト）が
+# 生きている行のバイト数と HOT_DEAD_BYTES_MAX の大きい方を超えたら _save_hot_tasks で詰め直す。
+
+TaskIndex = dict[int, list]  # id -> [offset, length, status, text_hash]
+
+INDEX_DEAD_ROWS_MAX = 1000
+HOT_DEAD_BYTES_MAX = 64 * 1024
+
+_task_index: TaskIndex | None = None
+_task_index_sig: tuple[int, int] | None = None
+_task_index_rows = 0  # data/tasks.idx の行数（エントリ行＋sig 行）
+_task_text_hashes: Counter[str] = Counter()  # 重複判定用 text_hash -> 件数（_task_index と一緒に作り直す）
+_task_live_bytes = 0  # エントリが指している tasks.jsonl のバイト数（改行込み）
+_hot_dead_floor = 0  # 詰め直した直後でも残る分（同じ id の2行目・id の無い行）。これを超えた分だけ数える
+
+
+def _index_entry(offset: int, length: int, task: dict[str, Any]) -> list:
+    return [offset, length, str(task.get("status") or ""), task_text_hash(task.get("text"))]
+
+
+def _set_task_index(entries: TaskIndex, sig: tuple[int, int] | None) -> None:
+    global _task_index, _task_index_sig, _task_text_hashes, _task_live_bytes
+    _task_index, _task_index_sig = entries, sig
+    _task_text_hashes = Counter(e[3] for e in entries.values() if e[3])
+    _task_live_bytes = sum(e[1] + 1 for e in entries.values())
+
+
+def _file_sig(path: Path) -> tuple[int, int] | None:
+    """(size, mtime_ns)。ファイルが無ければ None。"""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+def _scan_tasks_index(path: Path) -> TaskIndex:
+    """tasks.jsonl を先頭から読んで id -> [offset, length, status, text_hash] を作る。"""
+    entries: TaskIndex = {}
+    if not path.exists():
+        return entries
+
+    offset = 0
+    with path.open("rb") as f:
+        for i, raw in enumerate(f, start=1):
+            body = raw.rstrip(b"\r\n")
+            s = body.strip()
+            if s:
+                try:
+                    obj = json.loads(s)
+                except Exception as e:
+                    raise ChisaError(
+                        "E_TASKS_JSONL_CORRUPT",
+                        "tasks.jsonl が壊れています（JSON連結/欠損の可能性）",
+                        meta={"line": i, "offset": offset, "head": s[:200].decode("utf-8", "replace"),
+                              "path": str(path), "err": str(e)}
+                    )
+                tid = obj.get("id") if isinstance(obj, dict) else None
+                # 同じidが複数あれば先頭を正とする（complete_task の従来挙動と同じ）
+                if isinstance(tid, int) and tid not in entries:
+                    entries[tid] = _index_entry(offset, len(body), obj)
+            offset += len(raw)
+    return entries
+
+
+def _write_task_index(entries: TaskIndex, sig: tuple[int, int] | None) -> None:
+    """インデックスファイルを丸ごと書き直す（再構築・全件保存のとき用）。"""
+    global _task_index_rows
+
+    lines = [json.dumps([tid, *e], ensure_ascii=False) for tid, e in entries.items()]
+    if sig is not None:
+        lines.append(json.dumps({"sig": list(sig)}))
+    atomic_write_text(TASKS_INDEX_PATH, "".join(line + "\n" for line in lines))
+
+    _set_task_index(entries, sig)
+    _task_index_rows = len(lines)
+
+
+def _append_task_index(rows: list[tuple[int, list | None]], sig: tuple[int, int] | None) -> None:
+    """
+    変更分のエントリと新しい sig だけをインデックスに追記する（古い行が溜まったら書き直す）。
+    エントリが None の行は {"del": id}（ホットから外した）として書く。
+    """
+    global _task_index_sig, _task_index_rows, _task_live_bytes
+
+    entries = _task_index if _task_index is not None else {}
+    with TASKS_INDEX_PATH.open("a", encoding="utf-8", newline="\n") as f:
+        for tid, e in rows:
+            if e is None:
+                f.write(json.dumps({"del": tid}) + "\n")
+            else:
+                f.write(json.dumps([tid, *e], ensure_ascii=False) + "\n")
+            old = entries.pop(tid, None)
+            if old is not None:
+                _task_live_bytes -= old[1] + 1
+                if old[3]:
+                    _discard_text_hash(old[3])  # text を書き換えたら古いハッシュは重複判定から外す
+            if e is None:
+                continue
+            entries[tid] = e
+            _task_live_bytes += e[1] + 1
+            if e[3]:
+                _task_text_hashes[e[3]] += 1
+        if sig is not None:
+            f.write(json.dumps({"sig": list(sig)}) + "\n")
+        f.flush()
+        _fsync_file(f, "append")
+
+    _task_index_sig = sig
+    _task_index_rows += len(rows) + (sig is not None)
+    if _task_index is not None and _task_index_rows - len(entries) - 1 > max(INDEX_DEAD_ROWS_MAX, len(entries)):
+        _write_task_index(entries, sig)
+
+
+def _compact_hot_if_needed() -> None:
+    """
+    tasks.jsonl の使われていないバイトが溜まっていたら詰め直す（tasks.jsonl のロックの中で呼ぶこと）。
+    イベントログの分も畳み込み、ホットに残っている done はアーカイブへ移す（archive_done_tasks と同じ）。
+    """
+    sig = _task_index_sig
+    if _task_index is None or sig is None:
+        return
+    dead = sig[0] - _task_live_bytes - _hot_dead_floor
+    if dead > max(HOT_DEAD_BYTES_MAX, _task_live_bytes):
+        print(f"[情報] tasks.jsonl を詰め直します（使われていない {dead} バイト）", flush=True)
+        _archive_done_locked()
+
+
+def _discard_text_hash(h: str) -> None:
+    n = _task_text_hashes.get(h, 0)
+    if n <= 1:
+        _task_text_hashes.pop(h, None)
+    else:
+        _task_text_hashes[h] = n - 1
+
+
+def _read_task_index_file() -> tuple[TaskIndex, tuple[int, int] | None, int]:
+    """インデックスファイルを読む（エントリ, sig, 行数）。壊れていたら sig=None（＝作り直し）を返す。"""
+    entries: TaskIndex = {}
+    sig: tuple[int, int] | None = None
+    rows = 0
+    if not TASKS_INDEX_PATH.exists():
+        return entries, None, 0
+
+    with TASKS_INDEX_PATH.open("r", encoding="utf-8") as f:
+        for line in f:
+            s = line.strip()
+            if not s:
+                continue
+            rows += 1
+            try:
+                obj = json.loads(s)
+            except json.JSONDecodeError:
+                return {}, None, 0
+            if isinstance(obj, list) and len(obj) == 5:
+                entries[obj[0]] = obj[1:]
+            elif isinstance(obj, list):
+                return {}, None, 0  # 古い形式は作り直す
+            elif isinstance(obj, dict) and isinstance(obj.get("sig"), list):
+                sig = tuple(obj["sig"])
+            elif isinstance(obj, dict) and "del" in obj:
+                entries.pop(obj["del"], None)
+    return entries, sig, rows
+
+
+def load_task_index() -> TaskIndex:
+    """
+    id -> [offset, length, status, text_hash] を返す。
+    メモリ上の版 → data/tasks.idx → tasks.jsonl の全走査 の順に、
+    今の tasks.jsonl と (size, mtime_ns) が一致するものを使う。
+    """
+    global _task_index_rows
+
+    sig = _file_sig(TASKS_PATH)
+    if sig is not None and _task_index is not None and _task_index_sig == sig:
+        return _task_index
+
+    # 作り直しの途中で書き込まれないよう、tasks.jsonl のロックを取って調べる
+    with file_lock(TASKS_PATH):
+        sig = _file_sig(TASKS_PATH)
+        if sig is None:
+            # tasks.jsonl が無いのに古いインデックスが残っていると、追記時に混ざるので空にする
+            if TASKS_INDEX_PATH.exists():
+                _write_task_index({}, None)
+            _set_task_index({}, None)
+            return _task_index
+
+        if _task_index is not None and _task_index_sig == sig:
+            return _task_index
+
+        entries, idx_sig, rows = _read_task_index_file()
+        if idx_sig != sig:
+            entries = _scan_tasks_index(TASKS_PATH)
+            _write_task_index(entries, sig)
+            _raise_task_seq(max(entries, default=0))
+            return entries
+
+        _set_task_index(entries, sig)
+        _task_index_rows = rows
+        return entries
+
+
+def get_task(task_id: int) -> dict | None:
+    """id インデックスを使って1件だけ読む（全件パースしない）。"""
+    if _SQLITE:
+        return storage_sqlite.get_task(task_id)
+
+    entry = load_task_index().get(task_id)
+    if entry is None:
+        return _find_archived_task(task_id)
+
+    offset, length = entry[0], entry[1]
+    with file_lock(TASKS_PATH, shared=True), TASKS_PATH.open("rb") as f:
+        f.seek(offset)
+        raw = f.read(length)
+    task = json.loads(raw)
+
+    patch = _task_event_overlay().get(task_id)
+    if patch:
+        task.update(patch)
+    return task
+
+
+def get_task_status(task_id: int) -> str | None:
+    """status だけを返す（イベントログ分も反映）。見つからなければ None。"""
+    if _SQLITE:
+        return storage_sqlite.get_task_status(task_id)
+
+    entry = load_task_index().get(task_id)
+    if entry is None:
+        archived = _find_archived_task(task_id)
+        return str(archived.get("status") or "") if archived else None
+    patch = _task_event_overlay().get(task_id)
+    if patch and "status" in patch:
+        return str(patch["status"] or "")
+    return entry[2]
+
+
+def update_task(task_id: int, patch: dict[str, Any]) -> dict | None:
+    """
+    1件だけ書き換える。
+    - 新しい行が元の長さに収まれば、その場で上書き（余りは空白で埋める）
+    - 収まらなければ元の行を空白で潰し、末尾に追記する
+    どちらも tasks.jsonl 全体は書き直さない。見つからなければ None。
+    イベントログモードでは tasks.jsonl には触らず update イベントを追記する。
+    """
+    if _SQLITE:
+        return storage_sqlite.update_task(task_id, patch)
+
+    with file_lock(TASKS_PATH):
+        return _update_task_locked(task_id, patch)
+
+
+def _update_task_locked(task_id: int, patch: dict[str, Any]) -> dict | None:
+    entry = load_task_index().get(task_id)
+    if entry is None:
+        return None
+
+    if TASKS_EVENT_LOG:
+        append_task_event({"op": "update", "id": task_id, "fields": patch})
+        return get_task(task_id)
+
+    offset, length = entry[0], entry[1]
+    with TASKS_PATH.open("r+b") as f:
+        f.seek(offset)
+        task = json.loads(f.read(length))
+        task.update(patch)
+        line = json.dumps(task, ensure_ascii=False).encode("utf-8")
+        json.loads(line)  # 壊れたJSONは書かない
+
+        if len(line) <= length:
+            f.seek(offset)
+            f.write(line + b" " * (length - len(line)))
+            new_entry = _index_entry(offset, length, task)
+        else:
+            f.seek(offset)
+            f.write(b" " * length)
+            end = f.seek(0, 2)
+            prefix = b""
+            if end > 0:
+                f.seek(end - 1)
+                if f.read(1) != b"\n":
+                    prefix = b"\n"
+            f.write(prefix + line + b"\n")
+            new_entry = _index_entry(end + len(prefix), len(line), task)
+        f.flush()
+        _fsync_file(f, "append")
+
+    invalidate_read_cache(*_TASK_CACHES)
+    _append_task_index([(task_id, new_entry)], _file_sig(TASKS_PATH))
+    _compact_hot_if_needed()
+    return task
+
+
+def update_tasks(patches: dict[int, dict[str, Any]], when: Callable[[dict], bool] | None = None) -> int:
+    """
+    複数タスクへの patch をまとめて当て、tasks.jsonl を最後に1回だけ書き直す。
+    （イベントログは畳み込み、done になったものはアーカイブへ移す。）当てたタスクの件数（id の数）を返す。
+    アーカイブ済みの done には当てない。
+    when を渡すと、ロックの中で今のタスクを渡して呼び、False なら当てない（読んでから書くまでの間の変更を上書きしない）。
+    """
+    if not patches:
+        return 0
+    if _SQLITE:
+        return sum(1 for tid, patch in patches.items() if storage_sqlite.update_task(tid, patch, when) is not None)
+
+    with file_lock(TASKS_PATH):
+        tasks = list(_load_folded_tasks())
+        applied: set[Any] = set()  # 同じ id の行が複数あっても1件と数える
+        for t in tasks:
+            patch = patches.get(t.get("id"))
+            if patch and (when is None or when(t)):
+                t.update(patch)
+                applied.add(t.get("id"))
+        if applied:
+            done = [t for t in tasks if t.get("status") == "done"]
+            if done:
+                _append_to_archive(done)
+            _save_hot_tasks([t for t in tasks if t.get("status") != "done"])
+        return len(applied)
+
+
+def set_task_status(task_id: int, status: str) -> bool:
+    """
+    status を書き換える。done にするときは completed_at も付ける。
+    イベントログモードなら status イベントの追記だけで済ませる。
+    書き換えられなければ False（見つからない・アーカイブ済みの done を done 以外に戻そうとした）。
+    """
+    if get_task_status(task_id) is None:
+        return False
+    if not _SQLITE and task_id not in load_task_index():
+        # アーカイブ済み（done）。アーカイブからホットへは戻さない
+        return status == "done"
+
+    at = datetime.now().isoformat(timespec="seconds")
+    if TASKS_EVENT_LOG and not _SQLITE:
+        append_task_event({"op": "status", "id": task_id, "status": status, "at": at})
+        return True
+
+    patch: dict[str, Any] = {"status": status}
+    if status == "done":
+        patch["completed_at"] = at
+        if not _SQLITE:
+            with file_lock(TASKS_PATH):
+                return _archive_task_locked(task_id, patch)
+    return update_task(task_id, patch) is not None
+
+
+# === アーカイブ（done タスクの月別セグメント） ===
+# tasks.jsonl（ホット）には done 以外のタスクだけを置き、done になったタスクは
+# data/archive/tasks-YYYY-MM.jsonl（completed_at の月）へ移す。スコア計算はホットだけを読む。
+# data/archive/manifest.json にはセグメントごとの件数と id の範囲を持つ:
+#   {"segments": {"tasks-2026-01.jsonl": {"count": 12, "min_id": 3, "max_id": 40}}}
+# data/archive/text_hashes.txt は重複判定用の text_hash を1行1つ追記していく。
+# アーカイブへの書き込みはすべて tasks.jsonl のロックの中で行い、manifest を最後に書く。
+
+
+def _load_archive_manifest() -> dict[str, dict]:
+    """セグメント名 -> {"count", "min_id", "max_id"}（キャッシュそのものなので書き換えないこと）。"""
+    def parse() -> dict[str, dict]:
+        if not ARCHIVE_MANIFEST_PATH.exists():
+            return {}
+        with ARCHIVE_MANIFEST_PATH.open("r", encoding="utf-8") as f:
+            return json.load(f).get("segments", {})
+
+    return _cached_read("archive_manifest", (ARCHIVE_MANIFEST_PATH,), parse)
+
+
+def _archive_paths() -> list[Path]:
+    return [ARCHIVE_DIR / name for name in sorted(_load_archive_manifest())]
+
+
+def _load_archive_tasks() -> tuple[dict, ...]:
+    tasks: list[dict] = []
+    for path in _archive_paths():
+        tasks.extend(_read_jsonl_tasks(path))
+    return tuple(tasks)
+
+
+def _load_archive_text_hashes() -> frozenset[str]:
+    def parse() -> frozenset[str]:
+        if not ARCHIVE_TEXTS_PATH.exists():
+            return frozenset()
+        with ARCHIVE_TEXTS_PATH.open("r", encoding="utf-8") as f:
+            return frozenset(s for s in (line.strip() for line in f) if s)
+
+    return _cached_read("archive_texts", (ARCHIVE_TEXTS_PATH,), parse)
+
+
+def _archive_segment_name(task: dict[str, Any]) -> str:
+    at = task.get("completed_at")
+    month = at[:7] if isinstance(at, str) and len(at) >= 7 else datetime.now().strftime("%Y-%m")
+    return f"tasks-{month}.jsonl"
+
+
+def _find_archived_task(task_id: int) -> dict | None:
+    """manifest の id 範囲に入るセグメントだけを探す（見つからなければ None）。"""
+    needle = json.dumps({"id": task_id})[1:-1].encode("utf-8")  # b'"id": 7'
+    with file_lock(TASKS_PATH, shared=True):
+        for name, seg in sorted(_load_archive_manifest().items()):
+            if not (seg.get("min_id") or 0) <= task_id <= (seg.get("max_id") or 0):
+                continue
+            for task in _scan_jsonl(ARCHIVE_DIR / name, [needle]):
+                if task.get("id") == task_id:
+                    return task
+    return None
+
+
+def _group_by_segment(tasks: list[dict[str, Any]]) -> dict[str, list[dict]]:
+    groups: dict[str, list[dict]] = {}
+    for t in tasks:
+        groups.setdefault(_archive_segment_name(t), []).append(t)
+    return groups
+
+
+def _add_segment_stats(seg: dict[str, Any], group: list[dict[str, Any]]) -> None:
+    seg["count"] += len(group)
+    ids = [t["id"] for t in group if isinstance(t.get("id"), int)]
+    if ids:
+        seg["min_id"] = min(ids) if seg["min_id"] is None else min(seg["min_id"], *ids)
+        seg["max_id"] = max(ids) if seg["max_id"] is None else max(seg["max_id"], *ids)
+
+
+def _append_to_archive(tasks: list[dict[str, Any]], segments: dict[str, dict] | None = None) -> None:
+    """
+    done のタスクをセグメントごとにまとめて追記し、manifest を書き直す。
+    segments を渡すとそれを元に manifest を作る（全件書き直し用）。tasks.jsonl のロックの中で呼ぶこと。
+    """
+    segments = copy.deepcopy(_load_archive_manifest() if segments is None else segments)
+
+    ARCHIVE_DIR.mkdir(exist_ok=True)
+    for name, group in _group_by_segment(tasks).items():
+        path = ARCHIVE_DIR / name
+        data = b"".join(json.dumps(t, ensure_ascii=False).encode("utf-8") + b"\n" for t in group)
+        with path.open("ab") as f:
+            if f.seek(0, 2) > 0:
+                with path.open("rb") as r:
+                    r.seek(-1, 2)
+                    if r.read(1) != b"\n":
+                        data = b"\n" + data
+            f.write(data)
+            f.flush()
+            _fsync_file(f, "append")
+
+        _add_segment_stats(segments.setdefault(name, {"count": 0, "min_id": None, "max_id": None}), group)
+
+    hashes = [h for h in (task_text_hash(t.get("text")) for t in tasks) if h]
+    if hashes:
+        with ARCHIVE_TEXTS_PATH.open("a", encoding="utf-8", newline="\n") as f:
+            f.write("".join(h + "\n" for h in hashes))
+            f.flush()
+            _fsync_file(f, "append")
+
+    atomic_write_json(ARCHIVE_MANIFEST_PATH, {"segments": segments})
+    invalidate_read_cache("archive_manifest", "archive_tasks", "archive_texts", "all_tasks")
+
+
+def _rewrite_archive(tasks: list[dict[str, Any]]) -> None:
+    """
+    アーカイブを tasks だけで作り直す（save_tasks の全件保存用）。tasks.jsonl のロックの中で呼ぶこと。
+    新しいセグメントと text_hashes.txt を一時ファイルに全部書き切ってから os.replace で差し替え、manifest を最後に書く。
+    使わなくなった古いセグメントを消すのはその後なので、途中で落ちても今のアーカイブは残る。
+    """
+    old_names = set(_load_archive_manifest())
+    if not tasks and not old_names and not ARCHIVE_MANIFEST_PATH.exists():
+        return
+
+    segments: dict[str, dict] = {}
+    files: dict[Path, bytes] = {}
+    for name, group in _group_by_segment(tasks).items():
+        files[ARCHIVE_DIR / name] = b"".join(json.dumps(t, ensure_ascii=False).encode("utf-8") + b"\n" for t in group)
+        _add_segment_stats(segments.setdefault(name, {"count": 0, "min_id": None, "max_id": None}), group)
+    hashes = [h for h in (task_text_hash(t.get("text")) for t in tasks) if h]
+    files[ARCHIVE_TEXTS_PATH] = "".join(h + "\n" for h in hashes).encode("utf-8")
+
+    ARCHIVE_DIR.mkdir(exist_ok=True)
+    tmps: list[tuple[Path, Path]] = []
+    try:
+        for path, data in files.items():
+            tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmps.append((tmp, path))
+            with tmp.open("wb") as f:
+                f.write(data)
+                _fsync_file(f, "replace")
+        for tmp, path in tmps:
+            os.replace(tmp, path)
+    finally:
+        for tmp, _ in tmps:
+            if tmp.exists():
+                tmp.unlink()
+    _fsync_dir(ARCHIVE_MANIFEST_PATH)
+
+    atomic_write_json(ARCHIVE_MANIFEST_PATH, {"segments": segments})
+    invalidate_read_cache("archive_manifest", "archive_tasks", "archive_texts", "all_tasks")
+    for name in old_names - set(segments):
+        (ARCHIVE_DIR / name).unlink(missing_ok=True)
+
+
+def _archive_task_locked(task_id: int, patch: dict[str, Any]) -> bool:
+    """
+    1件を done にしてアーカイブへ移す。ホットの行は空白で潰し、インデックスには {"del": id} を追記する。
+    先にアーカイブへ書くので、途中で落ちても消えることはない（ホットに残るだけ）。
+    潰した分が溜まったら tasks.jsonl を詰め直す。
+    """
+    entry = load_task_index().get(task_id)
+    if entry is None:
+        return get_task_status(task_id) == "done"  # アーカイブ済みならもう done
+
+    offset, length = entry[0], entry[1]
+    with TASKS_PATH.open("r+b") as f:
+        f.seek(offset)
+        task = json.loads(f.read(length))
+        task.update(patch)
+        _append_to_archive([task])
+
+        f.seek(offset)
+        f.write(b" " * length)
+        f.flush()
+        _fsync_file(f, "append")
+
+    invalidate_read_cache(*_TASK_CACHES)
+    _append_task_index([(task_id, None)], _file_sig(TASKS_PATH))
+    _compact_hot_if_needed()
+    return True
+
+
+def archive_done_tasks() -> int:
+    """
+    ホットに残っている done（イベントログ分も含む）をアーカイブへ移し、
+    潰した空行も詰めて tasks.jsonl を書き直す。移した件数を返す。
+    """
+    if _SQLITE:
+        return 0
+    with file_lock(TASKS_PATH):
+        return _archive_done_locked()
+
+
+def _archive_done_locked() -> int:
+    tasks = list(_load_folded_tasks())
+    done = [t for t in tasks if t.get("status") == "done"]
+    if done:
+        _append_to_archive(done)
+    _save_hot_tasks([t for t in tasks if t.get("status") != "done"])
+    return len(done)
+
+
+# === イベントログ（tasks.events.jsonl） ===
+# 1行1イベント:
+#   {"op": "status", "id": 7, "status": "done", "at": "..."}
+#   {"op": "update", "id": 7, "fields": {...}, "at": "..."}
+# load_tasks はスナップショット（tasks.jsonl）にこれを順に畳み込む。
+# 件数が TASKS_COMPACT_THRESHOLD を超えたら、バックグラウンドで tasks.jsonl に書き戻して空にする。
+
+_events_cache: tuple[tuple[int, int] | None, dict[int, dict], int] = (None, {}, 0)
+_compacting = False
+_compacting_guard = threading.Lock()
+
+
+def _event_patch(ev: dict[str, Any]) -> dict[str, Any]:
+    """イベント1件をタスクへの差分 dict に変換する。"""
+    op = ev.get("op")
+    if op == "status":
+        patch: dict[str, Any] = {"status": ev.get("status")}
+        if ev.get("status") == "done" and ev.get("at"):
+            patch["completed_at"] = ev["at"]
+        return patch
+    if op == "update" and isinstance(ev.get("fields"), dict):
+        return dict(ev["fields"])
+    return {}
+
+
+def _read_task_events() -> tuple[dict[int, dict], int]:
+    """イベントログを id -> 畳み込み済み差分 と イベント件数 にする。"""
+    overlay: dict[int, dict] = {}
+    count = 0
+    with TASKS_EVENTS_PATH.open("r", encoding="utf-8") as f:
+        for i, line in enumerate(f, start=1):
+            s = line.strip()
+            if not s:
+                continue
+            try:
+                ev = json.loads(s)
+            except Exception as e:
+                raise ChisaError(
+                    "E_TASK_EVENTS_CORRUPT",
+                    "tasks.events.jsonl が壊れています",
+                    meta={"line": i, "head": s[:200], "path": str(TASKS_EVENTS_PATH), "err": str(e)}
+                )
+            if not isinstance(ev, dict) or not isinstance(ev.get("id"), int):
+                continue
+            overlay.setdefault(ev["id"], {}).update(_event_patch(ev))
+            count += 1
+    return overlay, count
+
+
+def _task_event_overlay() -> dict[int, dict]:
+    """イベントログの畳み込み結果（ファイルの (size, mtime_ns) が変わるまで使い回す）。"""
+    global _events_cache
+
+    sig = _file_sig(TASKS_EVENTS_PATH)
+    if sig is None:
+        return {}
+    if _events_cache[0] == sig:
+        return _events_cache[1]
+
+    overlay, count = _read_task_events()
+    _events_cache = (sig, overlay, count)
+    return overlay
+
+
+def append_task_event(event: dict[str, Any]) -> None:
+    """イベントを1行追記する。しきい値を超えたらバックグラウンドで compaction を始める。"""
+    event.setdefault("at", datetime.now().isoformat(timespec="seconds"))
+    line = json.dumps(event, ensure_ascii=False)
+    json.loads(line)  # 壊れたJSONは書かない
+
+    with file_lock(TASKS_PATH):
+        _task_event_overlay()  # 件数を最新にしておく
+        with TASKS_EVENTS_PATH.open("a", encoding="utf-8", newline="\n") as f:
+            f.write(line + "\n")
+            f.flush()
+            _fsync_file(f, "append")
+        invalidate_read_cache(*_TASK_CACHES)
+        count = _events_cache[2] + 1
+
+    if count >= TASKS_COMPACT_THRESHOLD:
+        _start_background_compaction()
+
+
+def _start_background_compaction() -> None:
+    global _compacting
+    with _compacting_guard:
+        if _compacting:
+            return
+        _compacting = True
+
+    def run() -> None:
+        global _compacting
+        try:
+            compact_task_events()
+        except Exception as e:
+            print("[警告] tasks.events.jsonl の compaction に失敗しました:", e, flush=True)
+        finally:
+            _compacting = False
+
+    threading.Thread(target=run, name="tasks-compaction", daemon=True).start()
+
+
+def compact_task_events() -> int:
+    """
+    イベントログを tasks.jsonl に畳み込んで新しいスナップショットにし、ログを空にする。
+    畳み込んだイベント件数を返す。
+    """
+    global _events_cache
+
+    if _SQLITE:
+        return 0
+
+    with file_lock(TASKS_PATH):
+        if _file_sig(TASKS_EVENTS_PATH) is None:
+            return 0
+
+        overlay, count = _read_task_events()
+        if count == 0:
+            TASKS_EVENTS_PATH.unlink()
+            _events_cache = (None, {}, 0)
+            return 0
+
+        tasks = _load_snapshot_tasks()
+        for t in tasks:
+            patch = overlay.get(t.get("id"))
+            if patch:
+                t.update(patch)
+
+        # done になったものはアーカイブへ。ログの削除は _save_hot_tasks がやる
+        done = [t for t in tasks if t.get("status") == "done"]
+        if done:
+            _append_to_archive(done)
+        _save_hot_tasks([t for t in tasks if t.get("status") != "done"])
+        return count
+
+
+def save_tasks(tasks: list[dict[str, Any]]) -> None:
+    """
+    tasks（load_tasks と同じ全件）で丸ごと書き戻す。
+    done はアーカイブに、それ以外は tasks.jsonl に振り分け、インデックスも同時に作り直す。
+    tasks はイベント畳み込み済みの前提なので、イベントログは空にする。
+    """
+    if _SQLITE:
+        storage_sqlite.save_tasks(tasks)
+        return
+
+    with file_lock(TASKS_PATH):
+        _rewrite_archive([t for t in tasks if t.get("status") == "done"])
+        _save_hot_tasks([t for t in tasks if t.get("status") != "done"])
+        _raise_task_seq(max((t["id"] for t in tasks if isinstance(t.get("id"), int)), default=0))
+
+
+def _save_hot_tasks(tasks: list[dict[str, Any]]) -> None:
+    """tasks.jsonl（ホット）だけを丸ごと書き直し、インデックスを作り直してイベントログを消す。"""
+    global _events_cache, _hot_dead_floor
+
+    entries: TaskIndex = {}
+    chunks: list[bytes] = []
+    offset = 0
+    for t in tasks:
+        line = json.dumps(t, ensure_ascii=False).encode("utf-8")
+        tid = t.get("id")
+        if isinstance(tid, int) and tid not in entries:
+            entries[tid] = _index_entry(offset, len(line), t)
+        chunks.append(line + b"\n")
+        offset += len(line) + 1
+
+    with file_lock(TASKS_PATH):
+        atomic_write_bytes(TASKS_PATH, b"".join(chunks))
+        _write_task_index(entries, _file_sig(TASKS_PATH))
+        _hot_dead_floor = offset - _task_live_bytes
+        if TASKS_EVENTS_PATH.exists():
+            TASKS_EVENTS_PATH.unlink()
+        _events_cache = (None, {}, 0)
+        invalidate_read_cache(*_TASK_CACHES)
+
+
+def has_task_text(text: str) -> bool:
+    """
+    正規化した text が同じタスクが既にあるか（インデックスのハッシュで判定、全件は読まない）。
+    イベントログで text を書き換えたタスクは、書き換え後の text で判定する。
+    """
+    h = task_text_hash(text)
+    if not h:
+        return False
+    if _SQLITE:
+        return storage_sqlite.has_text_hash(h)
+    entries = load_task_index()
+    count = _task_text_hashes.get(h, 0)
+
+    renamed = {tid: p["text"] for tid, p in _task_event_overlay().items() if "text" in p}
+    if renamed:
+        if any(task_text_hash(t) == h for t in renamed.values()):
+            return True
+        count -= sum(1 for tid in renamed if tid in entries and entries[tid][3] == h)
+
+    return count > 0 or h in _load_archive_text_hashes()
+
+
+def append_tasks(tasks: list[dict[str, Any]]) -> None:
+    """
+    tasks.jsonl にまとめて追記する（open / flush / fsync は1回だけ）。
+    id インデックスと重複判定用ハッシュも追記で更新する。
+    """
+    if not tasks:
+        return
+    if _SQLITE:
+        storage_sqlite.append_tasks(tasks)
+        return
+
+    lines: list[bytes] = []
+    for task in tasks:
+        line = json.dumps(task, ensure_ascii=False)
+        json.loads(line)  # 壊れたJSONは書かない
+        lines.append(line.encode("utf-8"))
+
+    path = TASKS_PATH
+    with file_lock(path):
+        load_task_index()  # 追記前の状態と一致させておく
+
+        with path.open("ab") as f:
+            end = f.seek(0, 2)
+            prefix = b""
+            if end > 0:
+                # 末尾に改行が無いファイルへ追記すると JSON 連結になるので補う
+                with path.open("rb") as r:
+                    r.seek(end - 1)
+                    if r.read(1) != b"\n":
+                        prefix = b"\n"
+            f.write(prefix + b"".join(line + b"\n" for line in lines))
+            f.flush()
+            _fsync_file(f, "append")
+
+        invalidate_read_cache(*_TASK_CACHES)
+        rows: list[tuple[int, list]] = []
+        offset = end + len(prefix)
+        known = _task_index or {}
+        for task, line in zip(tasks, lines):
+            tid = task.get("id") if isinstance(task, dict) else None
+            if isinstance(tid, int) and tid not in known:
+                rows.append((tid, _index_entry(offset, len(line), task)))
+            offset += len(line) + 1
+        _append_task_index(rows, _file_sig(path))
+        _raise_task_seq(max((tid for tid, _ in rows), default=0))
+
+
 # storage.py
 
 def append_task(*args) -> None:
@@ -51,6 +1352,7 @@ def append_task(*args) -> None:
     - append_task(task)
     - append_task(path, task)
     の両方を許可する。
+    tasks.jsonl への追記なら append_tasks([task]) と同じ（インデックスも更新する）。
     """
     if len(args) == 1:
         task = args[0]
@@ -60,12 +1362,18 @@ def append_task(*args) -> None:
     else:
         raise TypeError("append_task expects (task) or (path, task)")
 
+    path = Path(path)
+    if path.resolve() == TASKS_PATH.resolve():
+        append_tasks([task])
+        return
+
     line = json.dumps(task, ensure_ascii=False)
     json.loads(line)  # 壊れたJSONは書かない
 
-    with Path(path).open("a", encoding="utf-8", newline="\n") as f:
+    with file_lock(path), path.open("a", encoding="utf-8", newline="\n") as f:
         f.write(line + "\n")
         f.flush()
+        _fsync_file(f, "append")
 
         
 def _load_json_flexible(path: Path):
@@ -109,10 +1417,20 @@ def load_projects() -> dict[str, dict[str, Any]]:
     projects を dict に統一して返す。
     - dict形式: {"default": {...}, "job": {...}}
     - list形式: [{"id":"default", ...}, {"id":"job", ...}] → dictに変換
+    パース結果はキャッシュし、プロジェクトごとに浅いコピーで返す。
     """
+    if _SQLITE:
+        return _normalize_projects(storage_sqlite.load_kv("projects", {}))
+
+    projects = _cached_read("projects", (PROJECTS_PATH,), _parse_projects)
+    return {pid: dict(info) if isinstance(info, dict) else info for pid, info in projects.items()}
 
-    raw = _load_json_flexible(PROJECTS_PATH)
 
+def _parse_projects() -> dict[str, dict[str, Any]]:
+    return _normalize_projects(_load_json_flexible(PROJECTS_PATH))
+
+
+def _normalize_projects(raw: Any) -> dict[str, dict[str, Any]]:
     if isinstance(raw, dict):
         return raw
 
@@ -126,4 +1444,66 @@ def load_projects() -> dict[str, dict[str, Any]]:
                 result[pid] = item
         return result
 
-    return {}
\ No newline at end of file
+    return {}
+
+
+# === 今日のおすすめ（data/today.json） ===
+# {"version", "generated_at", "date", "items"} を保存しておき、version が今の入力と同じなら作り直さない。
+# version は入力ファイルの sig と日付から作るので、別プロセスからの書き換えや日付の変化でも変わる。
+# このプロセスからの書き込みでは invalidate_read_cache() 経由で today.json ごと消す。
+
+def _today_input_paths() -> tuple[Path, ...]:
+    if _SQLITE:
+        return (SQLITE_PATH, SQLITE_PATH.with_name(SQLITE_PATH.name + "-wal"), TAGS_MASTER_PATH)
+    return (TASKS_PATH, TASKS_EVENTS_PATH, STATE_PATH, PROJECTS_PATH, TAGS_MASTER_PATH)
+
+
+def today_inputs_version(today: str) -> str:
+    """今日のおすすめの入力（タスク・state・projects・tags_master と日付）が同じなら同じ値。"""
+    sigs = [today] + [_file_sig(p) for p in _today_input_paths()]
+    raw = json.dumps(sigs, separators=(",", ":")).encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+def load_today() -> dict[str, Any] | None:
+    """保存済みの今日のおすすめ。無い・壊れているときは None。"""
+    def parse() -> dict[str, Any] | None:
+        try:
+            with TODAY_PATH.open("r", encoding="utf-8") as f:
+                doc = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return doc if isinstance(doc, dict) and isinstance(doc.get("items"), list) else None
+
+    doc = _cached_read("today", (TODAY_PATH,), parse)
+    return copy.deepcopy(doc) if doc is not None else None
+
+
+def save_today(doc: dict[str, Any]) -> None:
+    with file_lock(TODAY_PATH):
+        atomic_write_json(TODAY_PATH, doc)
+        with _read_cache_lock:
+            _read_cache.pop("today", None)
+
+
+def invalidate_today() -> None:
+    """保存済みの今日のおすすめを捨てる（次に読まれたときに作り直す）。"""
+    try:
+        TODAY_PATH.unlink()
+    except FileNotFoundError:
+        pass
+    with _read_cache_lock:
+        _read_cache.pop("today", None)
+
+
+def migrate_to_sqlite() -> dict[str, int]:
+    """
+    data/tasks.jsonl（イベントログ込み）・projects.json・state.json を
+    SQLite に取り込む（1回だけ流すコマンド用）。取り込んだ件数を返す。
+    """
+    tasks = list(_load_folded_tasks()) + list(_load_archive_tasks())
+    projects = _load_json_flexible(PROJECTS_PATH)
+    state = _load_state_file()
+    storage_sqlite.migrate(tasks, projects, state)
+    return {"tasks": len(tasks), "projects": len(_normalize_projects(projects))}
+
@@ -0,0 +1,217 @@
+# storage_sqlite.py
+"""
+storage.py の SQLite バックエンド（CHISA_STORAGE_BACKEND=sqlite のとき使う）。
+- tasks: 検索に使う列（status / project / due_date / text_hash）＋タスク全体のJSON
+- kv:    projects / state をJSONのまま1行ずつ
+標準ライブラリの sqlite3 だけで動き、WAL モードで開く。
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from typing import Any, Callable, Iterator
+
+from config import SQLITE_PATH
+from task_model import task_text_hash
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    seq      INTEGER PRIMARY KEY AUTOINCREMENT,  -- 追加順（tasks.jsonl の行順に相当）
+    id       INTEGER,
+    status   TEXT,
+    project  TEXT,
+    due_date TEXT,
+    data     TEXT NOT NULL,
+    text_hash TEXT  -- 正規化した text のハッシュ（重複判定用）
+);
+-- 重複idが混ざった古い tasks.jsonl も取り込めるよう UNIQUE にはしない（先頭の行を正とする）
+CREATE INDEX IF NOT EXISTS idx_tasks_id       ON tasks(id);
+CREATE INDEX IF NOT EXISTS idx_tasks_status   ON tasks(status);
+CREATE INDEX IF NOT EXISTS idx_tasks_project  ON tasks(project);
+CREATE INDEX IF NOT EXISTS idx_tasks_due_date ON tasks(due_date);
+
+CREATE TABLE IF NOT EXISTS kv (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+_local = threading.local()
+
+
+def connect() -> sqlite3.Connection:
+    """スレッドごとに1本の接続を使い回す（sqlite3 の接続はスレッドをまたげない）。"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(SQLITE_PATH, timeout=10.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _migrate_text_hash(conn)
+        _local.conn = conn
+    return conn
+
+
+def _migrate_text_hash(conn: sqlite3.Connection) -> None:
+    """text_hash 列が無い古い DB に列を足して埋める。"""
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+    if "text_hash" not in cols:
+        with conn:
+            conn.execute("ALTER TABLE tasks ADD COLUMN text_hash TEXT")
+            rows = conn.execute("SELECT seq, data FROM tasks").fetchall()
+            conn.executemany(
+                "UPDATE tasks SET text_hash = ? WHERE seq = ?",
+                [(task_text_hash(json.loads(data).get("text")), seq) for seq, data in rows],
+            )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_text_hash ON tasks(text_hash)")
+
+
+def _task_row(task: dict[str, Any]) -> tuple:
+    tid = task.get("id")
+    due = task.get("due_date")
+    return (
+        tid if isinstance(tid, int) else None,
+        str(task.get("status") or ""),
+        task.get("project"),
+        due if isinstance(due, str) else None,
+        json.dumps(task, ensure_ascii=False),
+        task_text_hash(task.get("text")),
+    )
+
+
+# === tasks ===
+def iter_tasks(status: str | None = None, project: str | None = None) -> Iterator[dict]:
+    where: list[str] = []
+    params: list[Any] = []
+    if status is not None:
+        where.append("status = ?")
+        params.append(status)
+    if project is not None:
+        where.append("project = ?")
+        params.append(project)
+
+    sql = "SELECT data FROM tasks"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY seq"
+
+    for (data,) in connect().execute(sql, params):
+        yield json.loads(data)
+
+
+def load_tasks(status: str | None = None) -> list[dict]:
+    return list(iter_tasks(status=status))
+
+
+def get_task(task_id: int) -> dict | None:
+    row = connect().execute(
+        "SELECT data FROM tasks WHERE id = ? ORDER BY seq LIMIT 1", (task_id,)
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def get_task_status(task_id: int) -> str | None:
+    row = connect().execute(
+        "SELECT status FROM tasks WHERE id = ? ORDER BY seq LIMIT 1", (task_id,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def max_task_id() -> int:
+    row = connect().execute("SELECT MAX(id) FROM tasks").fetchone()
+    return int(row[0] or 0)
+
+
+def allocate_task_ids(n: int) -> list[int]:
+    """kv の task_seq を1トランザクションで進めて n 個の id を払い出す。"""
+    conn = connect()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT data FROM kv WHERE name = 'task_seq'").fetchone()
+        last = int(json.loads(row[0])) if row else 0
+        # 移行直後や手で足された行があっても被らないよう MAX(id) とも比べる（インデックスで O(log N)）
+        last = max(last, int(conn.execute("SELECT MAX(id) FROM tasks").fetchone()[0] or 0))
+        conn.execute(
+            "INSERT INTO kv (name, data) VALUES ('task_seq', ?) "
+            "ON CONFLICT(name) DO UPDATE SET data = excluded.data",
+            (json.dumps(last + n),),
+        )
+    return list(range(last + 1, last + n + 1))
+
+
+def has_text_hash(text_hash: str) -> bool:
+    row = connect().execute(
+        "SELECT 1 FROM tasks WHERE text_hash = ? LIMIT 1", (text_hash,)
+    ).fetchone()
+    return row is not None
+
+
+def append_tasks(tasks: list[dict[str, Any]]) -> None:
+    conn = connect()
+    with conn:
+        conn.executemany(
+            "INSERT INTO tasks (id, status, project, due_date, data, text_hash) VALUES (?, ?, ?, ?, ?, ?)",
+            [_task_row(t) for t in tasks],
+        )
+
+
+def update_task(
+    task_id: int, patch: dict[str, Any], when: Callable[[dict], bool] | None = None
+) -> dict | None:
+    """when を渡すと、今のタスクで when が False なら書き換えずに None を返す。"""
+    conn = connect()
+    with conn:
+        if when is not None:
+            conn.execute("BEGIN IMMEDIATE")  # 読んでから書くまでの間に他から書かれないように
+        row = conn.execute(
+            "SELECT seq, data FROM tasks WHERE id = ? ORDER BY seq LIMIT 1", (task_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        seq, data = row
+        task = json.loads(data)
+        if when is not None and not when(task):
+            return None
+        task.update(patch)
+        _, status, project, due, data, text_hash = _task_row(task)
+        conn.execute(
+            "UPDATE tasks SET status = ?, project = ?, due_date = ?, data = ?, text_hash = ? "
+            "WHERE seq = ?",
+            (status, project, due, data, text_hash, seq),
+        )
+    return task
+
+
+def save_tasks(tasks: list[dict[str, Any]]) -> None:
+    """全件入れ替え。"""
+    conn = connect()
+    with conn:
+        conn.execute("DELETE FROM tasks")
+        conn.executemany(
+            "INSERT INTO tasks (id, status, project, due_date, data, text_hash) VALUES (?, ?, ?, ?, ?, ?)",
+            [_task_row(t) for t in tasks],
+        )
+
+
+# === projects / state ===
+def load_kv(name: str, default: Any) -> Any:
+    row = connect().execute("SELECT data FROM kv WHERE name = ?", (name,)).fetchone()
+    return json.loads(row[0]) if row else default
+
+
+def save_kv(name: str, value: Any) -> None:
+    conn = connect()
+    with conn:
+        conn.execute(
+            "INSERT INTO kv (name, data) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET data = excluded.data",
+            (name, json.dumps(value, ensure_ascii=False)),
+        )
+
+
+def migrate(tasks: list[dict[str, Any]], projects: Any, state: Any) -> None:
+    """JSONL/JSON から読んだ中身で DB を作り直す（1回だけ流す想定）。"""
+    save_tasks(tasks)
+    save_kv("projects", projects)
+    save_kv("state", state)
@@ -0,0 +1,177 @@
+# task_model.py
+"""
+tasks.jsonl の1行を表す軽量モデル。
+- Task:       保存されている項目だけを持つ（__slots__、status/project/tags などは intern）
+- ScoredTask: days_left / base_score / score / reason など、スコア計算で付く派生項目のビュー
+dict との相互変換（from_dict / to_dict）で既存の JSONL スキーマをそのまま保つ。
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+import sys
+import unicodedata
+from typing import Any
+
+
+class _Missing:
+    """「キー自体が無い」を None と区別するための印。"""
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "MISSING"
+
+
+MISSING: Any = _Missing()
+
+# tasks.jsonl に書かれる順（add_task / import_state_data と同じ）
+TASK_FIELDS: tuple[str, ...] = (
+    "id", "created_at", "text", "project", "tags", "status",
+    "due_date", "priority_hint", "completed_at",
+)
+
+# 値の種類が少なく、同じ文字列が何度も出てくる項目
+_INTERNED_FIELDS = frozenset({"project", "status", "due_date", "priority_hint"})
+
+
+def _intern(v: Any) -> Any:
+    return sys.intern(v) if isinstance(v, str) else v
+
+
+def _intern_tags(raw: Any) -> Any:
+    """文字列だけの list なら intern した tuple に。それ以外（str / dict 混じり）は元のまま持つ。"""
+    if isinstance(raw, list) and all(isinstance(t, str) for t in raw):
+        return tuple(sys.intern(t) for t in raw)
+    return raw
+
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_task_text(text: Any) -> str:
+    """重複判定用に text を正規化する（NFKC・大文字小文字・空白の揺れを吸収）。"""
+    if not isinstance(text, str):
+        return ""
+    s = unicodedata.normalize("NFKC", text).casefold()
+    return _SPACES.sub(" ", s).strip()
+
+
+def task_text_hash(text: Any) -> str:
+    """正規化した text の短いハッシュ（空なら ""）。"""
+    s = normalize_task_text(text)
+    if not s:
+        return ""
+    return hashlib.blake2b(s.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def tag_keys(raw_tags: Any) -> tuple[str, ...]:
+    """tags の型ゆれ（str / list / tuple / dict 入り）をキーの並びにそろえる（スコア計算と state 補正で共通）。"""
+    if isinstance(raw_tags, tuple):
+        return raw_tags  # Task が intern 済みの文字列 tuple で持っている
+    if isinstance(raw_tags, str):
+        return (raw_tags,) if raw_tags else ()
+    if not isinstance(raw_tags, list):
+        return ()
+
+    keys: list[str] = []
+    for tag in raw_tags:
+        if isinstance(tag, dict):
+            k = tag.get("key") or tag.get("name")
+            k = str(k) if k is not None else ""
+        else:
+            k = str(tag)
+        if k:
+            keys.append(k)
+    return tuple(keys)
+
+
+class Task:
+    """tasks.jsonl の1件。未知のキーは extra に退避して往復で失わない。"""
+
+    __slots__ = TASK_FIELDS + ("extra",)
+
+    def __init__(self, **fields: Any) -> None:
+        extra: dict[str, Any] | None = None
+        for name in TASK_FIELDS:
+            setattr(self, name, MISSING)
+        for name, value in fields.items():
+            if name in _INTERNED_FIELDS:
+                value = _intern(value)
+            elif name == "tags":
+                value = _intern_tags(value)
+            elif name not in TASK_FIELDS:
+                if extra is None:
+                    extra = {}
+                extra[name] = value
+                continue
+            setattr(self, name, value)
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "Task":
+        return cls(**d)
+
+    def to_dict(self) -> dict[str, Any]:
+        out: dict[str, Any] = {}
+        for name in TASK_FIELDS:
+            value = getattr(self, name)
+            if value is MISSING:
+                continue
+            out[name] = list(value) if isinstance(value, tuple) else value
+        if self.extra:
+            out.update(self.extra)
+        return out
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """dict と同じ感覚で読めるようにする（state_effect などは task.get を使う）。"""
+        if key in TASK_FIELDS:
+            value = getattr(self, key)
+        elif self.extra is not None:
+            value = self.extra.get(key, MISSING)
+        else:
+            value = MISSING
+        if value is MISSING:
+            return default
+        return list(value) if key == "tags" and isinstance(value, tuple) else value
+
+    def __repr__(self) -> str:
+        return f"Task({self.to_dict()!r})"
+
+
+class ScoredTask:
+    """Task にスコア計算の結果を添えたもの。元の Task は書き換えない。"""
+
+    __slots__ = ("task", "days_left", "base_score", "score", "reason")
+
+    def __init__(
+        self,
+        task: Task,
+        days_left: int | None = None,
+        base_score: int = 0,
+        score: int = 0,
+        reason: str | None = None,
+    ) -> None:
+        self.task = task
+        self.days_left = days_left
+        self.base_score = base_score
+        self.score = score
+        self.reason = reason
+
+    @property
+    def id(self) -> Any:
+        return self.task.id
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in ScoredTask.__slots__ and key != "task":
+            value = getattr(self, key)
+            return default if value is None and key == "reason" else value
+        return self.task.get(key, default)
+
+    def to_dict(self) -> dict[str, Any]:
+        out = self.task.to_dict()
+        out["days_left"] = self.days_left
+        out["base_score"] = self.base_score
+        out["score"] = self.score
+        if self.reason is not None:
+            out["reason"] = self.reason
+        return out
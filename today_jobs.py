@@ -0,0 +1,109 @@
+# today_jobs.py
+"""
+今日のおすすめの「千紗による並べ替え」をバックグラウンドで回すための小さなジョブ置き場。
+/api/today はローカルのスコア順をすぐ返し、千紗の結果はここで作って ranking_id で取りに来てもらう。
+
+ranking_id は today.json の version と同じ（入力と日付が同じなら同じ id）。
+同じ id のジョブが走っている間は新しく投げない。失敗したジョブも RANKING_RETRY_AFTER 秒はそのまま返す
+（/api/today が呼ばれるたびに千紗へ聞き直さないように）。終わったジョブは新しいものから RANKING_JOBS_KEEP 件だけ覚えておく。
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from config import RANKING_RETRY_AFTER, RANKING_WORKERS
+from errors import ChisaError
+
+RANKING_JOBS_KEEP = 32
+
+
+class RankingJob:
+    """1回分の並べ替え。終わるまでは local_items、終わったら result の items を見せる。"""
+
+    __slots__ = ("ranking_id", "local_items", "generated_at", "result", "error", "error_code", "finished_at", "done")
+
+    def __init__(self, ranking_id: str, local_items: list[dict[str, Any]], generated_at: str) -> None:
+        self.ranking_id = ranking_id
+        self.local_items = local_items
+        self.generated_at = generated_at
+        self.result: dict[str, Any] | None = None
+        self.error: str | None = None
+        self.error_code: str | None = None
+        self.finished_at = 0.0  # time.monotonic()
+        self.done = threading.Event()
+
+    def failed(self) -> bool:
+        return self.done.is_set() and self.result is None
+
+    def view(self) -> dict[str, Any]:
+        """API で返す形 {"ranking_id", "pending", "generated_at", "items"}（失敗したら "error" と "error_code" も）。"""
+        if not self.done.is_set():
+            return {"ranking_id": self.ranking_id, "pending": True,
+                    "generated_at": self.generated_at, "items": self.local_items}
+        if self.result is None:
+            return {"ranking_id": self.ranking_id, "pending": False, "generated_at": self.generated_at,
+                    "items": self.local_items, "error": self.error, "error_code": self.error_code}
+        return {"ranking_id": self.ranking_id, "pending": False,
+                "generated_at": self.result["generated_at"], "items": self.result["items"]}
+
+
+class RankingJobs:
+    def __init__(self, workers: int, keep: int = RANKING_JOBS_KEEP, retry_after: float = RANKING_RETRY_AFTER) -> None:
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="chisa-ranking")
+        self._jobs: OrderedDict[str, RankingJob] = OrderedDict()
+        self._lock = threading.Lock()
+        self.keep = keep
+        self.retry_after = retry_after
+
+    def can_retry(self, job: RankingJob) -> bool:
+        """失敗してから retry_after 秒たったジョブなら True（新しく投げ直してよい）。"""
+        return job.failed() and time.monotonic() - job.finished_at >= self.retry_after
+
+    def submit(
+        self,
+        ranking_id: str,
+        local_items: list[dict[str, Any]],
+        generated_at: str,
+        run: Callable[[], dict[str, Any]],
+    ) -> RankingJob:
+        """同じ ranking_id のジョブがあればそれを返す。無ければ run をバックグラウンドで始める。"""
+        with self._lock:
+            job = self._jobs.get(ranking_id)
+            if job is not None and not self.can_retry(job):
+                self._jobs.move_to_end(ranking_id)
+                return job
+            job = RankingJob(ranking_id, local_items, generated_at)
+            self._jobs[ranking_id] = job
+            while len(self._jobs) > self.keep:
+                self._jobs.popitem(last=False)
+
+        def work() -> None:
+            try:
+                job.result = run()
+            except Exception as e:
+                print(f"[警告] おすすめの並べ替え（{ranking_id}）に失敗しました: {e}")
+                job.error = str(e)
+                job.error_code = e.code if isinstance(e, ChisaError) else "E_INTERNAL"
+            finally:
+                job.finished_at = time.monotonic()
+                job.done.set()
+
+        self._pool.submit(work)
+        return job
+
+    def get(self, ranking_id: str) -> RankingJob | None:
+        with self._lock:
+            return self._jobs.get(ranking_id)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if not j.done.is_set())
+            return {"jobs": len(self._jobs), "pending": pending}
+
+
+# app / web_server が共有する
+ranking_jobs = RankingJobs(RANKING_WORKERS)
@@ -31,10 +31,14 @@ async function loadTodaySafe(force = false) {
 }
 
 
+// 今表示している並びの id（千紗の結果が遅れて届いたとき、古いものなら捨てる）
+let currentRankingId = null;
+
 // web/tasks.js
 async function loadToday() {
   try {
     const response = await fetch("/api/today", { cache: "no-store" });
+    currentRankingId = response.headers.get("X-Ranking-Id");
 
     // 失敗時：X-Error-Code を拾ってログ、配列互換のまま空で描画して終了
     if (!response.ok) {
@@ -58,6 +62,11 @@ async function loadToday() {
 
     renderTasks(allTasks);
 
+    // まずはローカルのスコア順。千紗の並べ替えが終わったら差し替える
+    if (currentRankingId && response.headers.get("X-Ranking-Pending") === "true") {
+      waitForRanking(currentRankingId);
+    }
+
   } catch (error) {
     console.error("タスク取得エラー:", error);
     allTasks = [];
@@ -65,6 +74,36 @@ async function loadToday() {
   }
 }
 
+/**
+ * 千紗の並べ替えの結果を待って、届いたら表示を差し替える
+ * @param {string} rankingId - /api/today の X-Ranking-Id
+ */
+async function waitForRanking(rankingId) {
+  // サーバー側で最大20秒待ってくれるので、数回聞けば十分
+  for (let i = 0; i < 3; i++) {
+    try {
+      const res = await fetch(`/api/today/${encodeURIComponent(rankingId)}?wait=20`, { cache: "no-store" });
+      if (!res.ok) return;
+      const json = await res.json();
+
+      // 待っている間に別の並びを読み込んでいたら何もしない
+      if (rankingId !== currentRankingId) return;
+
+      if (!json.pending) {
+        if (Array.isArray(json.items)) {
+          allTasks = json.items;
+          console.log(`千紗のおすすめ順に差し替えました（${json.items.length}件）`);
+          renderTasks(allTasks);
+        }
+        return;
+      }
+    } catch (error) {
+      console.error("おすすめ順の取得エラー:", error);
+      return;
+    }
+  }
+}
+
 
 /**
  * タスクをテーブルに表示する
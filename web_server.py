@@ -5,7 +5,12 @@ import app
 import os
 import traceback
 from errors import ChisaError
-from storage import load_tasks
+from storage import load_tasks, load_deadline_index, read_cache_stats, atomic_write_text
+from scoring import score_cache
+from llm_cache import priority_cache, tag_cache
+from prompt_builder import prompt_stats
+from today_jobs import ranking_jobs
+from circuit_breaker import llm_breaker
 from datetime import datetime
 from zoneinfo import ZoneInfo
 import os
@@ -45,11 +50,29 @@ def _error_response(e: Exception):
 
 @server.get("/api/today")
 def api_today():
-    """今日のおすすめタスク一覧を返す（配列）"""
+    """
+    今日のおすすめタスク一覧を返す（配列）。千紗の返事は待たない。
+    - data/today.json が今の入力のものなら、それを返す（X-Ranking-Pending: false）
+    - 古ければローカルのスコア順をすぐ返し（X-Ranking-Pending: true）、千紗の並べ替えは裏で始める。
+      結果は GET /api/today/<X-Ranking-Id> で取る
+    - 並べ替えに失敗したときはローカル順のまま X-Ranking-Error（E_LLM_UNAVAILABLE など）を付ける
+    版と作った時刻は X-Today-Version / X-Today-Generated-At ヘッダ（確定したものは ETag も版）で返す。
+    """
     try:
         print("[DEBUG] /api/today called")
-        recs = app.get_today_recommendation()
-        return jsonify(recs)   # ★配列を返す（フロント互換）
+        ranking = app.start_today_ranking(_today_iso_jst_or_local())
+        resp = jsonify(ranking["items"])   # ★配列を返す（フロント互換）
+        resp.headers["X-Ranking-Id"] = ranking["ranking_id"]
+        resp.headers["X-Ranking-Pending"] = "true" if ranking["pending"] else "false"
+        resp.headers["X-Today-Version"] = ranking["ranking_id"]
+        resp.headers["X-Today-Generated-At"] = ranking["generated_at"]
+        if ranking.get("error_code"):
+            # 千紗の並べ替えに失敗した（しばらくはローカル順のまま。ヘッダは ASCII だけなのでコードで返す）
+            resp.headers["X-Ranking-Error"] = ranking["error_code"]
+        if ranking["pending"] or ranking.get("error_code"):
+            return resp
+        resp.set_etag(ranking["ranking_id"])
+        return resp.make_conditional(request)
     except Exception as e:
         print(f"[エラー] 今日のおすすめ取得に失敗: {e}")
         traceback.print_exc()
@@ -57,6 +80,25 @@ def api_today():
         resp.status_code = 500
         return resp
 
+
+@server.get("/api/today/<ranking_id>")
+def api_today_ranking(ranking_id: str):
+    """
+    /api/today が返した X-Ranking-Id の結果。
+    ?wait=秒 を付けると、千紗の並べ替えが終わるまで最大その秒数（30秒まで）待ってから返す。
+    返り値: {"success", "ranking_id", "pending", "generated_at", "items"}（失敗したら "error", "error_code" も）
+    """
+    try:
+        wait = min(max(float(request.args.get("wait", "0")), 0.0), 30.0)
+    except ValueError:
+        return jsonify({"success": False, "error": "wait は秒数で指定してください"}), 400
+
+    ranking = app.get_today_ranking(ranking_id, wait)
+    if ranking is None:
+        return jsonify({"success": False, "error": "ranking not found"}), 404
+    return jsonify({"success": True, **ranking})
+
+
 @server.get("/api/state")
 def api_state_get():
     try:
@@ -107,10 +149,7 @@ def api_import_state():
 
     dst = import_dir / f"state_{date_str}.json"
     try:
-        dst.write_text(
-            json.dumps(data, ensure_ascii=False, indent=2),
-            encoding="utf-8"
-        )
+        atomic_write_text(dst, json.dumps(data, ensure_ascii=False, indent=2))
         print(f"[api_import_state] 保存完了: {dst}")
     except Exception as e:
         print(f"[エラー] 日誌ファイルの保存に失敗: {e}")
@@ -125,7 +164,7 @@ def api_import_state():
         
         ensure_ui_note(data) 
         
-        app.import_state_data(data)
+        app.import_state_data(data, tag_in_background=True)
     except Exception as e:
         print(f"[エラー] import_state_data 実行中に例外: {e}")
         return jsonify({
@@ -135,9 +174,9 @@ def api_import_state():
 
     # 5. 取り込み後の「今日のおすすめ」も返しておく
     try:
-        recs = app.get_today_recommendation()
+        recs = app.start_today_ranking(_today_iso_jst_or_local())["items"]
     except Exception as e:
-        print(f"[警告] get_today_recommendation で例外: {e}")
+        print(f"[警告] start_today_ranking で例外: {e}")
         recs = []
 
     return jsonify({
@@ -173,7 +212,7 @@ def api_import_state_pasted():
     # 既存のロジックを流用：dictを直接渡す
     try:
         ensure_ui_note(parsed) 
-        app.import_state_data(parsed)
+        app.import_state_data(parsed, tag_in_background=True)
     except Exception as e:
         print(f"[エラー] import_state_data で例外: {e}")
         return jsonify({
@@ -181,8 +220,8 @@ def api_import_state_pasted():
             "error": "import_state_data 実行中にエラーが発生しました。"
         }), 500
 
-    # 取り込み後の今日のおすすめも返しておく
-    recs = app.get_today_recommendation()
+    # 取り込み後の今日のおすすめも返しておく（ローカル順。千紗の並べ替えは裏で始まる）
+    recs = app.start_today_ranking(_today_iso_jst_or_local())["items"]
     return jsonify({
         "success": True,
         "data": recs
@@ -234,6 +273,42 @@ def api_tasks_all():
     except Exception as e:
         return _error_response(e)
 
+@server.get("/api/tasks/due")
+def api_tasks_due():
+    """
+    締切の近い todo タスク（Asia/Tokyo の今日基準）
+    query: within=N（既定7）… 期限切れ＋今日からN日以内を期日順で返す
+    """
+    try:
+        within = int(request.args.get("within", 7))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "within must be int"}), 400
+    if within < 0:
+        return jsonify({"success": False, "error": "within must be >= 0"}), 400
+
+    try:
+        today = datetime.fromisoformat(_today_iso_jst_or_local()).date()
+        index = load_deadline_index()
+
+        def rows(pairs):
+            out = []
+            for tid, days_left in pairs:
+                d = index.tasks[tid].to_dict()
+                d["days_left"] = days_left
+                out.append(d)
+            return out
+
+        return jsonify({
+            "success": True,
+            "today": today.isoformat(),
+            "within": within,
+            "overdue": rows(index.overdue(today)),
+            "due": rows(index.due_within(today, within)),
+            "counts": index.counts(today),
+        })
+    except Exception as e:
+        return _error_response(e)
+
 @server.get("/api/tasks_scored")
 def api_tasks_scored():
     """Android用：score/reason付きタスク全件"""
@@ -270,7 +345,7 @@ def api_task_done():
         }), 404
 
     # 更新後の今日のおすすめも返しておく（フロントで使ってもいいし無視してもいい）
-    recs = app.get_today_recommendation()
+    recs = app.start_today_ranking(_today_iso_jst_or_local())["items"]
     return jsonify({
         "success": True,
         "data": recs
@@ -321,6 +396,28 @@ def api_projects_list():
     except Exception as e:
         print(f"[エラー] プロジェクト一覧取得失敗: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
+
+@server.get("/api/stats/cache")
+def api_cache_stats():
+    """読み込みキャッシュ・スコアキャッシュ・千紗の返答キャッシュのヒット/ミス回数（効き具合の確認用）"""
+    data = read_cache_stats()
+    data["score"] = score_cache.stats()
+    data["llm_priority"] = priority_cache.stats()
+    data["llm_tags"] = tag_cache.stats()
+    data["llm_prompt"] = prompt_stats.stats()
+    data["ranking_jobs"] = ranking_jobs.stats()
+    return jsonify({"success": True, "data": data})
+
+@server.get("/api/status/llm")
+def api_llm_status():
+    """千紗（LLM）呼び出しのサーキットブレーカーの状態と、返答キャッシュ・並べ替えジョブの様子"""
+    return jsonify({"success": True, "data": {
+        "breaker": llm_breaker.stats(),
+        "priority_cache": priority_cache.stats(),
+        "tag_cache": tag_cache.stats(),
+        "ranking_jobs": ranking_jobs.stats(),
+    }})
+
 print("✅ /api/diary route loaded")
 
 def _today_iso_jst_or_local() -> str:
@@ -362,7 +459,7 @@ def api_diary_post():
         }
 
         # 既存の取り込みルートに寄せる（/import・state管理はここに集約）
-        app.import_state_data(state)
+        app.import_state_data(state, tag_in_background=True)
 
         return jsonify({"success": True, "date": date_str})
 